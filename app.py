@@ -1,12 +1,13 @@
 import os
-import uuid
+import json
 import logging
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, render_template, request, jsonify, redirect, url_for, current_app
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import datetime
+import time
 import pytesseract
 from PIL import Image
 
@@ -19,40 +20,26 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Routes of the DB-mode app, registered on it by create_app
+bp = Blueprint('library', __name__)
 
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///screenshots.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Configure screenshot paths
-app.config["SCREENSHOTS_FOLDER"] = os.environ.get("SCREENSHOTS_FOLDER", "./screenshots")
-app.config["DOCUMENTS_FOLDER"] = os.environ.get("DOCUMENTS_FOLDER", "./documents")
-
-# Ensure folders exist
-os.makedirs(app.config["SCREENSHOTS_FOLDER"], exist_ok=True)
-os.makedirs(app.config["DOCUMENTS_FOLDER"], exist_ok=True)
-
-# Configure the app to serve screenshot images directly
-app.config["UPLOADED_PHOTOS_DEST"] = app.config["SCREENSHOTS_FOLDER"]
+import storage
+import static_files
+import metrics
+import profiling
+import tracing
+import db_writer
 
 # Create routes to serve the images
-@app.route('/screenshots/<path:filename>')
+@bp.route('/screenshots/<path:filename>')
 def uploaded_file(filename):
-    full_path = os.path.join(app.config['SCREENSHOTS_FOLDER'], filename)
-    directory = os.path.dirname(full_path)
-    base_filename = os.path.basename(full_path)
-    return send_from_directory(directory, base_filename)
-
-# Initialize the app with the extension
-db.init_app(app)
+    folder = current_app.config['SCREENSHOTS_FOLDER']
+    # Old flat-layout names are redirected to their sharded location, so
+    # caches keep the immutable response under the sharded URL only
+    resolved = storage.resolve_filename(folder, filename)
+    if resolved != filename:
+        return redirect(url_for('.uploaded_file', filename=resolved), 301)
+    return static_files.send_immutable_file(folder, filename)
 
 # Import and initialize models
 import models
@@ -71,31 +58,171 @@ class Screenshot(db.Model, models.ScreenshotMixin):
     deferred_until = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    due_at = db.Column(db.DateTime, nullable=True, index=True)  # Earliest deadline mentioned in the text
+    features = db.relationship('ScreenshotFeatures', uselist=False, cascade='all, delete-orphan')
 
-# Create tables and initialize services
-with app.app_context():
-    db.create_all()
+class ScreenshotFeatures(db.Model):
+    """
+    NLP features a screenshot's scores were computed from, so priorities can be
+    recomputed with new weights (see recompute_priorities.py) without OCR or spaCy
+    """
+    __tablename__ = 'screenshot_features'
+    
+    screenshot_id = db.Column(db.Integer, db.ForeignKey('screenshot.id', ondelete='CASCADE'), primary_key=True)
+    engine = db.Column(db.String(16), nullable=False)
+    text_length = db.Column(db.Integer, nullable=False, default=0)
+    urgency_count = db.Column(db.Float, nullable=False, default=0.0)
+    action_count = db.Column(db.Float, nullable=False, default=0.0)
+    time_hits = db.Column(db.Integer, nullable=False, default=0)
+    date_entities = db.Column(db.Text, nullable=True)  # JSON list of DATE entity texts
+    
+    @staticmethod
+    def column_values(features):
+        """Column values for an nlp_analyzer feature record (for bulk inserts)"""
+        return {
+            'engine': features['engine'],
+            'text_length': features['text_length'],
+            'urgency_count': features['pattern_counts'].get('URGENCY', 0),
+            'action_count': features['pattern_counts'].get('ACTION', 0),
+            'time_hits': features['time_hits'],
+            'date_entities': json.dumps(features['date_entities']) if features['date_entities'] else None,
+        }
     
-    # Import and initialize other services after database is ready
-    import nlp_analyzer
-    import screenshot_manager
+    @classmethod
+    def from_features(cls, features):
+        """Build a row from an nlp_analyzer feature record"""
+        return cls(**cls.column_values(features))
     
-    # Initialize the services
-    screenshot_manager.init_app(app)
-    nlp_analyzer.init()
+    def to_features(self):
+        """The nlp_analyzer feature record this row was built from"""
+        return {
+            'engine': self.engine,
+            'text_length': self.text_length,
+            'pattern_counts': {'URGENCY': self.urgency_count, 'ACTION': self.action_count},
+            'date_entities': json.loads(self.date_entities) if self.date_entities else [],
+            'time_hits': self.time_hits,
+        }
+
+class AppState(db.Model):
+    """Small key/value store for application state such as scheduled job runs"""
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=True)
+
+def _screenshot_to_dict(screenshot):
+    """JSON representation of a screenshot for the carousel"""
+    urls = renditions.rendition_urls(screenshot.path)
+    return {
+        'id': screenshot.id,
+        'filename': screenshot.filename,
+        'path': screenshot.path,
+        'thumbnail_url': urls.get('thumb'),
+        'preview_url': urls.get('preview'),
+        'text_content': screenshot.text_content,
+        'priority_score': screenshot.priority_score,
+        'created_at': screenshot.created_at.isoformat(),
+        'deferred_until': screenshot.deferred_until.isoformat() if screenshot.deferred_until else None,
+        'due_at': screenshot.due_at.isoformat() if screenshot.due_at else None
+    }
+
+def _is_active(screenshot, now=None):
+    """Whether a screenshot belongs in the active queue (not dismissed, not deferred)"""
+    now = now or datetime.datetime.now()
+    return not screenshot.dismissed and (screenshot.deferred_until is None or screenshot.deferred_until <= now)
+
+# Import the services (nothing heavy loads at import, see create_app)
+import nlp_analyzer
+import scoring
+import deadlines
+import screenshot_manager
+import renditions
+import change_feed
+import deferral_scheduler
+import warmup
+
+def init_db(app):
+    """Create missing tables and columns"""
+    with app.app_context():
+        db.create_all()
+        models.add_missing_columns(db, Screenshot)
+
+def create_app(services=True):
+    """
+    Create the app: configuration, extensions and routes, and the tables.
+    With services, also start the services and background jobs, then the
+    warm-up that loads the spaCy model and checks Tesseract (see warmup.py);
+    maintenance scripts pass services=False. Returns the app.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///screenshots.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Configure screenshot paths
+    app.config["SCREENSHOTS_FOLDER"] = os.environ.get("SCREENSHOTS_FOLDER", "./screenshots")
+    app.config["DOCUMENTS_FOLDER"] = os.environ.get("DOCUMENTS_FOLDER", "./documents")
+
+    # Ensure folders exist
+    os.makedirs(app.config["SCREENSHOTS_FOLDER"], exist_ok=True)
+    os.makedirs(app.config["DOCUMENTS_FOLDER"], exist_ok=True)
 
-@app.route('/')
+    # Configure the app to serve screenshot images directly
+    app.config["UPLOADED_PHOTOS_DEST"] = app.config["SCREENSHOTS_FOLDER"]
+
+    # Serve screenshot files with long-lived caching, they never change once named
+    static_files.init_app(app)
+
+    # Time every request and serve ingestion metrics on /metrics
+    metrics.init_app(app)
+
+    # Opt-in cProfile profiling of requests and upload jobs (PROFILING, see profiling.py)
+    profiling.init_app(app)
+
+    # Trace spans from upload to card (TRACE_FILE, see tracing.py)
+    tracing.init_app(app)
+
+    # Initialize the app with the extension
+    db.init_app(app)
+
+    # WAL and tuned pragmas for SQLite, with writes funnelled through one thread (see db_writer.py)
+    db_writer.init_app(app, db)
+
+    # Carousel renditions and the health probes
+    renditions.init_app(app)
+    warmup.init_app(app)
+
+    app.register_blueprint(bp)
+    init_db(app)
+
+    if services:
+        with app.app_context():
+            screenshot_manager.init_app(app)
+            deadlines.init_app(app)
+            deferral_scheduler.init_app(app, _screenshot_to_dict)
+        warmup.start(app)
+    return app
+
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/screenshots')
+@bp.route('/api/screenshots')
 def get_screenshots():
+    return jsonify(_active_screenshots())
+
+def _active_screenshots():
     # Get active (not dismissed) screenshots with passed defer time, ordered by priority
     now = datetime.datetime.now()
     
     # First, check if we have any screenshots in the database at all
     total_count = Screenshot.query.count()
-    app.logger.info(f"Total screenshots in database: {total_count}")
+    current_app.logger.info(f"Total screenshots in database: {total_count}")
     
     # Get active screenshots
     screenshots = Screenshot.query.filter(
@@ -103,70 +230,77 @@ def get_screenshots():
         (Screenshot.deferred_until == None) | (Screenshot.deferred_until <= now)  # Not deferred or defer time has passed
     ).order_by(Screenshot.priority_score.desc()).all()
     
-    app.logger.info(f"Active screenshots found: {len(screenshots)}")
+    current_app.logger.info(f"Active screenshots found: {len(screenshots)}")
     
     # Convert to dictionary for JSON response
-    result = []
-    for screenshot in screenshots:
-        result.append({
-            'id': screenshot.id,
-            'filename': screenshot.filename,
-            'path': screenshot.path,
-            'text_content': screenshot.text_content,
-            'priority_score': screenshot.priority_score,
-            'created_at': screenshot.created_at.isoformat(),
-            'deferred_until': screenshot.deferred_until.isoformat() if screenshot.deferred_until else None
-        })
+    result = [_screenshot_to_dict(screenshot) for screenshot in screenshots]
     
     # Log some details about what we're returning
-    app.logger.info(f"Returning {len(result)} screenshots in the API response")
-    return jsonify(result)
+    current_app.logger.info(f"Returning {len(result)} screenshots in the API response")
+    return result
+
+@bp.route('/api/changes')
+def get_changes():
+    """Long-poll for queue changes after ?since=<seq> (see change_feed)"""
+    return jsonify(change_feed.poll(change_feed.feed, request.args))
+
+@bp.route('/api/changes/snapshot')
+def get_changes_snapshot():
+    """The active queue with the change sequence number it reflects, to (re)sync from"""
+    return jsonify(change_feed.snapshot(change_feed.feed, _active_screenshots))
 
-@app.route('/api/screenshots/<int:screenshot_id>/dismiss', methods=['POST'])
+@bp.route('/api/screenshots/<int:screenshot_id>/dismiss', methods=['POST'])
 def dismiss_screenshot(screenshot_id):
     try:
-        screenshot = Screenshot.query.get_or_404(screenshot_id)
-        screenshot.dismissed = True
-        db.session.commit()
+        def dismiss():
+            Screenshot.query.get_or_404(screenshot_id).dismissed = True
+        db_writer.write(dismiss)
+        change_feed.feed.publish('remove', screenshot_id)
         
         return jsonify({'success': True})
     except Exception as e:
-        app.logger.error(f"Error dismissing screenshot: {str(e)}")
+        current_app.logger.error(f"Error dismissing screenshot: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
         
-@app.route('/api/screenshots/<int:screenshot_id>/restore', methods=['POST'])
+@bp.route('/api/screenshots/<int:screenshot_id>/restore', methods=['POST'])
 def restore_screenshot(screenshot_id):
     """Restore a previously dismissed screenshot"""
     try:
-        screenshot = Screenshot.query.get_or_404(screenshot_id)
-        screenshot.dismissed = False
-        db.session.commit()
+        def restore():
+            screenshot = Screenshot.query.get_or_404(screenshot_id)
+            screenshot.dismissed = False
+            return _is_active(screenshot)
+        if db_writer.write(restore):
+            _publish_added([screenshot_id])
         
         return jsonify({'success': True})
     except Exception as e:
-        app.logger.error(f"Error restoring screenshot: {str(e)}")
+        current_app.logger.error(f"Error restoring screenshot: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/screenshots/<int:screenshot_id>/defer', methods=['POST'])
+@bp.route('/api/screenshots/<int:screenshot_id>/defer', methods=['POST'])
 def defer_screenshot(screenshot_id):
     try:
-        screenshot = Screenshot.query.get_or_404(screenshot_id)
-        
         # Get defer time from request (in hours)
         defer_hours = request.json.get('defer_hours', 24)
-        screenshot.deferred_until = datetime.datetime.now() + datetime.timedelta(hours=defer_hours)
+        deferred_until = datetime.datetime.now() + datetime.timedelta(hours=defer_hours)
         
-        db.session.commit()
+        def defer():
+            Screenshot.query.get_or_404(screenshot_id).deferred_until = deferred_until
+        db_writer.write(defer)
+        change_feed.feed.publish('remove', screenshot_id)
+        # Announce it again when the deferral expires
+        deferral_scheduler.scheduler().schedule(None, screenshot_id, deferral_scheduler.timestamp(deferred_until))
         
         return jsonify({'success': True})
     except Exception as e:
-        app.logger.error(f"Error deferring screenshot: {str(e)}")
+        current_app.logger.error(f"Error deferring screenshot: {str(e)}")
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/settings')
+@bp.route('/settings')
 def settings():
     return render_template('settings.html')
 
@@ -175,7 +309,7 @@ def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'webp'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/api/upload', methods=['POST'])
+@bp.route('/api/upload', methods=['POST'])
 def upload_screenshots():
     """Handle uploaded screenshots with batch processing for large uploads"""
     import threading
@@ -194,7 +328,7 @@ def upload_screenshots():
     
     # Create a progress tracker
     total_files = len(files)
-    app.config['UPLOAD_PROGRESS'] = {
+    current_app.config['UPLOAD_PROGRESS'] = {
         'total': total_files,
         'saved': 0,
         'processed': 0,
@@ -204,19 +338,17 @@ def upload_screenshots():
     # Save all files first (this is fast)
     for file in files:
         if file and allowed_file(file.filename):
-            # Create a unique filename to avoid collisions
             filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file_path = os.path.join(app.config['SCREENSHOTS_FOLDER'], unique_filename)
             
             try:
-                # Save the file
-                file.save(file_path)
+                # Save the file under its content hash in the sharded layout
+                with tracing.span('save', file=filename):
+                    file_path = storage.store_upload(file, filename, current_app.config['SCREENSHOTS_FOLDER'])
                 saved_files.append({
                     'path': file_path,
                     'filename': filename
                 })
-                app.config['UPLOAD_PROGRESS']['saved'] += 1
+                current_app.config['UPLOAD_PROGRESS']['saved'] += 1
             except Exception as e:
                 logger.exception(f"Error saving {filename}")
                 error_msg = str(e)
@@ -228,9 +360,9 @@ def upload_screenshots():
     
     # Start a background thread to process saved files in batches
     if saved_files:
-        def process_saved_files(flask_app, files_to_process):
-            # Use application context in the thread
-            with flask_app.app_context():
+        def process_saved_files(flask_app, files_to_process, profile, trace_context, queued_at):
+            # Use application context in the thread, continuing the upload request's trace
+            with flask_app.app_context(), profiling.profiled_job('upload', enabled=profile), tracing.attach(trace_context):
                 try:
                     processed_count = 0
                     # Process files in small batches to avoid timeouts
@@ -238,66 +370,50 @@ def upload_screenshots():
                     
                     for i in range(0, len(files_to_process), batch_size):
                         batch = files_to_process[i:i+batch_size]
+                        tracing.record('queue_wait', queued_at, time.time(), files=len(batch))
                         
-                        for file_info in batch:
-                            try:
-                                # Process the screenshot
-                                success = process_uploaded_screenshot(file_info['path'], file_info['filename'])
-                                if success:
-                                    processed_count += 1
-                            except Exception as e:
-                                logger.exception(f"Error processing {file_info['filename']}")
-                                # Still try to create a record even if processing failed
-                                try:
-                                    screenshot = Screenshot(
-                                        filename=file_info['filename'],
-                                        path=file_info['path'],
-                                        text_content="[Upload error]",
-                                        priority_score=0.3,
-                                        urgency_score=0.2,
-                                        action_score=0.2
-                                    )
-                                    db.session.add(screenshot)
-                                    db.session.commit()
-                                    processed_count += 1
-                                except Exception as record_error:
-                                    logger.error(f"Failed to create fallback record: {str(record_error)}")
-                            
-                            # Update progress
-                            flask_app.config['UPLOAD_PROGRESS']['processed'] += 1
+                        try:
+                            # OCR the batch, then score all of its text in one NLP pass
+                            with tracing.span('batch', files=len(batch)):
+                                processed_count += process_uploaded_screenshots(batch)
+                        except Exception as e:
+                            logger.exception(f"Error processing batch of {len(batch)} files")
+                            # Still try to create records even if processing failed
+                            processed_count += _save_records_individually([
+                                _fallback_record(file_info['filename'], file_info['path'], "[Upload error]", 'batch_error')
+                                for file_info in batch
+                            ])
+                        
+                        # Update progress
+                        flask_app.config['UPLOAD_PROGRESS']['processed'] += len(batch)
                     
                     # Normalize priority scores after processing all screenshots
                     try:
-                        # Get all active screenshots
-                        now = datetime.datetime.now()
-                        screenshots = Screenshot.query.filter(
-                            Screenshot.dismissed == False,
-                            (Screenshot.deferred_until == None) | (Screenshot.deferred_until <= now)
-                        ).all()
-                        
-                        # Normalize priority scores if we have enough screenshots
-                        if len(screenshots) >= 3:
-                            # Get all priority scores
-                            scores = [s.priority_score for s in screenshots]
-                            
-                            # Calculate mean and standard deviation
-                            mean_score = sum(scores) / len(scores)
-                            std_dev = (sum((x - mean_score) ** 2 for x in scores) / len(scores)) ** 0.5
+                        def normalize():
+                            # Get all active screenshots
+                            now = datetime.datetime.now()
+                            screenshots = Screenshot.query.filter(
+                                Screenshot.dismissed == False,
+                                (Screenshot.deferred_until == None) | (Screenshot.deferred_until <= now)
+                            ).all()
                             
+                            # Normalize priority scores if we have enough screenshots
+                            if len(screenshots) < 3:
+                                return []
                             # Target a mean of 0.5 with most scores between 0.2 and 0.8
-                            if std_dev > 0:  # Avoid division by zero
-                                for screenshot in screenshots:
-                                    # Normalize to z-score
-                                    z_score = (screenshot.priority_score - mean_score) / std_dev
-                                    # Convert to new scale (mean 0.5, std dev ~0.15)
-                                    normalized_score = 0.5 + (z_score * 0.15)
-                                    # Clamp between 0.1 and 0.9
-                                    normalized_score = max(0.1, min(0.9, normalized_score))
-                                    screenshot.priority_score = normalized_score
-                                
-                                # Save all changes
-                                db.session.commit()
-                                logger.info(f"Normalized priority scores for {len(screenshots)} screenshots")
+                            normalized = scoring.normalize_priorities([s.priority_score for s in screenshots])
+                            for screenshot, normalized_score in zip(screenshots, normalized):
+                                screenshot.priority_score = float(normalized_score)
+                            
+                            # Events are built before the commit expires the rows
+                            return [('update', screenshot.id, {'priority_score': screenshot.priority_score})
+                                    for screenshot in screenshots]
+                        
+                        with metrics.stage('normalize'):
+                            changes = db_writer.write(normalize)
+                        if changes:
+                            change_feed.feed.publish_many(changes)
+                            logger.info(f"Normalized priority scores for {len(changes)} screenshots")
                     except Exception as norm_error:
                         logger.error(f"Error normalizing priority scores: {str(norm_error)}")
                     
@@ -309,7 +425,9 @@ def upload_screenshots():
                     flask_app.config['UPLOAD_PROGRESS']['completed'] = True
         
         # Start the background thread - pass the app instance
-        processing_thread = threading.Thread(target=process_saved_files, args=(app, saved_files.copy(),))
+        processing_thread = threading.Thread(target=process_saved_files, args=(
+            current_app._get_current_object(), saved_files.copy(), profiling.requested(), tracing.current_context(), time.time()
+        ))
         processing_thread.daemon = True
         processing_thread.start()
     
@@ -323,10 +441,10 @@ def upload_screenshots():
     })
 
 # Add a new endpoint to check upload progress
-@app.route('/api/upload/progress', methods=['GET'])
+@bp.route('/api/upload/progress', methods=['GET'])
 def upload_progress():
     """Get the current progress of background uploads"""
-    progress = app.config.get('UPLOAD_PROGRESS', {
+    progress = current_app.config.get('UPLOAD_PROGRESS', {
         'total': 0,
         'saved': 0,
         'processed': 0,
@@ -424,178 +542,249 @@ def preprocess_image_for_ocr(image_path):
         logger.error(f"Error preprocessing image: {str(e)}")
         return image_path  # Return original path if preprocessing fails
 
+def extract_uploaded_text(file_path):
+    """
+    Resize and OCR a newly uploaded screenshot.
+    Returns the extracted text ("" if OCR found nothing or failed),
+    or None if the file could not be opened as an image.
+    """
+    # Check if the image is valid and not too large
+    ocr_source = file_path
+    try:
+        with metrics.stage('decode'):
+            image = Image.open(file_path)
+        logger.info(f"Successfully opened image: {file_path} (size: {image.width}x{image.height})")
+        
+        # Resize large images to prevent timeouts. The stored file is served as
+        # immutable under its content hash, so OCR reads a scratch copy instead
+        max_size = (1500, 1500)
+        if image.width > max_size[0] or image.height > max_size[1]:
+            with metrics.stage('resize'):
+                image.thumbnail(max_size, Image.LANCZOS)
+                ocr_source = storage.scratch_path(current_app.config['SCREENSHOTS_FOLDER'], '.png')
+                image.save(ocr_source, format='PNG')
+            logger.info(f"Resized large image to prevent timeout: {file_path}")
+        image.close()
+        
+        # Build carousel renditions now so the first view doesn't wait on them
+        with metrics.stage('renditions'):
+            renditions.generate_renditions(file_path)
+    except Exception as img_error:
+        logger.error(f"Error opening image {file_path}: {str(img_error)}")
+        return None
+        
+    # Try to extract text with OCR, with timeout handling
+    text = ""
+    try:
+        # Preprocess the image for better OCR
+        with metrics.stage('preprocess'):
+            processed_image_path = preprocess_image_for_ocr(ocr_source)
+        
+        # Use better OCR configuration with a reasonable timeout
+        import threading
+        import queue
+        
+        def ocr_task(img_path, result_queue):
+            try:
+                custom_config = r'--oem 3 --psm 6 -l eng'
+                ocr_result = pytesseract.image_to_string(
+                    Image.open(img_path),
+                    config=custom_config
+                )
+                result_queue.put(ocr_result)
+            except Exception as ocr_err:
+                logger.error(f"OCR processing error: {str(ocr_err)}")
+                result_queue.put("")
+        
+        # Run OCR with a timeout
+        result_queue = queue.Queue()
+        ocr_thread = threading.Thread(
+            target=ocr_task, 
+            args=(processed_image_path, result_queue)
+        )
+        ocr_thread.daemon = True
+        ocr_thread.start()
+        with metrics.stage('ocr'):
+            ocr_thread.join(timeout=10)  # 10 second timeout
+        
+        if ocr_thread.is_alive():
+            logger.warning(f"OCR timeout for {file_path}, continuing with empty text")
+            metrics.OCR_TIMEOUTS.inc()
+            text = ""
+        else:
+            text = result_queue.get()
+        
+        # Clean up temporary files if created
+        for temp_path in {processed_image_path, ocr_source} - {file_path}:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except:
+                    pass
+                
+    except Exception as ocr_error:
+        logger.error(f"OCR failed for {file_path}: {str(ocr_error)}")
+        text = ""
+    
+    return text
+
 def process_uploaded_screenshot(file_path, original_filename):
     """Process a newly uploaded screenshot file"""
-    try:
+    return process_uploaded_screenshots([{'path': file_path, 'filename': original_filename}]) > 0
+
+def process_uploaded_screenshots(file_infos):
+    """
+    Process a batch of newly uploaded screenshot files.
+    Every file is OCRed first, then all extracted text is scored in a single
+    batched NLP pass and the records are committed together.
+    Returns the number of screenshot records created.
+    """
+    # IMPORTANT: Make sure newly uploaded screenshots are set to NOT dismissed
+    records = []
+    text_records = []
+    
+    for file_info in file_infos:
+        file_path = file_info['path']
+        original_filename = file_info['filename']
+        
         # Log start of processing
         logger.info(f"Processing new screenshot: {file_path}")
         
-        # IMPORTANT: Make sure newly uploaded screenshots are set to NOT dismissed
-        
-        # Check if this screenshot already exists
-        existing = Screenshot.query.filter_by(path=file_path).first()
-        if existing:
+        # Check if this screenshot already exists (or was uploaded twice in this batch)
+        if Screenshot.query.filter_by(path=file_path).first() or any(r['path'] == file_path for r in records):
             logger.info(f"Screenshot already exists in DB: {file_path}")
-            return False
+            continue
         
-        # Check if the image is valid and not too large
         try:
-            image = Image.open(file_path)
-            logger.info(f"Successfully opened image: {file_path} (size: {image.width}x{image.height})")
-            
-            # Resize large images to prevent timeouts
-            max_size = (1500, 1500)
-            if image.width > max_size[0] or image.height > max_size[1]:
-                image.thumbnail(max_size, Image.LANCZOS)
-                # Save the resized image
-                image.save(file_path)
-                logger.info(f"Resized large image to prevent timeout: {file_path}")
-            image.close()
-        except Exception as img_error:
-            logger.error(f"Error opening image {file_path}: {str(img_error)}")
+            with tracing.span('file', file=original_filename):
+                text = extract_uploaded_text(file_path)
+        except Exception as e:
+            logger.error(f"Error processing screenshot {file_path}: {str(e)}")
+            # Still create a record to avoid losing the file
+            records.append(_fallback_record(original_filename, file_path, "[Error during processing]", 'processing_error'))
+            continue
+        
+        if text is None:
             # Create a record with no text content
-            screenshot = Screenshot(
-                filename=original_filename,
-                path=file_path,
-                text_content="[Error: Could not process image]",
-                priority_score=0.3,  # Default moderate-low priority
-                urgency_score=0.2,
-                action_score=0.2,
-                dismissed=False  # Explicitly set dismissed to False
-            )
-            db.session.add(screenshot)
-            db.session.commit()
+            records.append(_fallback_record(original_filename, file_path, "[Error: Could not process image]", 'unreadable_image'))
             logger.info(f"Created fallback record for unprocessable image: {file_path}")
-            return True
-            
-        # Try to extract text with OCR, with timeout handling
-        text = ""
-        try:
-            # Preprocess the image for better OCR
-            processed_image_path = preprocess_image_for_ocr(file_path)
-            
-            # Use better OCR configuration with a reasonable timeout
-            import threading
-            import queue
-            
-            def ocr_task(img_path, result_queue):
-                try:
-                    custom_config = r'--oem 3 --psm 6 -l eng'
-                    ocr_result = pytesseract.image_to_string(
-                        Image.open(img_path),
-                        config=custom_config
-                    )
-                    result_queue.put(ocr_result)
-                except Exception as ocr_err:
-                    logger.error(f"OCR processing error: {str(ocr_err)}")
-                    result_queue.put("")
-            
-            # Run OCR with a timeout
-            result_queue = queue.Queue()
-            ocr_thread = threading.Thread(
-                target=ocr_task, 
-                args=(processed_image_path, result_queue)
-            )
-            ocr_thread.daemon = True
-            ocr_thread.start()
-            ocr_thread.join(timeout=10)  # 10 second timeout
-            
-            if ocr_thread.is_alive():
-                logger.warning(f"OCR timeout for {file_path}, continuing with empty text")
-                text = ""
-            else:
-                text = result_queue.get()
-            
-            # Clean up temporary file if created
-            if processed_image_path != file_path and os.path.exists(processed_image_path):
-                try:
-                    os.remove(processed_image_path)
-                except:
-                    pass
-                    
-        except Exception as ocr_error:
-            logger.error(f"OCR failed for {file_path}: {str(ocr_error)}")
-            text = ""
+            continue
         
-        # Analyze text with NLP (or use default if empty)
+        record = {'filename': original_filename, 'path': file_path, 'text_content': text}
+        records.append(record)
         if text.strip():
-            urgency_score, action_score = nlp_analyzer.analyze_text(text)
+            text_records.append(record)
         else:
             # Assign random moderate-low scores for images without text
             import random
-            urgency_score = random.uniform(0.2, 0.4)
-            action_score = random.uniform(0.2, 0.4)
-            text = "[No text detected]"
-        
-        # Calculate priority score (60% urgency, 40% action)
-        priority_score = (urgency_score * 0.6) + (action_score * 0.4)
-        
-        # Create new screenshot record - ensure dismissed is explicitly set to False
-        screenshot = Screenshot(
-            filename=original_filename,
-            path=file_path,
-            text_content=text,
-            priority_score=priority_score,
-            urgency_score=urgency_score,
-            action_score=action_score,
-            dismissed=False  # Explicitly set dismissed to False for new uploads
-        )
-        
-        # Save to database
-        db.session.add(screenshot)
-        db.session.commit()
-        
-        logger.info(f"Processed uploaded screenshot {file_path} with priority score {priority_score:.2f}")
-        return True
+            record['urgency_score'] = random.uniform(0.2, 0.4)
+            record['action_score'] = random.uniform(0.2, 0.4)
+            record['text_content'] = "[No text detected]"
+    
+    # Analyze all extracted text with NLP in one batch, keeping the features for rescoring
+    with metrics.stage('nlp'):
+        feature_records = nlp_analyzer.extract_features_batch([r['text_content'] for r in text_records])
+    for record, features in zip(text_records, feature_records):
+        record['urgency_score'], record['action_score'] = scoring.score_features(features)
+        record['features'] = ScreenshotFeatures.from_features(features)
+        record['due_at'] = features['due_at']
+    
+    for record in records:
+        # Calculate priority score (60% urgency, 40% action by default)
+        record.setdefault('priority_score', scoring.priority_score(record['urgency_score'], record['action_score']))
+    
+    # Save the whole batch in one transaction
+    try:
+        with metrics.stage('db_write'):
+            added_ids = db_writer.write(lambda: _add_records(records))
     except Exception as e:
-        logger.error(f"Error processing screenshot {file_path}: {str(e)}")
-        # Still create a record to avoid losing the file
+        logger.error(f"Error saving screenshot batch, saving one by one: {str(e)}")
+        return _save_records_individually(records)
+    _publish_added(added_ids)
+    
+    for record in records:
+        logger.info(f"Processed uploaded screenshot {record['path']} with priority score {record['priority_score']:.2f}")
+    return len(records)
+
+def _fallback_record(original_filename, file_path, text_content, reason):
+    """Record data for a screenshot that could not be processed normally"""
+    metrics.FALLBACK_RECORDS.inc(reason=reason)
+    return {
+        'filename': original_filename,
+        'path': file_path,
+        'text_content': text_content,
+        'priority_score': 0.3,  # Default moderate-low priority
+        'urgency_score': 0.2,
+        'action_score': 0.2
+    }
+
+def _add_records(records):
+    """Add screenshots for records (a db_writer write), returns their ids"""
+    screenshots = [Screenshot(dismissed=False, **record) for record in records]
+    db.session.add_all(screenshots)
+    db.session.flush()
+    return [screenshot.id for screenshot in screenshots]
+
+def _save_records_individually(records):
+    """Save records one at a time, so one bad record doesn't lose the whole batch"""
+    saved_ids = []
+    for record in records:
         try:
-            screenshot = Screenshot(
-                filename=original_filename,
-                path=file_path,
-                text_content="[Error during processing]",
-                priority_score=0.3,
-                urgency_score=0.2,
-                action_score=0.2,
-                dismissed=False  # Explicitly set dismissed to False
-            )
-            db.session.add(screenshot)
-            db.session.commit()
-            logger.info(f"Created fallback record for {file_path}")
-            return True
+            with metrics.stage('db_write'):
+                saved_ids.extend(db_writer.write(lambda: _add_records([record])))
         except Exception as db_error:
-            logger.error(f"Could not save fallback record: {str(db_error)}")
-            return False
+            logger.error(f"Could not save record for {record['path']}: {str(db_error)}")
+    _publish_added(saved_ids)
+    return len(saved_ids)
+
+def _publish_added(screenshot_ids):
+    """
+    Announce committed screenshots on the change feed. Their carousel dicts are
+    built here, after the write, so a rendering error can't roll it back.
+    """
+    if not screenshot_ids:
+        return
+    try:
+        screenshots = Screenshot.query.filter(Screenshot.id.in_(screenshot_ids)).order_by(Screenshot.id).all()
+        change_feed.feed.publish_many([('add', screenshot.id, _screenshot_to_dict(screenshot)) for screenshot in screenshots])
+    except Exception as e:
+        # The screenshots are saved; clients pick them up on their next resync
+        logger.error(f"Error announcing saved screenshots: {str(e)}")
 
-@app.route('/api/rescan', methods=['POST'])
+@bp.route('/api/rescan', methods=['POST'])
 def rescan_screenshots():
     try:
         count = screenshot_manager.scan_for_new_screenshots()
+        if count:
+            # Scans add screenshots in bulk, clients reload the queue
+            change_feed.feed.publish('resync')
         return jsonify({'success': True, 'message': f'Found and processed {count} new screenshots'})
     except Exception as e:
         logger.exception("Error during screenshot scan")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/has-dismissed-screenshots')
+@bp.route('/api/has-dismissed-screenshots')
 def has_dismissed_screenshots():
     """Check if there are any dismissed screenshots in the database"""
     dismissed_count = Screenshot.query.filter_by(dismissed=True).count()
     return jsonify({'has_dismissed': dismissed_count > 0, 'count': dismissed_count})
     
-@app.route('/api/dismiss-all', methods=['POST'])
+@bp.route('/api/dismiss-all', methods=['POST'])
 def dismiss_all_screenshots():
     """Dismiss all active screenshots at once"""
     try:
-        # Get all active screenshots
-        active_screenshots = Screenshot.query.filter_by(dismissed=False).all()
-        count = len(active_screenshots)
-        
-        # Mark all as dismissed
-        for screenshot in active_screenshots:
-            screenshot.dismissed = True
+        def dismiss_all():
+            # Get all active screenshots
+            active_screenshots = Screenshot.query.filter_by(dismissed=False).all()
+            
+            # Mark all as dismissed
+            for screenshot in active_screenshots:
+                screenshot.dismissed = True
+            return [('remove', screenshot.id, None) for screenshot in active_screenshots]
         
-        db.session.commit()
+        changes = db_writer.write(dismiss_all)
+        count = len(changes)
+        change_feed.feed.publish_many(changes)
         
         return jsonify({
             'success': True,
@@ -603,30 +792,34 @@ def dismiss_all_screenshots():
             'count': count
         })
     except Exception as e:
-        app.logger.error(f"Error dismissing all screenshots: {str(e)}")
+        current_app.logger.error(f"Error dismissing all screenshots: {str(e)}")
         db.session.rollback()
         return jsonify({
             'success': False,
             'message': 'Failed to dismiss all screenshots'
         }), 500
 
-@app.route('/api/restore-dismissed', methods=['POST'])
+@bp.route('/api/restore-dismissed', methods=['POST'])
 def restore_dismissed_screenshots():
     """Restore all dismissed screenshots"""
     try:
-        # Get all dismissed screenshots
-        dismissed_screenshots = Screenshot.query.filter_by(dismissed=True).all()
-        count = len(dismissed_screenshots)
-        
-        app.logger.info(f"Restoring {count} dismissed screenshots")
-        
-        # Mark all as not dismissed
-        for screenshot in dismissed_screenshots:
-            screenshot.dismissed = False
+        def restore_dismissed():
+            # Get all dismissed screenshots
+            dismissed_screenshots = Screenshot.query.filter_by(dismissed=True).all()
+            current_app.logger.info(f"Restoring {len(dismissed_screenshots)} dismissed screenshots")
+            
+            # Mark all as not dismissed
+            for screenshot in dismissed_screenshots:
+                screenshot.dismissed = False
+            
+            now = datetime.datetime.now()
+            active_ids = [screenshot.id for screenshot in dismissed_screenshots if _is_active(screenshot, now)]
+            return len(dismissed_screenshots), active_ids
         
-        db.session.commit()
+        count, active_ids = db_writer.write(restore_dismissed)
+        _publish_added(active_ids)
         
-        app.logger.info(f"Successfully restored {count} screenshots")
+        current_app.logger.info(f"Successfully restored {count} screenshots")
         
         return jsonify({
             'success': True,
@@ -634,18 +827,18 @@ def restore_dismissed_screenshots():
             'count': count
         })
     except Exception as e:
-        app.logger.error(f"Error restoring dismissed screenshots: {str(e)}")
+        current_app.logger.error(f"Error restoring dismissed screenshots: {str(e)}")
         db.session.rollback()
         return jsonify({
             'success': False,
             'message': 'Failed to restore dismissed screenshots'
         }), 500
 
-@app.template_filter('truncate_text')
+@bp.app_template_filter('truncate_text')
 def truncate_text(text, length=100):
     if text and len(text) > length:
         return text[:length] + '...'
     return text if text else ''
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    create_app().run(host="0.0.0.0", port=5000, debug=True)
@@ -1,9 +1,8 @@
 import os
 import uuid
 import logging
-import threading
-import queue
-from flask import Flask, render_template, request, jsonify, send_from_directory, session
+import time
+from flask import Flask, Blueprint, render_template, request, jsonify, session, current_app, redirect, url_for
 from werkzeug.middleware.proxy_fix import ProxyFix
 import datetime
 import pytesseract
@@ -14,29 +13,30 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Import necessary modules
-import nlp_analyzer
+import renditions
+import storage
+import static_files
+import session_store
+import upload_jobs
+import change_feed
+import metrics
+import profiling
+import tracing
+import warmup
 from session_manager import SessionManager
 
 # Initialize the session manager
 session_mgr = SessionManager()
 
-# Create a temporary Flask app for development
-app = Flask(__name__, static_folder='static', template_folder='templates')
-app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Routes of the session-mode app, registered on it by register_routes
+bp = Blueprint('session', __name__)
 
-# Set a short session timeout (8 hours) to ensure data cleanup
-app.config["PERMANENT_SESSION_LIFETIME"] = datetime.timedelta(hours=8)
-
-# Configure upload settings
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max upload size
-app.config["ALLOWED_EXTENSIONS"] = {"png", "jpg", "jpeg", "gif"}
-
-# Configure screenshot paths to serve existing images for backward compatibility
-app.config["SCREENSHOTS_FOLDER"] = os.environ.get("SCREENSHOTS_FOLDER", "./screenshots")
-app.config["DOCUMENTS_FOLDER"] = os.environ.get("DOCUMENTS_FOLDER", "./documents")
-os.makedirs(app.config["SCREENSHOTS_FOLDER"], exist_ok=True)
-os.makedirs(app.config["DOCUMENTS_FOLDER"], exist_ok=True)
+def create_app():
+    """Create the session-mode app on its own (main.py builds it with a database)"""
+    app = Flask(__name__, static_folder='static', template_folder='templates')
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    return register_routes(app)
 
 # Create a function to register routes with an app instance
 def register_routes(flask_app):
@@ -55,65 +55,95 @@ def register_routes(flask_app):
     
     # Initialize modules with the app
     with flask_app.app_context():
-        # Initialize the nlp analyzer
-        nlp_analyzer.init()
-        
         # Initialize the session manager
         session_mgr.init_app(flask_app)
+        
+        # Initialize image serving and the carousel rendition cache
+        static_files.init_app(flask_app)
+        renditions.init_app(flask_app, session_mgr.temp_folder)
+        
+        # Start the shared pool that processes spooled uploads
+        upload_jobs.init_app(flask_app)
+        
+        # Time every request and serve ingestion metrics on /metrics
+        metrics.init_app(flask_app)
+        
+        # Opt-in cProfile profiling of requests and upload jobs
+        profiling.init_app(flask_app)
+        
+        # Trace spans from upload to card (TRACE_FILE)
+        tracing.init_app(flask_app)
+        
+        # Health probes; the warm-up runs once per process
+        warmup.init_app(flask_app)
+        warmup.start(flask_app)
+        
+        # Keep screenshot lists server-side, the cookie only carries a session id
+        session_store.init_app(flask_app)
+        session_store.sid_only(flask_app, '/api/changes')
     
     # Register all routes with the Flask app
-    flask_app.add_url_rule('/screenshots/<path:filename>', 'uploaded_file', uploaded_file)
-    flask_app.add_url_rule('/temp_uploads/<path:filename>', 'temp_file', temp_file)
-    flask_app.add_url_rule('/', 'index', index)
-    flask_app.add_url_rule('/api/screenshots', 'get_screenshots', get_screenshots)
-    flask_app.add_url_rule('/api/dismiss/<int:screenshot_id>', 'dismiss_screenshot', dismiss_screenshot, methods=['POST'])
-    flask_app.add_url_rule('/api/restore/<int:screenshot_id>', 'restore_screenshot', restore_screenshot, methods=['POST'])
-    flask_app.add_url_rule('/api/defer/<int:screenshot_id>', 'defer_screenshot', defer_screenshot, methods=['POST'])
-    flask_app.add_url_rule('/settings', 'settings', settings)
-    flask_app.add_url_rule('/privacy', 'privacy', privacy)
-    flask_app.add_url_rule('/api/upload', 'upload_screenshots', upload_screenshots, methods=['POST'])
-    flask_app.add_url_rule('/api/upload-progress', 'upload_progress_api', upload_progress_api)
-    flask_app.add_url_rule('/api/has-dismissed-screenshots', 'has_dismissed_screenshots', has_dismissed_screenshots)
-    flask_app.add_url_rule('/api/dismiss-all', 'dismiss_all_screenshots', dismiss_all_screenshots, methods=['POST'])
-    flask_app.add_url_rule('/api/restore-dismissed', 'restore_dismissed_screenshots', restore_dismissed_screenshots, methods=['POST'])
-    flask_app.add_url_rule('/api/cleanup-session', 'cleanup_session', cleanup_session, methods=['POST'])
-    
-    # Add template filters
-    flask_app.template_filter('truncate_text')(truncate_text)
+    flask_app.register_blueprint(bp)
     
     return flask_app
     
 # Create routes to serve the images (for backward compatibility)
-@app.route('/screenshots/<path:filename>')
+@bp.route('/screenshots/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['SCREENSHOTS_FOLDER'], filename)
+    folder = current_app.config['SCREENSHOTS_FOLDER']
+    # Old flat-layout names are redirected to their sharded location
+    resolved = storage.resolve_filename(folder, filename)
+    if resolved != filename:
+        return redirect(url_for('.uploaded_file', filename=resolved), 301)
+    return static_files.send_immutable_file(folder, filename)
 
 # Temporary files in the session manager
-@app.route('/temp_uploads/<path:filename>')
+@bp.route('/temp_uploads/<path:filename>')
 def temp_file(filename):
-    return send_from_directory('temp_uploads', filename)
+    return static_files.send_immutable_file(session_mgr.temp_folder, filename)
 
 # Main route
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/screenshots')
+@bp.route('/api/screenshots')
 def get_screenshots():
     """Get all active screenshots sorted by priority"""
     try:
-        # Get all active screenshots from the session
-        screenshots = session_mgr.get_active_screenshots()
-        
-        # Log the results
-        app.logger.info(f"Total screenshots in session: {len(screenshots)}")
-        
-        return jsonify(screenshots)
+        return jsonify(_active_screenshots())
     except Exception as e:
-        app.logger.error(f"Error fetching screenshots: {str(e)}")
+        current_app.logger.error(f"Error fetching screenshots: {str(e)}")
         return jsonify([]), 500
 
-@app.route('/api/dismiss/<int:screenshot_id>', methods=['POST'])
+def _active_screenshots():
+    """Active screenshots of the session, pointing at downscaled renditions instead of the originals"""
+    screenshots = session_mgr.get_active_screenshots()
+    for screenshot in screenshots:
+        urls = renditions.rendition_urls(screenshot['path'])
+        screenshot['thumbnail_url'] = urls.get('thumb')
+        screenshot['preview_url'] = urls.get('preview')
+    
+    # Log the results
+    current_app.logger.info(f"Total screenshots in session: {len(screenshots)}")
+    return screenshots
+
+@bp.route('/api/changes')
+def get_changes():
+    """Long-poll for changes to this session's queue after ?since=<seq> (see change_feed)"""
+    # A sid-only path: the poll never loads or saves the session it waits on
+    if session.sid is None:
+        # No session yet, so nothing to follow: answer with a resync
+        return jsonify(change_feed.poll(change_feed.ChangeFeed(), {}))
+    return jsonify(change_feed.poll(change_feed.session_feed(session.sid), request.args))
+
+@bp.route('/api/changes/snapshot')
+def get_changes_snapshot():
+    """The session's active queue with the change sequence number it reflects"""
+    # Loading the screenshots creates the session, so later polls share its feed
+    return jsonify(change_feed.snapshot(change_feed.session_feed(session.sid), _active_screenshots))
+
+@bp.route('/api/dismiss/<int:screenshot_id>', methods=['POST'])
 def dismiss_screenshot(screenshot_id):
     """Mark a screenshot as dismissed"""
     try:
@@ -123,10 +153,10 @@ def dismiss_screenshot(screenshot_id):
         else:
             return jsonify({'success': False, 'message': 'Screenshot not found'}), 404
     except Exception as e:
-        app.logger.error(f"Error dismissing screenshot {screenshot_id}: {str(e)}")
+        current_app.logger.error(f"Error dismissing screenshot {screenshot_id}: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/restore/<int:screenshot_id>', methods=['POST'])
+@bp.route('/api/restore/<int:screenshot_id>', methods=['POST'])
 def restore_screenshot(screenshot_id):
     """Restore a previously dismissed screenshot"""
     try:
@@ -136,10 +166,10 @@ def restore_screenshot(screenshot_id):
         else:
             return jsonify({'success': False, 'message': 'Screenshot not found'}), 404
     except Exception as e:
-        app.logger.error(f"Error restoring screenshot {screenshot_id}: {str(e)}")
+        current_app.logger.error(f"Error restoring screenshot {screenshot_id}: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/defer/<int:screenshot_id>', methods=['POST'])
+@bp.route('/api/defer/<int:screenshot_id>', methods=['POST'])
 def defer_screenshot(screenshot_id):
     """Defer a screenshot for later viewing"""
     try:
@@ -152,15 +182,15 @@ def defer_screenshot(screenshot_id):
         else:
             return jsonify({'success': False, 'message': 'Screenshot not found'}), 404
     except Exception as e:
-        app.logger.error(f"Error deferring screenshot {screenshot_id}: {str(e)}")
+        current_app.logger.error(f"Error deferring screenshot {screenshot_id}: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/settings')
+@bp.route('/settings')
 def settings():
     """Settings page"""
     return render_template('settings.html')
 
-@app.route('/privacy')
+@bp.route('/privacy')
 def privacy():
     """Privacy policy page"""
     return render_template('privacy.html')
@@ -168,21 +198,11 @@ def privacy():
 def allowed_file(filename):
     """Check if a filename has an allowed extension"""
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in app.config["ALLOWED_EXTENSIONS"]
-
-# Global variables for tracking upload progress
-upload_progress = {
-    'total': 0,
-    'processed': 0,
-    'in_progress': False,
-    'start_time': None
-}
+           filename.rsplit('.', 1)[1].lower() in current_app.config["ALLOWED_EXTENSIONS"]
 
-@app.route('/api/upload', methods=['POST'])
+@bp.route('/api/upload', methods=['POST'])
 def upload_screenshots():
-    """Handle uploaded screenshots with batch processing for large uploads"""
-    global upload_progress
-    
+    """Spool uploaded screenshots to temp storage and queue them for processing"""
     try:
         if 'screenshots[]' not in request.files:
             return jsonify({'success': False, 'message': 'No files submitted'}), 400
@@ -191,110 +211,83 @@ def upload_screenshots():
         
         if len(files) == 0:
             return jsonify({'success': False, 'message': 'No files selected'}), 400
-            
-        # Reset progress tracking
-        upload_progress['total'] = len(files)
-        upload_progress['processed'] = 0
-        upload_progress['in_progress'] = True
-        upload_progress['start_time'] = datetime.datetime.now()
         
-        # Process files in batches to avoid timeouts with large uploads
-        valid_files = []
-        for file in files:
-            if file and allowed_file(file.filename):
-                valid_files.append(file)
-                
+        valid_files = [file for file in files if file and allowed_file(file.filename)]
         if len(valid_files) == 0:
-            upload_progress['in_progress'] = False
             return jsonify({'success': False, 'message': 'No valid image files found'}), 400
         
-        # For small uploads (under 10 files), process immediately
-        if len(valid_files) <= 10:
-            processed_count = 0
-            
-            for file in valid_files:
-                result = session_mgr.process_uploaded_file(file, file.filename)
-                if result:
-                    processed_count += 1
-                    
-            upload_progress['processed'] = processed_count
-            upload_progress['in_progress'] = False
-            
-            return jsonify({
-                'success': True,
-                'message': f'Processed {processed_count} screenshots',
-                'count': processed_count
-            })
-        else:
-            # For larger uploads, process in background thread
-            def process_batch_background(app_context, files_to_process):
-                with app_context:
-                    for file in files_to_process:
-                        try:
-                            result = session_mgr.process_uploaded_file(file, file.filename)
-                            if result:
-                                upload_progress['processed'] += 1
-                        except Exception as e:
-                            logger.error(f"Error processing file {file.filename}: {str(e)}")
-                    
-                    upload_progress['in_progress'] = False
-                    logger.info(f"Background processing complete. Processed {upload_progress['processed']}/{upload_progress['total']} files.")
-            
-            # Start background thread with proper app context
-            thread = threading.Thread(
-                target=process_batch_background,
-                args=(app.app_context(), valid_files)
-            )
-            thread.daemon = True
-            thread.start()
-            
+        # Save every file to disk now; nothing reads the request's files once it has ended
+        spooled = []
+        errors = []
+        for file in valid_files:
+            try:
+                spooled.append(session_mgr.spool_upload(file, file.filename))
+            except Exception as e:
+                logger.exception(f"Error saving {file.filename}")
+                errors.append(f"Error saving {file.filename}: {str(e)[:100]}")
+        
+        if not spooled:
+            return jsonify({'success': False, 'message': 'Could not save any of the files', 'warnings': errors}), 500
+        
+        # Make sure the session exists in the store, results are queued to it by id
+        session_mgr._ensure_session_initialized()
+        
+        # OCR and scoring run on the shared upload pool
+        job = upload_jobs.submit(current_app._get_current_object(), session.sid, spooled,
+                                 session_mgr.process_spooled_files, profiling.requested())
+        if job is None:
             return jsonify({
-                'success': True,
-                'message': f'Processing {len(valid_files)} screenshots in the background',
-                'background': True
-            })
+                'success': False,
+                'message': 'Too many uploads are being processed, please try again shortly'
+            }), 503
+        
+        return jsonify({
+            'success': True,
+            'message': f'Processing {job.total} screenshots in the background',
+            'background': True,
+            'job_id': job.id,
+            'total_files': job.total,
+            'warnings': errors if errors else None
+        })
             
     except Exception as e:
-        upload_progress['in_progress'] = False
         logger.exception(f"Error uploading screenshots: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/upload-progress')
+@bp.route('/api/upload-progress')
+@bp.route('/api/upload/progress')
 def upload_progress_api():
-    """Get the current progress of background uploads"""
-    global upload_progress
-    
-    if not upload_progress['in_progress']:
-        return jsonify({
-            'in_progress': False,
-            'processed': upload_progress['processed'],
-            'total': upload_progress['total']
-        })
+    """Get the progress of this session's background uploads"""
+    progress = upload_jobs.progress(session.sid, request.args.get('job_id'))
+    if progress is None:
+        return jsonify({'in_progress': False, 'completed': True, 'processed': 0, 'total': 0})
     
     # Calculate estimated time remaining
-    if upload_progress['processed'] > 0 and upload_progress['start_time']:
-        elapsed = (datetime.datetime.now() - upload_progress['start_time']).total_seconds()
-        rate = upload_progress['processed'] / elapsed if elapsed > 0 else 0
-        remaining = (upload_progress['total'] - upload_progress['processed']) / rate if rate > 0 else 0
-    else:
-        remaining = None
+    remaining = None
+    if progress['processed'] > 0 and not progress['completed']:
+        elapsed = time.time() - progress['started_at']
+        rate = progress['processed'] / elapsed if elapsed > 0 else 0
+        remaining = (progress['total'] - progress['processed']) / rate if rate > 0 else None
     
     return jsonify({
-        'in_progress': True,
-        'processed': upload_progress['processed'],
-        'total': upload_progress['total'],
-        'percent': int(100 * upload_progress['processed'] / upload_progress['total']) if upload_progress['total'] > 0 else 0,
-        'estimated_seconds_remaining': int(remaining) if remaining is not None else None
+        'in_progress': not progress['completed'],
+        'completed': progress['completed'],
+        'processed': progress['processed'],
+        'failed': progress['failed'],
+        'total': progress['total'],
+        'percent': int(100 * progress['processed'] / progress['total']) if progress['total'] > 0 else 0,
+        'estimated_seconds_remaining': int(remaining) if remaining is not None else None,
+        'jobs': progress['jobs']
     })
 
-@app.route('/api/has-dismissed-screenshots')
+@bp.route('/api/has-dismissed-screenshots')
 def has_dismissed_screenshots():
     """Check if there are any dismissed screenshots in the session"""
     dismissed_screenshots = session_mgr.get_dismissed_screenshots()
     dismissed_count = len(dismissed_screenshots)
     return jsonify({'has_dismissed': dismissed_count > 0, 'count': dismissed_count})
     
-@app.route('/api/dismiss-all', methods=['POST'])
+@bp.route('/api/dismiss-all', methods=['POST'])
 def dismiss_all_screenshots():
     """Dismiss all active screenshots at once"""
     try:
@@ -307,20 +300,20 @@ def dismiss_all_screenshots():
             'count': count
         })
     except Exception as e:
-        app.logger.error(f"Error dismissing all screenshots: {str(e)}")
+        current_app.logger.error(f"Error dismissing all screenshots: {str(e)}")
         return jsonify({
             'success': False,
             'message': 'Failed to dismiss all screenshots'
         }), 500
 
-@app.route('/api/restore-dismissed', methods=['POST'])
+@bp.route('/api/restore-dismissed', methods=['POST'])
 def restore_dismissed_screenshots():
     """Restore all dismissed screenshots"""
     try:
         # Restore all dismissed screenshots
         count = session_mgr.restore_all_screenshots()
         
-        app.logger.info(f"Successfully restored {count} screenshots")
+        current_app.logger.info(f"Successfully restored {count} screenshots")
         
         return jsonify({
             'success': True,
@@ -328,30 +321,25 @@ def restore_dismissed_screenshots():
             'count': count
         })
     except Exception as e:
-        app.logger.error(f"Error restoring dismissed screenshots: {str(e)}")
+        current_app.logger.error(f"Error restoring dismissed screenshots: {str(e)}")
         return jsonify({
             'success': False,
             'message': 'Failed to restore dismissed screenshots'
         }), 500
 
-@app.route('/api/cleanup-session', methods=['POST'])
+@bp.route('/api/cleanup-session', methods=['POST'])
 def cleanup_session():
     """Clean up all files and data from the current session - simple version"""
     try:
-        app.logger.info("API call to cleanup session started")
+        current_app.logger.info("API call to cleanup session started")
         
         # Simple clear operation - no database dependencies
         # Just clean up the Flask session directly
         
-        # Clear Flask session data
+        # Clear Flask session data (the screenshot state is recreated on next use)
         session.clear()
         
-        # Initialize empty lists in the session
-        session['screenshots'] = []
-        session['dismissed_screenshots'] = []
-        session.modified = True
-        
-        app.logger.info("Session data cleared successfully")
+        current_app.logger.info("Session data cleared successfully")
         
         # Also clean any temp files in a safe manner
         try:
@@ -365,23 +353,23 @@ def cleanup_session():
                     if os.path.isfile(file_path):
                         try:
                             os.unlink(file_path)
-                            app.logger.info(f"Removed temp file: {file_path}")
+                            current_app.logger.info(f"Removed temp file: {file_path}")
                         except Exception as e:
-                            app.logger.warning(f"Could not remove temp file {file_path}: {str(e)}")
+                            current_app.logger.warning(f"Could not remove temp file {file_path}: {str(e)}")
                 
-                app.logger.info("Temporary files cleaned")
+                current_app.logger.info("Temporary files cleaned")
                 
         except Exception as temp_error:
-            app.logger.warning(f"Non-critical error cleaning temp files: {str(temp_error)}")
+            current_app.logger.warning(f"Non-critical error cleaning temp files: {str(temp_error)}")
         
-        app.logger.info("Session cleanup completed successfully")
+        current_app.logger.info("Session cleanup completed successfully")
         
         return jsonify({
             'success': True,
             'message': 'Your session data has been cleared'
         })
     except Exception as e:
-        app.logger.error(f"Error cleaning up session: {str(e)}")
+        current_app.logger.error(f"Error cleaning up session: {str(e)}")
         # Return more detailed error message
         error_msg = f"Failed to clear session data: {str(e)}"
         return jsonify({
@@ -389,11 +377,11 @@ def cleanup_session():
             'message': error_msg
         }), 500
 
-@app.template_filter('truncate_text')
+@bp.app_template_filter('truncate_text')
 def truncate_text(text, length=100):
     if text and len(text) > length:
         return text[:length] + '...'
     return text if text else ''
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
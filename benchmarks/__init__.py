@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for Noravue.
+Run individual benchmarks as modules from the project root, for example:
+    python -m benchmarks.nlp_pipeline
+"""
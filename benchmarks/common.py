@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import datetime
+
+def percentile(values, pct):
+    """Return the pct-th percentile (0-100) of values using linear interpolation"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+def summarize_latencies(seconds):
+    """Summarize a list of latencies (in seconds) as milliseconds"""
+    if not seconds:
+        return {'count': 0}
+    return {
+        'count': len(seconds),
+        'mean_ms': 1000 * sum(seconds) / len(seconds),
+        'p50_ms': 1000 * percentile(seconds, 50),
+        'p95_ms': 1000 * percentile(seconds, 95),
+        'p99_ms': 1000 * percentile(seconds, 99),
+        'max_ms': 1000 * max(seconds),
+    }
+
+def current_rss_mb():
+    """Current resident set size of this process in MB (Linux only, else peak RSS)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class Timer:
+    """Context manager that records elapsed wall time in seconds"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
+
+def environment():
+    """Describe the machine a benchmark ran on"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.datetime.now().isoformat(),
+    }
+
+def write_results(results, path):
+    """Write benchmark results as JSON, creating the parent directory if needed"""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
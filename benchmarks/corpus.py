@@ -0,0 +1,157 @@
+"""
+Deterministic synthetic screenshot corpus for the ingestion benchmarks.
+
+Every image is drawn with PIL from a seeded random generator, so the same
+seed always produces the same corpus. The profiles cover what real uploads
+vary in: resolution (phone, laptop, desktop, retina), text density, font,
+tall scrolling captures and images with no text at all.
+
+    python -m benchmarks.corpus --count 60 --seed 1 --output-dir /tmp/noravue-corpus
+"""
+
+import os
+import random
+import argparse
+
+from PIL import Image, ImageDraw, ImageFont
+
+# (name, width, height, lines of text, font size); 0 lines means no text
+PROFILES = [
+    ('phone_sparse', 1170, 2532, 6, 44),
+    ('phone_dense', 1170, 2532, 60, 34),
+    ('laptop_sparse', 1440, 900, 5, 22),
+    ('laptop_dense', 1440, 900, 38, 16),
+    ('desktop_dense', 1920, 1080, 45, 18),
+    ('retina_dense', 2880, 1800, 70, 28),
+    ('tall_scroll', 1080, 9000, 260, 26),
+    ('no_text', 1920, 1080, 0, 0),
+]
+
+# TrueType fonts tried in order; PIL's built-in font is used when none exist
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/Library/Fonts/Arial.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    'C:\\Windows\\Fonts\\arial.ttf',
+]
+
+# Sentences the analyzer reacts to (urgency, actions, dates) mixed with filler
+SENTENCES = [
+    "Reminder: submit the quarterly report by Friday.",
+    "URGENT: server maintenance tonight at 23:00.",
+    "Please confirm your email address to finish signing up.",
+    "Invoice #{n} is due next week, pay online to avoid late fees.",
+    "Flight departs tomorrow 09:40 from Terminal {n}.",
+    "Meeting moved to Jan {day} at 14:00, update your calendar.",
+    "TODO: renew passport, book dentist, backup laptop",
+    "Your order #{n} has shipped and arrives in 3-5 business days.",
+    "Weather today: partly cloudy, high of {day}, light winds.",
+    "Photo album shared with you ({n} photos)",
+    "Recipe: whisk two eggs with flour and milk, rest for an hour.",
+    "Release notes v{day}.{n}: bug fixes and performance improvements.",
+    "Call back the support team before the deadline on {month}/{day}.",
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit.",
+]
+
+def available_fonts():
+    """Paths of the candidate TrueType fonts installed on this machine"""
+    return [path for path in FONT_CANDIDATES if os.path.exists(path)]
+
+def _load_font(rng, fonts, size):
+    if fonts:
+        return ImageFont.truetype(rng.choice(fonts), size)
+    try:
+        # Pillow >= 10.1 can scale its built-in font
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+def _sentence(rng):
+    return rng.choice(SENTENCES).format(n=rng.randint(10, 99999), day=rng.randint(1, 28), month=rng.randint(1, 12))
+
+def draw_screenshot(rng, profile, fonts):
+    """Draw one synthetic screenshot for a profile, returns a PIL image"""
+    _name, width, height, lines, font_size = profile
+
+    if lines == 0:
+        # Photo-like content: a gradient with noisy blocks and no text
+        image = Image.new('RGB', (width, height))
+        draw = ImageDraw.Draw(image)
+        top, bottom = [rng.randint(0, 255) for _ in range(3)], [rng.randint(0, 255) for _ in range(3)]
+        for y in range(0, height, 4):
+            t = y / height
+            color = tuple(int(a + (b - a) * t) for a, b in zip(top, bottom))
+            draw.rectangle([0, y, width, y + 4], fill=color)
+        for _ in range(40):
+            x, y = rng.randint(0, width), rng.randint(0, height)
+            size = rng.randint(20, 300)
+            draw.ellipse([x, y, x + size, y + size], fill=tuple(rng.randint(0, 255) for _ in range(3)))
+        return image
+
+    dark = rng.random() < 0.25
+    background, foreground = ((24, 24, 28), (230, 230, 230)) if dark else ((255, 255, 255), (20, 20, 20))
+    image = Image.new('RGB', (width, height), background)
+    draw = ImageDraw.Draw(image)
+    font = _load_font(rng, fonts, font_size)
+
+    # App chrome: a title bar and a couple of buttons
+    bar_height = max(40, font_size * 2)
+    draw.rectangle([0, 0, width, bar_height], fill=(60, 110, 200))
+    draw.text((20, bar_height // 4), _sentence(rng)[:30], fill=(255, 255, 255), font=font)
+
+    line_height = int(font_size * 1.5)
+    # Spread the lines over the page so sparse profiles leave whitespace
+    spacing = max(line_height, (height - bar_height - 40) // max(lines, 1))
+    y = bar_height + 20
+    for _ in range(lines):
+        if y + line_height > height:
+            break
+        text = _sentence(rng)
+        while draw.textlength(text, font=font) < width * 0.6 and rng.random() < 0.5:
+            text += ' ' + _sentence(rng)
+        draw.text((30, y), text, fill=foreground, font=font)
+        y += spacing
+
+    if rng.random() < 0.5:
+        x = width - 260
+        draw.rounded_rectangle([x, height - 120, x + 220, height - 60], radius=12, fill=(60, 110, 200))
+        draw.text((x + 30, height - 110), 'Confirm', fill=(255, 255, 255), font=font)
+    return image
+
+def generate(output_dir, count, seed=1, profiles=None):
+    """
+    Write count screenshots to output_dir, cycling through the profiles.
+    Returns a list of {'path', 'profile', 'width', 'height'} dicts.
+    """
+    profiles = profiles or PROFILES
+    fonts = available_fonts()
+    os.makedirs(output_dir, exist_ok=True)
+
+    corpus = []
+    for i in range(count):
+        profile = profiles[i % len(profiles)]
+        # Seed per image so any image can be regenerated on its own
+        rng = random.Random(f'{seed}:{i}')
+        image = draw_screenshot(rng, profile, fonts)
+        path = os.path.join(output_dir, f'{i:05d}_{profile[0]}.png')
+        image.save(path, format='PNG')
+        corpus.append({'path': path, 'profile': profile[0], 'width': profile[1], 'height': profile[2]})
+    return corpus
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic screenshot corpus")
+    parser.add_argument('--count', type=int, default=len(PROFILES) * 5, help="Number of screenshots")
+    parser.add_argument('--seed', type=int, default=1, help="Seed; the same seed gives the same corpus")
+    parser.add_argument('--output-dir', default='benchmark_corpus', help="Directory to write the PNGs to")
+    args = parser.parse_args()
+
+    corpus = generate(args.output_dir, args.count, args.seed)
+    fonts = available_fonts()
+    print(f"Wrote {len(corpus)} screenshots to {args.output_dir} "
+          f"using {len(fonts) or 'the built-in'} font{'s' if len(fonts) != 1 else ''}")
+
+if __name__ == '__main__':
+    main()
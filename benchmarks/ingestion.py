@@ -0,0 +1,212 @@
+"""
+Benchmark the DB-mode ingestion pipeline on a synthetic screenshot corpus.
+
+Runs against a throwaway SQLite database and temporary folders, in three parts:
+
+  stages    every stage of the upload path timed separately per image
+            (open, resize, renditions, preprocess, OCR) plus batched NLP
+            and scoring, reported as p50/p95 per stage
+  upload    process_uploaded_screenshots end to end in batches of 10, as
+            the upload route runs it
+  scan      screenshot_manager.scan_for_new_screenshots over a folder
+
+Each part reports images/sec; the run reports peak RSS. Results can be saved
+as JSON with --output to compare runs.
+
+    python -m benchmarks.ingestion [--count 40] [--seed 1] [--parts stages,upload,scan]
+                                   [--output results/ingestion.json]
+"""
+
+import os
+import shutil
+import argparse
+import tempfile
+
+from benchmarks.common import Timer, environment, peak_rss_mb, summarize_latencies, write_results
+from benchmarks import corpus as corpus_module
+
+STAGES = ['open', 'resize', 'renditions', 'preprocess', 'ocr', 'nlp', 'score']
+
+# Upload batches, as in the upload route
+BATCH_SIZE = 10
+
+def configure_environment(workdir):
+    """Point the app at throwaway storage; must run before app is imported"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    os.environ['SCREENSHOTS_FOLDER'] = os.path.join(workdir, 'screenshots')
+    os.environ['DOCUMENTS_FOLDER'] = os.path.join(workdir, 'documents')
+    os.environ['RENDITIONS_FOLDER'] = os.path.join(workdir, 'renditions')
+    os.environ['DEADLINE_RERANK_INTERVAL'] = '0'
+
+def copy_corpus(corpus, folder):
+    """Fresh copies of the corpus images (ingestion resizes files in place)"""
+    os.makedirs(folder, exist_ok=True)
+    copies = []
+    for item in corpus:
+        path = os.path.join(folder, os.path.basename(item['path']))
+        shutil.copyfile(item['path'], path)
+        copies.append(dict(item, path=path))
+    return copies
+
+def run_stages(app_module, images):
+    """Time each ingestion stage separately for every image"""
+    import pytesseract
+    from PIL import Image
+    import nlp_analyzer
+    import scoring
+    import renditions
+
+    timings = {stage: [] for stage in STAGES}
+    texts = []
+
+    with Timer() as total:
+        for item in images:
+            path = item['path']
+
+            with Timer() as t:
+                image = Image.open(path)
+                image.load()
+            timings['open'].append(t.elapsed)
+
+            with Timer() as t:
+                if image.width > 1500 or image.height > 1500:
+                    image.thumbnail((1500, 1500), Image.LANCZOS)
+                    image.save(path)
+            image.close()
+            timings['resize'].append(t.elapsed)
+
+            with Timer() as t:
+                renditions.generate_renditions(path)
+            timings['renditions'].append(t.elapsed)
+
+            with Timer() as t:
+                processed_path = app_module.preprocess_image_for_ocr(path)
+            timings['preprocess'].append(t.elapsed)
+
+            with Timer() as t:
+                text = pytesseract.image_to_string(Image.open(processed_path), config=r'--oem 3 --psm 6 -l eng')
+            timings['ocr'].append(t.elapsed)
+            texts.append(text)
+
+            if processed_path != path and os.path.exists(processed_path):
+                os.remove(processed_path)
+
+        # NLP runs batched in the pipeline, so it is timed per batch and spread over the batch
+        for i in range(0, len(texts), BATCH_SIZE):
+            batch = [text for text in texts[i:i + BATCH_SIZE] if text.strip()]
+            if not batch:
+                continue
+            with Timer() as t:
+                features = nlp_analyzer.extract_features_batch(batch)
+            timings['nlp'].extend([t.elapsed / len(batch)] * len(batch))
+
+            with Timer() as t:
+                for record in features:
+                    scoring.priority_score(*scoring.score_features(record))
+            timings['score'].extend([t.elapsed / len(batch)] * len(batch))
+
+    return {
+        'images': len(images),
+        'seconds': total.elapsed,
+        'images_per_second': len(images) / total.elapsed if total.elapsed else None,
+        'stages': {stage: summarize_latencies(values) for stage, values in timings.items()},
+        'text_chars': sum(len(text) for text in texts),
+    }
+
+def run_upload(app_module, flask_app, images):
+    """process_uploaded_screenshots end to end, in upload-sized batches"""
+    file_infos = [{'path': item['path'], 'filename': os.path.basename(item['path'])} for item in images]
+    batch_latencies = []
+    saved = 0
+
+    with flask_app.app_context():
+        with Timer() as total:
+            for i in range(0, len(file_infos), BATCH_SIZE):
+                with Timer() as t:
+                    saved += app_module.process_uploaded_screenshots(file_infos[i:i + BATCH_SIZE])
+                batch_latencies.append(t.elapsed)
+
+    return {
+        'images': len(images),
+        'saved': saved,
+        'seconds': total.elapsed,
+        'images_per_second': len(images) / total.elapsed if total.elapsed else None,
+        'batch_latency': summarize_latencies(batch_latencies),
+    }
+
+def run_scan(flask_app, images):
+    """scan_for_new_screenshots over a folder holding the corpus"""
+    import screenshot_manager
+
+    with flask_app.app_context():
+        with Timer() as total:
+            found = screenshot_manager.scan_for_new_screenshots()
+
+    return {
+        'images': len(images),
+        'found': found,
+        'seconds': total.elapsed,
+        'images_per_second': found / total.elapsed if total.elapsed else None,
+    }
+
+def print_summary(results):
+    for part in ('stages', 'upload', 'scan'):
+        result = results['parts'].get(part)
+        if not result:
+            continue
+        print(f"{part:>8}: {result['images']} images in {result['seconds']:.2f}s "
+              f"({result['images_per_second'] or 0:.2f} images/sec)")
+        if part == 'stages':
+            for stage, latency in result['stages'].items():
+                if latency['count']:
+                    print(f"          {stage:<11} p50 {latency['p50_ms']:8.2f}ms   p95 {latency['p95_ms']:8.2f}ms")
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark screenshot ingestion on a synthetic corpus")
+    parser.add_argument('--count', type=int, default=len(corpus_module.PROFILES) * 5,
+                        help="Screenshots in the generated corpus")
+    parser.add_argument('--seed', type=int, default=1, help="Corpus seed")
+    parser.add_argument('--parts', default='stages,upload,scan',
+                        help="Comma-separated parts to run (stages, upload, scan)")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary working directory")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    args = parser.parse_args()
+    parts = [part.strip() for part in args.parts.split(',') if part.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='noravue-ingestion-')
+    configure_environment(workdir)
+    try:
+        corpus = corpus_module.generate(os.path.join(workdir, 'corpus'), args.count, args.seed)
+        print(f"Generated {len(corpus)} screenshots in {workdir}")
+
+        # Imported only now, so it picks up the throwaway storage configured above
+        import app as app_module
+        flask_app = app_module.create_app()
+
+        results = {
+            'environment': environment(),
+            'corpus': {'count': len(corpus), 'seed': args.seed, 'fonts': corpus_module.available_fonts()},
+            'parts': {},
+        }
+        with flask_app.app_context():
+            if 'stages' in parts:
+                results['parts']['stages'] = run_stages(app_module, copy_corpus(corpus, os.path.join(workdir, 'stages')))
+        if 'upload' in parts:
+            upload_folder = os.path.join(os.environ['SCREENSHOTS_FOLDER'], 'upload')
+            results['parts']['upload'] = run_upload(app_module, flask_app, copy_corpus(corpus, upload_folder))
+        if 'scan' in parts:
+            scan_folder = os.path.join(os.environ['DOCUMENTS_FOLDER'], 'scan')
+            results['parts']['scan'] = run_scan(flask_app, copy_corpus(corpus, scan_folder))
+        results['peak_rss_mb'] = peak_rss_mb()
+
+        print_summary(results)
+        write_results(results, args.output)
+    finally:
+        if args.keep:
+            print(f"Kept working directory {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+Load test the triage API at realistic library sizes.
+
+Seeds N synthetic screenshots, then runs concurrent virtual users that
+replay the carousel's request mix (list the queue, dismiss, undo, check for
+dismissed items, and the occasional dismiss-all / restore-all) for a fixed
+time. Reports throughput and per-endpoint latency percentiles.
+
+    python -m benchmarks.load_test --app db --rows 100000 --users 8 --duration 30
+    python -m benchmarks.load_test --app both --rows 1000,10000 --output results/load.json
+
+By default the app is driven in process through Flask's test client, against
+a throwaway database (DB mode) or session store (session mode). With --url
+the requests go to a running server instead; seed it by pointing the server
+and this tool at the same storage:
+
+    DATABASE_URL=sqlite:////tmp/load.db python main.py &
+    DATABASE_URL=sqlite:////tmp/load.db python -m benchmarks.load_test --app db --url http://localhost:5000
+
+In session mode the rows are written straight into each virtual user's
+session, which with --url requires the server's SQLite session store
+(--session-db, the server's SESSION_SQLITE_PATH).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.cookiejar
+import urllib.error
+import urllib.request
+
+from benchmarks.common import Timer, environment, peak_rss_mb, summarize_latencies, write_results
+
+# The carousel's request mix: (operation, weight)
+REQUEST_MIX = [
+    ('list', 20),
+    ('dismiss', 40),
+    ('restore', 15),
+    ('has_dismissed', 20),
+    ('dismiss_all', 1),
+    ('restore_all', 1),
+]
+
+ROUTES = {
+    'db': {
+        'list': ('GET', '/api/screenshots'),
+        'dismiss': ('POST', '/api/screenshots/{id}/dismiss'),
+        'restore': ('POST', '/api/screenshots/{id}/restore'),
+        'has_dismissed': ('GET', '/api/has-dismissed-screenshots'),
+        'dismiss_all': ('POST', '/api/dismiss-all'),
+        'restore_all': ('POST', '/api/restore-dismissed'),
+    },
+    'session': {
+        'list': ('GET', '/api/screenshots'),
+        'dismiss': ('POST', '/api/dismiss/{id}'),
+        'restore': ('POST', '/api/restore/{id}'),
+        'has_dismissed': ('GET', '/api/has-dismissed-screenshots'),
+        'dismiss_all': ('POST', '/api/dismiss-all'),
+        'restore_all': ('POST', '/api/restore-dismissed'),
+    },
+}
+
+# Ids a virtual user remembers from its last listing
+MAX_KNOWN_IDS = 1000
+
+SEED_CHUNK = 10000
+
+WORDS = ("reminder submit report friday urgent server maintenance tonight confirm email "
+         "invoice due next week flight tomorrow meeting calendar renew passport order shipped "
+         "weather photos recipe release notes deadline call support").split()
+
+def synthetic_text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 40)))
+
+class InProcessClient:
+    """Requests through Flask's test client (one per virtual user, it keeps the cookies)"""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+
+    def request(self, method, path):
+        response = self.client.open(path, method=method, json={} if method == 'POST' else None)
+        return response.status_code, response.get_data()
+
+    def cookie(self, name):
+        cookie = self.client.get_cookie(name)
+        return cookie.value if cookie else None
+
+class HttpClient:
+    """Requests to a running server, with a cookie jar per virtual user"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def request(self, method, path):
+        data = b'{}' if method == 'POST' else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def cookie(self, name):
+        for cookie in self.cookies:
+            if cookie.name == name:
+                return cookie.value
+        return None
+
+class Stats:
+    """Latencies and errors per operation, shared by the virtual users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {operation: [] for operation, _weight in REQUEST_MIX}
+        self.errors = {operation: 0 for operation, _weight in REQUEST_MIX}
+
+    def record(self, operation, seconds, ok):
+        with self.lock:
+            self.latencies[operation].append(seconds)
+            if not ok:
+                self.errors[operation] += 1
+
+class VirtualUser(threading.Thread):
+    """Replays the request mix until the deadline"""
+
+    def __init__(self, client, routes, stats, deadline, seed):
+        super().__init__(daemon=True)
+        self.client = client
+        self.routes = routes
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.known_ids = []
+        self.dismissed_ids = []
+        operations, weights = zip(*REQUEST_MIX)
+        self.operations = operations
+        self.weights = weights
+
+    def run(self):
+        # Start like the carousel does, with the queue
+        self.call('list')
+        while time.time() < self.deadline:
+            self.call(self.rng.choices(self.operations, self.weights)[0])
+
+    def call(self, operation):
+        screenshot_id = None
+        if operation == 'dismiss':
+            if not self.known_ids:
+                operation = 'list'
+            else:
+                screenshot_id = self.known_ids.pop(self.rng.randrange(len(self.known_ids)))
+        elif operation == 'restore':
+            if not self.dismissed_ids:
+                operation = 'has_dismissed'
+            else:
+                screenshot_id = self.dismissed_ids.pop()
+
+        method, path = self.routes[operation]
+        with Timer() as timer:
+            status, body = self.client.request(method, path.format(id=screenshot_id))
+        # A 404 for an item another user already dismissed is expected under load
+        ok = status < 400 or (status == 404 and screenshot_id is not None)
+        self.stats.record(operation, timer.elapsed, ok)
+
+        if operation == 'list' and status == 200:
+            ids = [item['id'] for item in json.loads(body)]
+            self.known_ids = self.rng.sample(ids, min(len(ids), MAX_KNOWN_IDS))
+        elif operation == 'dismiss' and status == 200:
+            self.dismissed_ids.append(screenshot_id)
+        elif operation == 'dismiss_all':
+            self.known_ids = []
+
+def seed_db(app_module, flask_app, rows, seed):
+    """Insert rows synthetic Screenshot records in bulk, returns the seconds taken"""
+    from sqlalchemy import insert
+
+    rng = random.Random(seed)
+    now = time.time()
+    with flask_app.app_context(), Timer() as timer:
+        db, Screenshot = app_module.db, app_module.Screenshot
+        existing = db.session.query(Screenshot).count()
+        for start in range(existing, rows, SEED_CHUNK):
+            chunk = []
+            for i in range(start, min(rows, start + SEED_CHUNK)):
+                urgency, action = rng.random(), rng.random()
+                deferred = rng.random() < 0.05
+                chunk.append({
+                    'filename': f'load_{i:07d}.png',
+                    'path': f'load_test/{i:07d}.png',
+                    'text_content': synthetic_text(rng),
+                    'urgency_score': urgency,
+                    'action_score': action,
+                    'priority_score': 0.6 * urgency + 0.4 * action,
+                    'dismissed': rng.random() < 0.2,
+                    'deferred_until': datetime.datetime.fromtimestamp(now + 86400) if deferred else None,
+                })
+            db.session.execute(insert(Screenshot), chunk)
+            db.session.commit()
+    return timer.elapsed
+
+def seed_session(backend, sid, rows, seed, lifetime):
+    """Write rows synthetic screenshots into one session's stored state"""
+    from session_manager import SessionScreenshot, SessionState, STATE_KEY
+
+    rng = random.Random(seed)
+    state = SessionState()
+    for i in range(rows):
+        urgency, action = rng.random(), rng.random()
+        # Numeric ids, the session routes take integer ids
+        state.add(SessionScreenshot(
+            id=str(i + 1),
+            filename=f'load_{i:07d}.png',
+            path=f'temp_uploads/load_{i:07d}.png',
+            text_content=synthetic_text(rng),
+            priority_score=0.6 * urgency + 0.4 * action,
+            urgency_score=urgency,
+            action_score=action,
+            dismissed=rng.random() < 0.2,
+        ))
+    backend.save(sid, {STATE_KEY: state}, time.time() + lifetime)
+
+def load_app(mode, workdir, throwaway=True):
+    """
+    Import and create the app for a mode, returns (module, app). In-process
+    runs get throwaway storage; for a running server the environment's
+    DATABASE_URL is kept so the seed reaches it.
+    """
+    if throwaway:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+        os.environ['SESSION_SQLITE_PATH'] = os.path.join(workdir, 'sessions.db')
+    os.environ['DEADLINE_RERANK_INTERVAL'] = '0'
+    if mode == 'db':
+        import app as app_module
+    else:
+        import app_session as app_module
+    return app_module, app_module.create_app()
+
+def run(mode, rows, users, duration, url=None, session_db=None, seed=1):
+    """Seed and load test one app at one library size, returns the results"""
+    workdir = tempfile.mkdtemp(prefix='noravue-load-')
+    try:
+        app_module = flask_app = None
+        if url is None or mode == 'db':
+            app_module, flask_app = load_app(mode, workdir, throwaway=url is None)
+
+        def make_client():
+            return HttpClient(url) if url else InProcessClient(flask_app)
+
+        clients = [make_client() for _ in range(users)]
+        seed_seconds = 0.0
+        if mode == 'db':
+            seed_seconds = seed_db(app_module, flask_app, rows, seed)
+        else:
+            if url:
+                if not session_db:
+                    raise SystemExit("--session-db is required to seed a running session-mode server")
+                import session_store
+                backend = session_store.SQLiteBackend(session_db)
+                cookie_name, lifetime = 'session', 8 * 3600
+            else:
+                backend = flask_app.session_interface.backend
+                cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+                lifetime = flask_app.permanent_session_lifetime.total_seconds()
+
+            with Timer() as timer:
+                for i, client in enumerate(clients):
+                    # The first request creates the session, then its state is replaced
+                    client.request('GET', '/api/changes/snapshot')
+                    seed_session(backend, client.cookie(cookie_name), rows, seed + i, lifetime)
+            seed_seconds = timer.elapsed
+
+        stats = Stats()
+        deadline = time.time() + duration
+        virtual_users = [VirtualUser(client, ROUTES[mode], stats, deadline, seed + i)
+                         for i, client in enumerate(clients)]
+        with Timer() as timer:
+            for user in virtual_users:
+                user.start()
+            for user in virtual_users:
+                user.join()
+
+        total_requests = sum(len(values) for values in stats.latencies.values())
+        return {
+            'app': mode,
+            'rows': rows,
+            'users': users,
+            'target': url or 'in-process',
+            'seed_seconds': seed_seconds,
+            'seconds': timer.elapsed,
+            'requests': total_requests,
+            'requests_per_second': total_requests / timer.elapsed if timer.elapsed else None,
+            'errors': sum(stats.errors.values()),
+            'endpoints': {
+                operation: dict(summarize_latencies(values), errors=stats.errors[operation])
+                for operation, values in stats.latencies.items()
+            },
+            'peak_rss_mb': peak_rss_mb(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_child(mode, rows, args):
+    """Run one app and library size in a fresh subprocess (fresh imports and storage)"""
+    command = [sys.executable, '-m', 'benchmarks.load_test', '--child', '--app', mode, '--rows', str(rows),
+               '--users', str(args.users), '--duration', str(args.duration), '--seed', str(args.seed)]
+    if args.url:
+        command += ['--url', args.url]
+    if args.session_db:
+        command += ['--session-db', args.session_db]
+    output = subprocess.run(
+        command, check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def print_result(result):
+    print(f"{result['app']:>8} app, {result['rows']} rows, {result['users']} users ({result['target']}): "
+          f"{result['requests_per_second'] or 0:.1f} req/s, {result['errors']} errors, "
+          f"seeded in {result['seed_seconds']:.1f}s")
+    for operation, latency in result['endpoints'].items():
+        if latency['count']:
+            print(f"          {operation:<14} n={latency['count']:<6} p50 {latency['p50_ms']:8.2f}ms   "
+                  f"p95 {latency['p95_ms']:8.2f}ms   p99 {latency['p99_ms']:8.2f}ms   errors {latency['errors']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the triage API endpoints")
+    parser.add_argument('--app', choices=['db', 'session', 'both'], default='both', help="Which app to test")
+    parser.add_argument('--rows', default='1000,10000',
+                        help="Comma-separated library sizes (DB rows, or screenshots per session)")
+    parser.add_argument('--users', type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds of load per run")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the synthetic data and request mix")
+    parser.add_argument('--url', help="Base URL of a running server instead of the in-process test client")
+    parser.add_argument('--session-db', help="The running server's SQLite session store (session mode with --url)")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.app, int(args.rows), args.users, args.duration, args.url, args.session_db, args.seed)))
+        return
+
+    modes = ['db', 'session'] if args.app == 'both' else [args.app]
+    results = {'environment': environment(), 'runs': []}
+    for mode in modes:
+        for rows in [int(value) for value in args.rows.split(',')]:
+            result = run_child(mode, rows, args)
+            results['runs'].append(result)
+            print_result(result)
+
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
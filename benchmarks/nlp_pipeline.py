@@ -0,0 +1,106 @@
+"""
+Compare the full en_core_web_sm pipeline with the analyzer's trimmed one.
+
+Each mode runs in a fresh subprocess so resident memory is measured
+independently. Reports per-document latency of nlp_analyzer.analyze_text
+and the RSS added by loading the model.
+
+    python -m benchmarks.nlp_pipeline [--repeat 20] [--output results/nlp_pipeline.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from benchmarks.common import Timer, current_rss_mb, environment, summarize_latencies, write_results
+
+# OCR-like texts; roughly half contain no date words
+SAMPLE_TEXTS = [
+    "Reminder: submit the quarterly report by Friday. Don't forget to attach the receipts.",
+    "Your order #48213 has shipped and will arrive in 3-5 business days.",
+    "URGENT: server maintenance tonight at 23:00, please save your work before then.",
+    "Meeting notes\n- review budget\n- schedule follow-up with design team\n- update roadmap",
+    "Flight BA117 departs tomorrow 09:40 from Terminal 5. Check in online now.",
+    "Photo album shared with you: Summer trip 2023 (42 photos)",
+    "You need to confirm your email address to finish creating your account.",
+    "Invoice due next week. Pay online or call billing to set up a payment plan.",
+    "Weather: partly cloudy, high of 21, low of 14. Light winds from the west.",
+    "Last chance! Registration closes this week for the spring workshop series.",
+    "Recipe: whisk two eggs with flour and milk, rest the batter for an hour.",
+    "TODO: backup laptop, renew passport, book dentist appointment",
+]
+
+def run_child(mode, repeat):
+    """Measure one pipeline mode inside this process and return the results"""
+    rss_before = current_rss_mb()
+
+    import nlp_analyzer
+
+    with Timer() as load_timer:
+        nlp_analyzer.init(trimmed=(mode == 'trimmed'))
+    if nlp_analyzer.nlp is None:
+        raise RuntimeError("spaCy model en_core_web_sm could not be loaded")
+    rss_loaded = current_rss_mb()
+
+    # Warm up caches and lazy allocations
+    for text in SAMPLE_TEXTS:
+        nlp_analyzer.analyze_text(text)
+
+    latencies = []
+    for _ in range(repeat):
+        for text in SAMPLE_TEXTS:
+            with Timer() as timer:
+                nlp_analyzer.analyze_text(text)
+            latencies.append(timer.elapsed)
+
+    return {
+        'mode': mode,
+        'components': list(nlp_analyzer.nlp.pipe_names),
+        'load_seconds': load_timer.elapsed,
+        'model_rss_mb': rss_loaded - rss_before,
+        'final_rss_mb': current_rss_mb(),
+        'docs': len(latencies),
+        'docs_per_second': len(latencies) / sum(latencies),
+        'latency': summarize_latencies(latencies),
+    }
+
+def run_mode(mode, repeat):
+    """Run one mode in a subprocess and parse its JSON output"""
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.nlp_pipeline', '--child', mode, '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full vs trimmed spaCy pipeline")
+    parser.add_argument('--repeat', type=int, default=20, help="Passes over the sample texts per mode")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--child', choices=['full', 'trimmed'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.repeat)))
+        return
+
+    results = {'environment': environment(), 'modes': {}}
+    for mode in ('full', 'trimmed'):
+        result = run_mode(mode, args.repeat)
+        results['modes'][mode] = result
+        latency = result['latency']
+        print(f"{mode:>8}: {', '.join(result['components'])}")
+        print(f"          load {result['load_seconds']:.2f}s, model RSS {result['model_rss_mb']:.1f}MB, "
+              f"p50 {latency['p50_ms']:.2f}ms, p95 {latency['p95_ms']:.2f}ms, "
+              f"{result['docs_per_second']:.0f} docs/sec")
+
+    full, trimmed = results['modes']['full'], results['modes']['trimmed']
+    print(f"Trimmed pipeline: {full['latency']['mean_ms'] / trimmed['latency']['mean_ms']:.2f}x faster per doc, "
+          f"{full['model_rss_mb'] - trimmed['model_rss_mb']:.1f}MB less resident memory")
+
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""
+Speed and accuracy regression check for the NLP analyzer.
+
+Runs a fixed corpus of labelled OCR-like texts (benchmarks/data/nlp_corpus.json)
+through both analyzer paths, the spaCy one (nlp_analyzer.analyze_text) and the
+keyword fallback (nlp_analyzer._fallback_analyze_text), and reports:
+
+  speed     docs/sec and per-document latency p50/p95 for each path
+  drift     largest change in urgency, action and priority scores against the
+            golden outputs in benchmarks/data/nlp_golden.json
+  ranking   Kendall's tau between the golden and current priority orderings,
+            and the pairs of documents whose order flipped
+  labels    how often a higher-labelled text (high > medium > low) outranks
+            a lower-labelled one
+
+Scores are computed with the default weights (SCORING_WEIGHTS is ignored) and
+deadlines are resolved against a fixed reference time, so the golden outputs
+don't depend on the day the check runs. The exit status is non-zero if any
+score drifts by more than --tolerance or tau falls below --min-tau, so
+performance work on the analyzer can't silently change rankings. It also
+fails when an engine can't run or has no golden outputs (or only some), or
+when the goldens were recorded against another reference time, so a check
+that compared nothing never passes. After an intended scoring change, or to
+record an engine's first goldens, rewrite them with --update-golden; goldens
+of other engines recorded against another reference time are dropped then.
+
+    python -m benchmarks.nlp_regression [--repeat 5] [--engines spacy,keywords]
+                                        [--tolerance 0.001] [--min-tau 0.99]
+                                        [--update-golden] [--output results/nlp_regression.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import datetime
+
+from benchmarks.common import Timer, environment, summarize_latencies, write_results
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CORPUS_PATH = os.path.join(DATA_DIR, 'nlp_corpus.json')
+GOLDEN_PATH = os.path.join(DATA_DIR, 'nlp_golden.json')
+
+# Deadlines in the corpus are resolved against this time (a Wednesday morning)
+REFERENCE_TIME = datetime.datetime(2024, 3, 6, 9, 0)
+
+ENGINES = ['spacy', 'keywords']
+LABEL_RANK = {'low': 0, 'medium': 1, 'high': 2}
+
+# Decimal places kept in the golden outputs
+PRECISION = 6
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+def load_golden(path=GOLDEN_PATH):
+    """Golden outputs as {'reference_time', 'engines': {engine: {doc id: scores}}}, empty if missing"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'reference_time': REFERENCE_TIME.isoformat(), 'engines': {}}
+
+def init_engine(engine):
+    """Import the analyzer, loading spaCy for the spacy engine; returns False if it can't run"""
+    import nlp_analyzer
+
+    if engine == 'spacy' and nlp_analyzer.nlp is None:
+        nlp_analyzer.init()
+        if nlp_analyzer.nlp is None:
+            return False
+    return True
+
+def score_corpus(engine, corpus):
+    """Scores of every corpus text for one engine, with pinned weights and reference time"""
+    import nlp_analyzer
+    import scoring
+    import deadlines
+
+    extract = nlp_analyzer.extract_features if engine == 'spacy' else nlp_analyzer._fallback_features
+    scores = {}
+    for doc in corpus:
+        features = extract(doc['text'])
+        features['due_at'] = deadlines.extract_due_at(doc['text'], REFERENCE_TIME)
+        urgency, action = scoring.score_features(features, weights={}, now=REFERENCE_TIME)
+        scores[doc['id']] = {
+            'urgency': round(urgency, PRECISION),
+            'action': round(action, PRECISION),
+            'priority': round(scoring.priority_score(urgency, action, weights={}), PRECISION),
+        }
+    return scores
+
+def time_engine(engine, corpus, repeat):
+    """Per-document latency of the analyzer entry point for one engine"""
+    import nlp_analyzer
+
+    analyze = nlp_analyzer.analyze_text if engine == 'spacy' else nlp_analyzer._fallback_analyze_text
+    texts = [doc['text'] for doc in corpus]
+
+    # Warm up caches and lazy allocations
+    for text in texts:
+        analyze(text)
+
+    latencies = []
+    with Timer() as total:
+        for _ in range(repeat):
+            for text in texts:
+                with Timer() as timer:
+                    analyze(text)
+                latencies.append(timer.elapsed)
+
+    return {
+        'docs': len(latencies),
+        'docs_per_second': len(latencies) / total.elapsed if total.elapsed else None,
+        'latency': summarize_latencies(latencies),
+    }
+
+def kendall_tau(xs, ys):
+    """Kendall's tau-b between two equally long lists of scores (1.0 = same ordering)"""
+    concordant = discordant = ties_x = ties_y = 0
+    for i in range(len(xs)):
+        for j in range(i + 1, len(xs)):
+            dx, dy = xs[i] - xs[j], ys[i] - ys[j]
+            if dx == 0 and dy == 0:
+                continue
+            if dx == 0:
+                ties_x += 1
+            elif dy == 0:
+                ties_y += 1
+            elif (dx > 0) == (dy > 0):
+                concordant += 1
+            else:
+                discordant += 1
+    denominator = ((concordant + discordant + ties_x) * (concordant + discordant + ties_y)) ** 0.5
+    return (concordant - discordant) / denominator if denominator else 1.0
+
+def flipped_pairs(ids, golden, current):
+    """Pairs of doc ids the golden scores order one way and the current scores the other"""
+    flips = []
+    for i in range(len(ids)):
+        for j in range(i + 1, len(ids)):
+            before = golden[ids[i]] - golden[ids[j]]
+            after = current[ids[i]] - current[ids[j]]
+            if before * after < 0:
+                flips.append((ids[i], ids[j]))
+    return flips
+
+def label_agreement(corpus, priorities):
+    """Share of differently labelled pairs where the higher label has the higher priority"""
+    agree = total = 0
+    for i, a in enumerate(corpus):
+        for b in corpus[i + 1:]:
+            label_diff = LABEL_RANK[a['label']] - LABEL_RANK[b['label']]
+            if label_diff == 0:
+                continue
+            total += 1
+            if label_diff * (priorities[a['id']] - priorities[b['id']]) > 0:
+                agree += 1
+    return agree / total if total else None
+
+def compare(corpus, golden, current):
+    """Drift and ranking changes of current scores against the golden ones"""
+    ids = [doc['id'] for doc in corpus if doc['id'] in golden]
+    missing = [doc['id'] for doc in corpus if doc['id'] not in golden]
+
+    drift = {}
+    for key in ('urgency', 'action', 'priority'):
+        diffs = {doc_id: abs(current[doc_id][key] - golden[doc_id][key]) for doc_id in ids}
+        worst = max(diffs, key=diffs.get) if diffs else None
+        drift[key] = {'max': diffs[worst] if worst else 0.0, 'doc': worst,
+                      'changed': sum(1 for diff in diffs.values() if diff > 0)}
+
+    golden_priority = {doc_id: golden[doc_id]['priority'] for doc_id in ids}
+    current_priority = {doc_id: current[doc_id]['priority'] for doc_id in ids}
+    return {
+        'compared': len(ids),
+        'missing_golden': missing,
+        'drift': drift,
+        'kendall_tau': kendall_tau([golden_priority[i] for i in ids], [current_priority[i] for i in ids]),
+        'flipped_pairs': flipped_pairs(ids, golden_priority, current_priority),
+    }
+
+def print_engine(engine, result):
+    speed = result['speed']
+    print(f"{engine:>9}: {speed['docs_per_second']:.0f} docs/sec, "
+          f"p50 {speed['latency']['p50_ms']:.3f}ms, p95 {speed['latency']['p95_ms']:.3f}ms, "
+          f"label agreement {result['label_agreement']:.1%}")
+    comparison = result.get('comparison')
+    if comparison is None:
+        print("           no golden outputs for this engine, record them with --update-golden")
+        return
+    drift = comparison['drift']
+    print(f"           drift urgency {drift['urgency']['max']:.6f}, action {drift['action']['max']:.6f}, "
+          f"priority {drift['priority']['max']:.6f} ({drift['priority']['changed']} of {comparison['compared']} docs changed)")
+    print(f"           Kendall tau {comparison['kendall_tau']:.4f}, {len(comparison['flipped_pairs'])} flipped pairs")
+    for a, b in comparison['flipped_pairs'][:5]:
+        print(f"             {a} <-> {b}")
+    if comparison['missing_golden']:
+        print(f"           {len(comparison['missing_golden'])} docs have no golden output: "
+              f"{', '.join(comparison['missing_golden'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NLP analyzer and check its scores against golden outputs")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed passes over the corpus per engine")
+    parser.add_argument('--engines', default=','.join(ENGINES), help="Comma-separated engines (spacy, keywords)")
+    parser.add_argument('--tolerance', type=float, default=0.001, help="Largest allowed score drift")
+    parser.add_argument('--min-tau', type=float, default=0.99, help="Smallest allowed Kendall tau of the priority ranking")
+    parser.add_argument('--update-golden', action='store_true', help="Record the current scores as the golden outputs")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    args = parser.parse_args()
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+
+    corpus = load_corpus()
+    golden = load_golden()
+    results = {'environment': environment(), 'corpus': len(corpus), 'engines': {}}
+    failures = []
+
+    if golden['reference_time'] != REFERENCE_TIME.isoformat():
+        if args.update_golden:
+            golden['engines'] = {}
+        else:
+            failures.append(f"golden outputs were recorded at {golden['reference_time']}, "
+                            f"not {REFERENCE_TIME.isoformat()}; re-record them with --update-golden")
+
+    for engine in engines:
+        if not init_engine(engine):
+            print(f"{engine:>9}: skipped, spaCy model en_core_web_sm could not be loaded")
+            results['engines'][engine] = {'skipped': True}
+            failures.append(f"{engine}: engine could not run, nothing was checked")
+            continue
+
+        scores = score_corpus(engine, corpus)
+        result = {
+            'speed': time_engine(engine, corpus, args.repeat),
+            'label_agreement': label_agreement(corpus, {doc_id: s['priority'] for doc_id, s in scores.items()}),
+        }
+        if engine in golden['engines'] and not args.update_golden:
+            result['comparison'] = compare(corpus, golden['engines'][engine], scores)
+            worst = max(drift['max'] for drift in result['comparison']['drift'].values())
+            if worst > args.tolerance:
+                failures.append(f"{engine}: score drift {worst:.6f} exceeds tolerance {args.tolerance}")
+            if result['comparison']['kendall_tau'] < args.min_tau:
+                failures.append(f"{engine}: Kendall tau {result['comparison']['kendall_tau']:.4f} below {args.min_tau}")
+            if result['comparison']['missing_golden']:
+                failures.append(f"{engine}: {len(result['comparison']['missing_golden'])} docs have no golden output")
+        elif not args.update_golden:
+            failures.append(f"{engine}: no golden outputs, record them with --update-golden")
+        if args.update_golden:
+            golden['engines'][engine] = scores
+        results['engines'][engine] = result
+        print_engine(engine, result)
+
+    if args.update_golden:
+        golden['reference_time'] = REFERENCE_TIME.isoformat()
+        with open(GOLDEN_PATH, 'w') as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Golden outputs written to {GOLDEN_PATH}")
+
+    results['failures'] = failures
+    write_results(results, args.output)
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Per-request cost of the session-mode screenshot state at large session sizes.
+
+Every session-mode request that touches the queue loads the session's whole
+SessionState from the session store, changes it in memory and saves it back
+pickled, so the state's size, not the change, sets the cost of a request.
+This measures those steps for sessions of N screenshots against the SQLite
+session store, without HTTP or Flask in the way:
+
+  load      read the session row and unpickle the state
+  list      promote due deferrals and walk the active index
+  dismiss   dismiss one active screenshot (index update only)
+  save      pickle the state and write it with the versioned save
+  request   load + dismiss + save, what a dismiss request pays
+
+    python -m benchmarks.session_state [--rows 1000,10000,100000] [--repeat 20]
+                                       [--output results/session_state.json]
+
+The full HTTP picture, with concurrent users, is benchmarks.load_test
+--app session.
+"""
+
+import os
+import time
+import pickle
+import random
+import shutil
+import argparse
+import tempfile
+
+from benchmarks.common import Timer, environment, summarize_latencies, write_results
+from benchmarks.load_test import synthetic_text
+
+def build_state(rows, seed):
+    """A SessionState of rows synthetic screenshots, a fifth of them dismissed"""
+    from session_manager import SessionScreenshot, SessionState
+
+    rng = random.Random(seed)
+    state = SessionState()
+    for i in range(rows):
+        urgency, action = rng.random(), rng.random()
+        state.add(SessionScreenshot(
+            id=str(i + 1),
+            filename=f'load_{i:07d}.png',
+            path=f'temp_uploads/load_{i:07d}.png',
+            text_content=synthetic_text(rng),
+            priority_score=0.6 * urgency + 0.4 * action,
+            urgency_score=urgency,
+            action_score=action,
+            dismissed=rng.random() < 0.2,
+        ))
+    return state
+
+def run(rows, repeat, workdir, seed=1):
+    """Time each step for one session size, returns the results"""
+    import session_store
+    from session_manager import STATE_KEY
+
+    backend = session_store.SQLiteBackend(os.path.join(workdir, f'sessions_{rows}.db'))
+    sid, lifetime = f'bench-{rows}', 3600
+    with Timer() as seed_timer:
+        backend.save(sid, {STATE_KEY: build_state(rows, seed)}, time.time() + lifetime)
+
+    timings = {step: [] for step in ('load', 'list', 'dismiss', 'save', 'request')}
+    for _ in range(repeat):
+        with Timer() as load:
+            blob, _expires_at, version = backend.load_blob(sid)
+            data = pickle.loads(blob)
+        state = data[STATE_KEY]
+
+        with Timer() as listing:
+            state.promote_due()
+            state.active_screenshots()
+
+        screenshot_id = state.active[len(state.active) // 2][1]
+        with Timer() as dismiss:
+            state.dismiss(screenshot_id)
+
+        with Timer() as save:
+            backend.save(sid, data, time.time() + lifetime, version)
+
+        for step, timer in (('load', load), ('list', listing), ('dismiss', dismiss), ('save', save)):
+            timings[step].append(timer.elapsed)
+        timings['request'].append(load.elapsed + dismiss.elapsed + save.elapsed)
+
+    return {
+        'rows': rows,
+        'state_mb': len(backend.load_blob(sid)[0]) / (1024 * 1024),
+        'seed_seconds': seed_timer.elapsed,
+        'steps': {step: summarize_latencies(values) for step, values in timings.items()},
+    }
+
+def print_result(result):
+    print(f"{result['rows']:>8} screenshots, {result['state_mb']:.1f}MB pickled state")
+    for step, latency in result['steps'].items():
+        print(f"          {step:<8} p50 {latency['p50_ms']:9.3f}ms   p95 {latency['p95_ms']:9.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the session-mode state per request at large session sizes")
+    parser.add_argument('--rows', default='1000,10000,100000', help="Comma-separated screenshots per session")
+    parser.add_argument('--repeat', type=int, default=20, help="Simulated requests per size")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='noravue-session-state-')
+    try:
+        results = {'environment': environment(), 'runs': []}
+        for rows in [int(value) for value in args.rows.split(',')]:
+            result = run(rows, args.repeat, workdir)
+            results['runs'].append(result)
+            print_result(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results(results, args.output)
+
+if __name__ == '__main__':
+    main()
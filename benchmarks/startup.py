@@ -0,0 +1,158 @@
+"""
+Measure how long the apps take to start and to become ready.
+
+Each app is started in a fresh subprocess against throwaway storage, and
+the run reports:
+
+  import    seconds to import the app module (app for DB mode, main for
+            session mode), which every worker and test pays
+  init      seconds for app.create_app() (DB mode: tables, services, jobs)
+  ready     seconds from process start until /readyz answers 200, i.e.
+            until the warm-up has loaded spaCy and checked Tesseract
+  first     latency of the first /api/screenshots request
+  slowest   the imports with the largest cumulative time (python -X importtime)
+
+With --max-import-seconds the run fails when an import gets slower than
+that, to keep heavy work from creeping back into import time.
+
+    python -m benchmarks.startup [--app db|session|both] [--warmup background|eager|lazy]
+                                 [--max-import-seconds 1.5] [--output results/startup.json]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib
+import tempfile
+import subprocess
+
+from benchmarks.common import Timer, current_rss_mb, environment, write_results
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module each app is imported from
+APP_MODULES = {'db': 'app', 'session': 'main'}
+
+# Longest the child waits for /readyz
+READY_TIMEOUT = 120
+
+def configure_environment(workdir, warmup):
+    """Point the apps at throwaway storage; must run before they are imported"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+    os.environ['SESSION_SQLITE_PATH'] = os.path.join(workdir, 'sessions.db')
+    os.environ['SCREENSHOTS_FOLDER'] = os.path.join(workdir, 'screenshots')
+    os.environ['DOCUMENTS_FOLDER'] = os.path.join(workdir, 'documents')
+    os.environ['RENDITIONS_FOLDER'] = os.path.join(workdir, 'renditions')
+    os.environ['DEADLINE_RERANK_INTERVAL'] = '0'
+    os.environ['WARMUP'] = warmup
+
+def run_child(mode):
+    """Start one app inside this (fresh) process and time each step"""
+    process_start = time.perf_counter()
+    rss_before = current_rss_mb()
+
+    with Timer() as import_timer:
+        module = importlib.import_module(APP_MODULES[mode])
+
+    with Timer() as init_timer:
+        # main builds the session-mode app at import
+        flask_app = module.create_app() if mode == 'db' else module.app
+    client = flask_app.test_client()
+
+    with Timer() as first_timer:
+        status = client.get('/api/screenshots').status_code
+
+    deadline = time.perf_counter() + READY_TIMEOUT
+    readiness = client.get('/readyz')
+    while readiness.status_code != 200 and time.perf_counter() < deadline:
+        time.sleep(0.05)
+        readiness = client.get('/readyz')
+
+    return {
+        'mode': mode,
+        'import_seconds': import_timer.elapsed,
+        'init_seconds': init_timer.elapsed,
+        'first_request_ms': first_timer.elapsed * 1000,
+        'first_request_status': status,
+        'ready': readiness.status_code == 200,
+        'ready_seconds': time.perf_counter() - process_start,
+        'resources': readiness.get_json()['resources'],
+        'rss_mb': current_rss_mb() - rss_before,
+    }
+
+def slowest_imports(mode, limit=10):
+    """Imports with the largest cumulative time, from python -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {APP_MODULES[mode]}'],
+        capture_output=True, text=True, cwd=PROJECT_ROOT
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self, cumulative, name = line[len('import time:'):].split('|')
+        imports.append({'module': name.strip(), 'cumulative_ms': int(cumulative) / 1000})
+    imports.sort(key=lambda item: item['cumulative_ms'], reverse=True)
+    return imports[:limit]
+
+def run_mode(mode):
+    """Run one app in a subprocess and parse its JSON output"""
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child', mode],
+        check=True, capture_output=True, text=True, cwd=PROJECT_ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark app import, initialization and warm-up time")
+    parser.add_argument('--app', choices=['db', 'session', 'both'], default='both', help="App(s) to start")
+    parser.add_argument('--warmup', choices=['background', 'eager', 'lazy'], default='background',
+                        help="WARMUP mode the apps start in")
+    parser.add_argument('--max-import-seconds', type=float,
+                        help="Fail if importing an app takes longer than this")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--child', choices=['db', 'session'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child)))
+        return
+
+    modes = ['db', 'session'] if args.app == 'both' else [args.app]
+    workdir = tempfile.mkdtemp(prefix='noravue-startup-')
+    configure_environment(workdir, args.warmup)
+    results = {'environment': environment(), 'warmup': args.warmup, 'apps': {}}
+    failures = []
+    try:
+        for mode in modes:
+            result = run_mode(mode)
+            result['slowest_imports'] = slowest_imports(mode)
+            results['apps'][mode] = result
+
+            print(f"{mode:>8}: import {result['import_seconds']:.2f}s, init {result['init_seconds']:.2f}s, "
+                  f"first request {result['first_request_ms']:.0f}ms, "
+                  f"{'ready' if result['ready'] else 'NOT ready'} after {result['ready_seconds']:.2f}s")
+            for name, resource in result['resources'].items():
+                print(f"          {name:<10} {resource['state']:<8} {resource.get('seconds', 0):.2f}s")
+            print("          slowest imports: " + ', '.join(
+                f"{item['module']} {item['cumulative_ms']:.0f}ms" for item in result['slowest_imports'][:5]))
+
+            if args.max_import_seconds is not None and result['import_seconds'] > args.max_import_seconds:
+                failures.append(f"{mode}: import took {result['import_seconds']:.2f}s "
+                                f"(limit {args.max_import_seconds:.2f}s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results['failures'] = failures
+    write_results(results, args.output)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Live change feed for the screenshot queue.
+
+Write paths publish compact events instead of clients refetching the whole
+list after every action:
+
+    {'seq': 42, 'op': 'add',    'id': 7, 'screenshot': {...full dict...}}
+    {'seq': 43, 'op': 'update', 'id': 7, 'screenshot': {'priority_score': 0.8}}
+    {'seq': 44, 'op': 'remove', 'id': 7}
+    {'seq': 45, 'op': 'resync'}   # bulk change with no per-item events
+
+Events are kept in a bounded ring buffer with consecutive sequence numbers.
+Clients long-poll /api/changes?since=<seq>; a client that fell further
+behind than the buffer, or whose epoch (a random id per feed instance, so
+per process) no longer matches, is told to resync from the snapshot endpoint
+and continue from the sequence number that came with it.
+
+DB mode has one feed for the whole library, session mode one per session.
+Feeds live in process memory, so with several worker processes a client only
+sees the changes made through the worker that answers its polls; polls
+answered by another worker come back with a new epoch and trigger a resync.
+"""
+
+import time
+import uuid
+import logging
+import itertools
+import threading
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Events kept per feed; a client further behind than this resyncs
+FEED_CAPACITY = 1000
+SESSION_FEED_CAPACITY = 256
+
+# Longest a poll waits for a change, in seconds
+MAX_POLL_TIMEOUT = 55
+DEFAULT_POLL_TIMEOUT = 25
+
+# Session feeds nobody published to or polled for this long are dropped
+SESSION_FEED_IDLE = 3600
+
+class ChangeFeed:
+    """Ring buffer of change events with blocking reads"""
+
+    def __init__(self, capacity=FEED_CAPACITY):
+        self.epoch = uuid.uuid4().hex
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self.last_used = time.time()
+
+    @property
+    def seq(self):
+        """Sequence number of the latest event (0 before the first)"""
+        return self._seq
+
+    def publish(self, op, screenshot_id=None, screenshot=None):
+        """Append one event and wake waiting readers, returns its sequence number"""
+        return self.publish_many([(op, screenshot_id, screenshot)])
+
+    def publish_many(self, changes):
+        """Append (op, screenshot_id, screenshot) events in order, returns the last sequence number"""
+        with self._condition:
+            for op, screenshot_id, screenshot in changes:
+                self._seq += 1
+                event = {'seq': self._seq, 'op': op}
+                if screenshot_id is not None:
+                    event['id'] = screenshot_id
+                if screenshot is not None:
+                    event['screenshot'] = screenshot
+                self._events.append(event)
+            self.last_used = time.time()
+            self._condition.notify_all()
+            return self._seq
+
+    def since(self, seq, timeout=0):
+        """
+        Events after seq, waiting up to timeout seconds for one if there are
+        none yet. Returns None if events after seq were already dropped from
+        the buffer (or seq is from the future), meaning the reader must resync.
+        """
+        with self._condition:
+            self.last_used = time.time()
+            if seq == self._seq and timeout > 0:
+                self._condition.wait_for(lambda: self._seq > seq, timeout)
+
+            oldest = self._events[0]['seq'] if self._events else self._seq + 1
+            if seq > self._seq or seq < oldest - 1:
+                return None
+            # Sequence numbers are consecutive, so the first new event's position is known
+            return list(itertools.islice(self._events, seq - oldest + 1, None))
+
+# The library feed (DB mode) and per-session feeds (session mode)
+feed = ChangeFeed()
+_session_feeds = {}
+_session_feeds_lock = threading.Lock()
+
+def session_feed(sid):
+    """The change feed of one session, created on first use"""
+    with _session_feeds_lock:
+        change_feed = _session_feeds.get(sid)
+        if change_feed is None:
+            _prune_session_feeds()
+            change_feed = _session_feeds[sid] = ChangeFeed(SESSION_FEED_CAPACITY)
+        return change_feed
+
+def _prune_session_feeds():
+    """Drop idle session feeds (lock held)"""
+    cutoff = time.time() - SESSION_FEED_IDLE
+    for sid in [sid for sid, change_feed in _session_feeds.items() if change_feed.last_used < cutoff]:
+        del _session_feeds[sid]
+
+def poll(change_feed, args):
+    """
+    Answer a long-poll request for a feed. args holds the request's query
+    parameters: since (last sequence number seen), epoch and timeout.
+    """
+    try:
+        since = int(args.get('since', 0))
+        timeout = min(float(args.get('timeout', DEFAULT_POLL_TIMEOUT)), MAX_POLL_TIMEOUT)
+    except ValueError:
+        since, timeout = -1, 0
+
+    events = None
+    if args.get('epoch') == change_feed.epoch:
+        events = change_feed.since(since, timeout)
+
+    if events is None:
+        return {'epoch': change_feed.epoch, 'seq': change_feed.seq, 'events': [], 'resync': True}
+    return {
+        'epoch': change_feed.epoch,
+        'seq': events[-1]['seq'] if events else since,
+        'events': events,
+        'resync': False,
+    }
+
+def snapshot(change_feed, load_screenshots):
+    """
+    The full active list for a (re)syncing client, with the sequence number
+    to poll from. The sequence number is read before the list, so a change
+    made in between is delivered again rather than missed.
+    """
+    seq = change_feed.seq
+    return {'epoch': change_feed.epoch, 'seq': seq, 'screenshots': load_screenshots()}
@@ -10,6 +10,8 @@ import shutil
 import logging
 from pathlib import Path
 
+import storage
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,6 +33,11 @@ def cleanup_database():
         cursor.execute("SELECT COUNT(*) FROM screenshot")
         count = cursor.fetchone()[0]
         
+        # Delete stored NLP features first (SQLite doesn't cascade by default)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='screenshot_features'")
+        if cursor.fetchone():
+            cursor.execute("DELETE FROM screenshot_features")
+        
         # Delete all screenshots
         cursor.execute("DELETE FROM screenshot")
         conn.commit()
@@ -53,8 +60,9 @@ def cleanup_screenshot_files():
     try:
         # Count files
         file_count = 0
-        for file_path in Path(screenshots_folder).glob("*"):
-            if file_path.is_file() and file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
+        # Walk the sharded layout (ab/cd/<hash>.<ext>) as well as any flat files
+        for file_path in storage.iter_files(screenshots_folder):
+            if Path(file_path).suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
                 file_count += 1
                 os.remove(file_path)
         
@@ -11,6 +11,8 @@ import psycopg2
 from urllib.parse import urlparse
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
+import storage
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -113,10 +115,8 @@ def clear_temp_files():
             
             # List all files and sort them (keep 10 smallest files for demo)
             all_files = []
-            for file_name in os.listdir(screenshots_dir):
-                file_path = os.path.join(screenshots_dir, file_name)
-                if os.path.isfile(file_path):
-                    all_files.append((file_path, os.path.getsize(file_path)))
+            for file_path in storage.iter_files(screenshots_dir):
+                all_files.append((file_path, os.path.getsize(file_path)))
             
             # Sort by file size
             all_files.sort(key=lambda x: x[1])
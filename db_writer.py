@@ -0,0 +1,165 @@
+"""
+SQLite tuning and a single writer thread for database writes.
+
+SQLite allows one writer at a time, and with the default rollback journal a
+writer also blocks readers, so the upload thread committing per file while
+requests read and write stalled on "database is locked". For SQLite
+databases configure_sqlite (called by init_app) sets these pragmas on every
+new connection:
+
+    journal_mode=WAL     readers see the last commit while a write is in progress
+    synchronous=NORMAL   fsync at checkpoints instead of on every commit (safe in WAL)
+    busy_timeout         wait up to SQLITE_BUSY_TIMEOUT_MS for the write lock
+    mmap_size            read through a memory map of up to SQLITE_MMAP_SIZE bytes
+
+init_app also routes every write() through one thread, which runs the writes queued
+meanwhile in a single transaction. A write is a function using db.session
+in the writer thread; write() waits for its commit and returns its result:
+
+    def dismiss():
+        db.session.get(Screenshot, screenshot_id).dismissed = True
+    db_writer.write(dismiss)
+
+Results must be plain data such as ids, not rows: the rows belong to the
+writer's session. Build API payloads from the ids after write() returns,
+since anything that raises inside a write rolls it back. If a batch fails
+it is rolled back and each write is retried in its own transaction, so
+only the failing write raises. With other databases (or
+SQLITE_SINGLE_WRITER=0) write() runs the function and commits in the
+calling thread.
+"""
+
+import os
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from sqlalchemy import event
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Most writes committed in one transaction
+MAX_BATCH = 64
+
+# Set during init_app
+_app = None
+_db = None
+_writer = None
+_writer_lock = threading.Lock()
+
+def init_app(app, db):
+    """Tune SQLite connections of the app's engine and enable the writer thread for SQLite"""
+    global _app, _db
+
+    _db = db
+    app.config.setdefault('SQLITE_SINGLE_WRITER', os.environ.get('SQLITE_SINGLE_WRITER', '1') == '1')
+    if configure_sqlite(app, db) and app.config['SQLITE_SINGLE_WRITER']:
+        _app = app
+
+def configure_sqlite(app, db):
+    """Set the SQLite pragmas on every new connection of the app's engine, returns False for other databases"""
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)))
+    app.config.setdefault('SQLITE_MMAP_SIZE', int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)))
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return False
+
+    busy_timeout = app.config['SQLITE_BUSY_TIMEOUT_MS']
+    mmap_size = app.config['SQLITE_MMAP_SIZE']
+
+    def set_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        cursor.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+    logger.info(f"SQLite in WAL mode (busy timeout {busy_timeout}ms, mmap {mmap_size // (1024 * 1024)}MB)")
+    return True
+
+class Writer:
+    """Thread running queued writes in batched transactions"""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.pid = os.getpid()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='db-writer')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, fn):
+        """Queue fn, returns a Future for its result"""
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def in_writer_thread(self):
+        return threading.current_thread() is self._thread
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self.app.app_context():
+                self._write(batch)
+
+    def _write(self, batch):
+        session = self.db.session
+        try:
+            results = [fn() for fn, _future in batch]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) > 1:
+                logger.warning(f"Batch of {len(batch)} writes failed, retrying one by one: {str(e)}")
+                for item in batch:
+                    self._write([item])
+            else:
+                batch[0][1].set_exception(e)
+            return
+        for (_fn, future), result in zip(batch, results):
+            future.set_result(result)
+
+def _get_writer():
+    """The writer of this process, started on first use (threads don't survive a fork)"""
+    global _writer
+    with _writer_lock:
+        # Restarted for an app created since (each create_app() call makes a new one)
+        if _writer is None or _writer.pid != os.getpid() or _writer.app is not _app:
+            _writer = Writer(_app, _db).start()
+    return _writer
+
+def write(fn):
+    """
+    Run fn (a function writing through db.session) and commit it, in the
+    writer thread if there is one. Returns fn's result or raises its error.
+    """
+    if _app is None:
+        session = _db.session
+        try:
+            result = fn()
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return result
+
+    writer = _get_writer()
+    if writer.in_writer_thread():
+        # A write issued from inside a write joins the current batch
+        return fn()
+    return writer.submit(fn).result()
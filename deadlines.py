@@ -0,0 +1,245 @@
+"""
+Absolute deadlines for screenshots and time-decay re-ranking.
+
+The analyzer resolves deadline mentions like "due tomorrow", "by Friday" or
+"deadline: Jan 5 at 14:00" to an absolute due_at timestamp, stored in the indexed
+Screenshot.due_at column. How urgent a deadline is depends on which bucket
+(today, tomorrow, this week, ...) it falls in relative to now, so a scheduled
+job re-ranks the rows whose bucket changed since its last run. Because the
+buckets are whole days, those rows are found with a few index range scans.
+"""
+
+import os
+import re
+import time
+import logging
+import datetime
+import threading
+
+import scoring
+import change_feed
+import db_writer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# AppState key holding the time of the last re-rank run
+LAST_RUN_KEY = 'deadlines.last_rerank'
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+# Relative day and week mentions
+RELATIVE_PATTERN = re.compile(r'\b(today|tonight|tomorrow|this week|next week)\b', re.IGNORECASE)
+WEEKDAY_PATTERN = re.compile(r'\b(next )?(' + '|'.join(WEEKDAYS) + r')\b', re.IGNORECASE)
+# MM/DD/YYYY or similar, and ISO dates
+NUMERIC_DATE_PATTERN = re.compile(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b')
+ISO_DATE_PATTERN = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+# Month Day[, Year] such as "Jan 5" or "March 12th, 2025"
+MONTH_DATE_PATTERN = re.compile(
+    r'\b(' + '|'.join(MONTHS) + r')[a-z]*\.? (\d{1,2})(?:st|nd|rd|th)?(?:,? (\d{4}))?\b', re.IGNORECASE
+)
+# Words marking the date right after them as a deadline ("by Friday", "due
+# tomorrow", "deadline: Jan 5"); dates without one are just mentioned
+CUE_PATTERN = re.compile(
+    r'\b(by|due|deadline|until|till|before|no later than|expires?|expiring|ends?)\b', re.IGNORECASE
+)
+# Characters a cue may precede its date by ("due on Friday", "deadline is next Monday")
+CUE_WINDOW = 16
+
+# Clock time, optionally with am/pm
+CLOCK_PATTERN = re.compile(r'\b([0-1]?[0-9]|2[0-3]):([0-5][0-9])\s*(am|pm)?\b', re.IGNORECASE)
+
+# Deadlines without a time are due at the end of the day
+END_OF_DAY = datetime.time(23, 59)
+
+# These will be set during init_app
+db = None
+Screenshot = None
+AppState = None
+
+def extract_due_at(text, reference=None):
+    """
+    Resolve the earliest deadline mentioned in text to an absolute datetime.
+    Only dates following a deadline cue (see CUE_PATTERN) count, so "Meeting
+    Monday" is no deadline but "due Monday" is. Relative mentions are
+    resolved against reference (default: now); dates that are already past
+    are ignored. Returns None if there is no deadline.
+    """
+    if not text:
+        return None
+    reference = reference or datetime.datetime.now()
+    today = reference.date()
+    candidates = []
+
+    def cued(pattern):
+        for match in pattern.finditer(text):
+            if CUE_PATTERN.search(text, max(0, match.start() - CUE_WINDOW), match.start()):
+                yield match
+
+    for match in cued(RELATIVE_PATTERN):
+        term = match.group(1).lower()
+        if term in ('today', 'tonight'):
+            candidates.append(today)
+        elif term == 'tomorrow':
+            candidates.append(today + datetime.timedelta(days=1))
+        else:
+            # End of this week or next week (weeks end on Sunday)
+            end_of_week = today + datetime.timedelta(days=6 - today.weekday())
+            candidates.append(end_of_week if term == 'this week' else end_of_week + datetime.timedelta(days=7))
+
+    for match in cued(WEEKDAY_PATTERN):
+        days_ahead = (WEEKDAYS.index(match.group(2).lower()) - today.weekday()) % 7
+        if match.group(1) and days_ahead == 0:
+            days_ahead = 7
+        candidates.append(today + datetime.timedelta(days=days_ahead))
+
+    for match in cued(NUMERIC_DATE_PATTERN):
+        month, day, year = (int(group) for group in match.groups())
+        candidates.append(_make_date(year + 2000 if year < 100 else year, month, day))
+
+    for match in cued(ISO_DATE_PATTERN):
+        candidates.append(_make_date(*(int(group) for group in match.groups())))
+
+    for match in cued(MONTH_DATE_PATTERN):
+        month = MONTHS.index(match.group(1).lower()[:3]) + 1
+        day = int(match.group(2))
+        if match.group(3):
+            candidates.append(_make_date(int(match.group(3)), month, day))
+        else:
+            # Without a year, the next time that date comes round
+            date = _make_date(today.year, month, day)
+            if date and date < today:
+                date = _make_date(today.year + 1, month, day)
+            candidates.append(date)
+
+    candidates = [date for date in candidates if date and date >= today]
+    if not candidates:
+        return None
+
+    return datetime.datetime.combine(min(candidates), _first_clock_time(text) or END_OF_DAY)
+
+def _make_date(year, month, day):
+    """datetime.date or None if the numbers don't form a valid date"""
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+def _first_clock_time(text):
+    """The first clock time mentioned in text as a datetime.time, or None"""
+    match = CLOCK_PATTERN.search(text)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2)), (match.group(3) or '').lower()
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    return datetime.time(hour, minute)
+
+def changed_bucket_ranges(last_run, now, weights=None):
+    """
+    Ranges of due_at whose bucket changed between last_run and now.
+    A row moves to the next bucket when its whole days left drop to a bucket
+    limit b, i.e. when its due date lies in (last_run + b, now + b]. Returns
+    a list of [start, end) datetime pairs.
+    """
+    ranges = []
+    for max_days, _name, _urgency in scoring.resolve_weights(weights)['deadline_buckets']:
+        start = datetime.datetime.combine(last_run.date() + datetime.timedelta(days=max_days + 1), datetime.time())
+        end = datetime.datetime.combine(now.date() + datetime.timedelta(days=max_days + 1), datetime.time())
+        if start < end:
+            ranges.append((start, end))
+    return ranges
+
+def init_app(app):
+    """Set up the re-rank job and start it in a background thread"""
+    global db, Screenshot, AppState
+
+    # Import the app module here to avoid circular imports
+    from app import db as app_db, Screenshot as app_Screenshot, AppState as app_AppState
+
+    db = app_db
+    Screenshot = app_Screenshot
+    AppState = app_AppState
+
+    app.config.setdefault('DEADLINE_RERANK_INTERVAL', int(os.environ.get('DEADLINE_RERANK_INTERVAL', 3600)))
+
+    interval = app.config['DEADLINE_RERANK_INTERVAL']
+    if interval > 0:
+        thread = threading.Thread(target=_rerank_loop, args=(app, interval), name='deadline-rerank')
+        thread.daemon = True
+        thread.start()
+
+def _rerank_loop(flask_app, interval):
+    """Re-rank on startup (to catch up after downtime) and then every interval seconds"""
+    while True:
+        with flask_app.app_context():
+            try:
+                rerank()
+            except Exception as e:
+                logger.exception(f"Deadline re-rank failed: {str(e)}")
+                db.session.rollback()
+        time.sleep(interval)
+
+def rerank(now=None, weights=None):
+    """
+    Re-score the screenshots whose deadline bucket changed since the last run.
+    The urgency change is applied to the stored (normalized) priority in
+    proportion to the urgency weight, so the rest of the ranking is untouched.
+    Returns the number of screenshots updated.
+    """
+    from sqlalchemy import or_, and_, update
+    from sqlalchemy.orm import joinedload
+
+    now = now or datetime.datetime.now()
+    state = db.session.get(AppState, LAST_RUN_KEY)
+    last_run = datetime.datetime.fromisoformat(state.value) if state else None
+
+    query = Screenshot.query.options(joinedload(Screenshot.features)).filter(
+        Screenshot.due_at != None,
+        Screenshot.features.has()
+    )
+    if last_run is not None:
+        ranges = changed_bucket_ranges(last_run, now, weights)
+        if ranges:
+            query = query.filter(or_(*[
+                and_(Screenshot.due_at >= start, Screenshot.due_at < end) for start, end in ranges
+            ]))
+        else:
+            query = None
+
+    updates = []
+    resolved = scoring.resolve_weights(weights)
+    for screenshot in (query.all() if query is not None else []):
+        features = screenshot.features.to_features()
+        features['due_at'] = screenshot.due_at
+        urgency_score, action_score = scoring.score_features(features, weights, now=now)
+        if abs(urgency_score - screenshot.urgency_score) < 1e-9:
+            continue
+        priority_score = screenshot.priority_score + (urgency_score - screenshot.urgency_score) * resolved['urgency_weight']
+        updates.append({
+            'id': screenshot.id,
+            'urgency_score': urgency_score,
+            'action_score': action_score,
+            'priority_score': max(0.1, min(0.9, priority_score)),
+        })
+
+    def save():
+        if updates:
+            db.session.execute(update(Screenshot), updates)
+        # Loaded again, state belongs to the caller's session
+        saved_state = db.session.get(AppState, LAST_RUN_KEY)
+        if saved_state is None:
+            db.session.add(AppState(key=LAST_RUN_KEY, value=now.isoformat()))
+        else:
+            saved_state.value = now.isoformat()
+    db_writer.write(save)
+    change_feed.feed.publish_many([
+        ('update', row['id'], {'priority_score': row['priority_score']}) for row in updates
+    ])
+
+    logger.info(f"Deadline re-rank: updated {len(updates)} screenshots"
+                + (f" since {last_run.isoformat()}" if last_run else " (first run)"))
+    return len(updates)
@@ -0,0 +1,186 @@
+"""
+Wake-ups for deferred screenshots.
+
+Deferral used to be checked lazily (a SQL predicate, SessionScreenshot.is_active
+and a client-side date filter), so nothing told a client when a deferred
+screenshot became due again. A DeferralScheduler keeps a min-heap of upcoming
+deferred_until times and a thread that sleeps until the earliest one, then
+hands every entry that is due to a callback in one batch. The callbacks check
+the screenshot is still deferred until that time (it may have been dismissed
+or deferred again since) and publish an 'add' event on the change feed.
+
+DB mode: the library scheduler is rebuilt from the database at startup and
+every DEFERRAL_RELOAD_INTERVAL seconds, which also picks up deferrals made
+through other worker processes. The database row is the active index, so
+becoming due needs no write.
+
+Session mode: deferrals are scheduled by the session manager. The session's
+own index is promoted on its next request (SessionState.promote_due), since a
+background write to the session would race with the user's requests.
+
+Each app's scheduler is kept in app.extensions['deferral_scheduler']; routes
+reach it through scheduler().
+"""
+
+import os
+import time
+import heapq
+import logging
+import datetime
+import threading
+
+from flask import current_app
+
+import change_feed
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+class DeferralScheduler:
+    """Min-heap of (due time, key, screenshot id) with a thread that fires due entries"""
+
+    def __init__(self, name, on_due, reload=None, reload_interval=None):
+        self.name = name
+        self.on_due = on_due  # Called with a list of (key, screenshot_id, due_at) entries
+        self.reload = reload  # Optional: returns every upcoming (key, screenshot_id, due_at)
+        self.reload_interval = reload_interval
+        self._heap = []  # (due_at, key, screenshot_id), key is None for the library
+        self._scheduled = {}  # (key, screenshot_id) -> due_at of the live entry
+        self._condition = threading.Condition()
+        self._next_reload = float('inf')
+        self._thread = None
+
+    def start(self):
+        """Load the upcoming deferrals (if there is a loader) and start the thread"""
+        if self.reload is not None:
+            self._reload()
+        self._thread = threading.Thread(target=self._run, name=f'deferral-scheduler:{self.name}')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def schedule(self, key, screenshot_id, due_at):
+        """Fire screenshot_id at due_at (epoch seconds), replacing any earlier schedule for it"""
+        with self._condition:
+            self._scheduled[(key, screenshot_id)] = due_at
+            heapq.heappush(self._heap, (due_at, key, screenshot_id))
+            # Only wake the thread if this entry is due before the one it is waiting for
+            if self._heap[0][0] == due_at:
+                self._condition.notify()
+
+    def cancel(self, key, screenshot_id):
+        """Forget a scheduled wake-up; its heap entry is skipped when it surfaces"""
+        with self._condition:
+            self._scheduled.pop((key, screenshot_id), None)
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def _reload(self):
+        """Replace the heap with the upcoming deferrals from the loader"""
+        try:
+            entries = [(due_at, key, screenshot_id) for key, screenshot_id, due_at in self.reload()]
+        except Exception as e:
+            logger.exception(f"Could not load upcoming deferrals: {str(e)}")
+            entries = None
+
+        with self._condition:
+            if entries is not None:
+                heapq.heapify(entries)
+                self._heap = entries
+                self._scheduled = {(key, screenshot_id): due_at for due_at, key, screenshot_id in entries}
+                logger.info(f"Deferral scheduler {self.name} tracking {len(entries)} deferred screenshots")
+            self._next_reload = time.time() + self.reload_interval if self.reload_interval else float('inf')
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.time()
+                wake_at = min(self._heap[0][0] if self._heap else float('inf'), self._next_reload)
+                if wake_at > now:
+                    self._condition.wait(None if wake_at == float('inf') else wake_at - now)
+                    continue
+
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due_at, key, screenshot_id = heapq.heappop(self._heap)
+                    # Skip cancelled entries and ones superseded by a later schedule
+                    if self._scheduled.get((key, screenshot_id)) != due_at:
+                        continue
+                    del self._scheduled[(key, screenshot_id)]
+                    due.append((key, screenshot_id, due_at))
+                reload = not due and now >= self._next_reload
+
+            if due:
+                try:
+                    self.on_due(due)
+                except Exception as e:
+                    logger.exception(f"Error waking {len(due)} deferred screenshots: {str(e)}")
+            elif reload:
+                self._reload()
+
+# Guards starting one scheduler per app
+_start_lock = threading.Lock()
+
+def timestamp(value, utc=False):
+    """Epoch seconds of a naive datetime in local time (DB mode) or UTC (session mode)"""
+    if utc:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+def scheduler(app=None):
+    """The scheduler started for an app (the current one by default)"""
+    return (app or current_app).extensions['deferral_scheduler']
+
+def _start(app, name, wake, reload=None, reload_interval=None):
+    """Start the app's scheduler unless it has one, returns it"""
+    with _start_lock:
+        if 'deferral_scheduler' not in app.extensions:
+            app.extensions['deferral_scheduler'] = DeferralScheduler(name, wake, reload, reload_interval).start()
+    return app.extensions['deferral_scheduler']
+
+def init_app(app, to_dict):
+    """Start the library scheduler for DB mode; to_dict serializes a Screenshot for the change feed"""
+    # Import the app module here to avoid circular imports
+    from app import db, Screenshot
+
+    app.config.setdefault('DEFERRAL_RELOAD_INTERVAL', int(os.environ.get('DEFERRAL_RELOAD_INTERVAL', 300)))
+
+    def upcoming():
+        with app.app_context():
+            rows = db.session.query(Screenshot.id, Screenshot.deferred_until).filter(
+                Screenshot.dismissed == False,
+                Screenshot.deferred_until > datetime.datetime.now()
+            ).all()
+        return [(None, row.id, timestamp(row.deferred_until)) for row in rows]
+
+    def wake(entries):
+        with app.app_context():
+            now = datetime.datetime.now()
+            screenshots = Screenshot.query.filter(Screenshot.id.in_([entry[1] for entry in entries])).all()
+            # Still deferred until then, and not dismissed or re-deferred in the meantime
+            due = [s for s in screenshots if not s.dismissed and s.deferred_until is not None and s.deferred_until <= now]
+            change_feed.feed.publish_many([('add', s.id, to_dict(s)) for s in due])
+        logger.info(f"Woke {len(due)} deferred screenshots")
+
+    return _start(app, 'library', wake, upcoming, app.config['DEFERRAL_RELOAD_INTERVAL'])
+
+def start_sessions(app, load_screenshot, to_dict):
+    """
+    Start (or return the running) session-mode scheduler of an app.
+    load_screenshot(sid, screenshot_id) returns the session's current record or None.
+    """
+    def wake(entries):
+        woken = 0
+        with app.app_context():
+            for sid, screenshot_id, due_at in entries:
+                screenshot = load_screenshot(sid, screenshot_id)
+                if screenshot is None or screenshot.dismissed or screenshot.deferred_until is None:
+                    continue
+                if timestamp(screenshot.deferred_until, utc=True) != due_at:
+                    continue
+                change_feed.session_feed(sid).publish('add', screenshot_id, to_dict(screenshot))
+                woken += 1
+        logger.info(f"Woke {woken} deferred session screenshots")
+
+    return _start(app, 'sessions', wake)
@@ -42,6 +42,11 @@ def create_app():
     # initialize the app with the extension, flask-sqlalchemy >= 3.0.x
     db.init_app(app)
     
+    # WAL and tuned pragmas for SQLite; session mode keeps screenshots out of
+    # the database, so there are no writes to funnel through db_writer
+    import db_writer
+    db_writer.configure_sqlite(app, db)
+    
     with app.app_context():
         # Make sure to import the models here or their tables won't be created
         from models import init_db
@@ -4,8 +4,10 @@ Main entry point for the Nora screenshot management application
 Privacy-Focused Session Mode - No permanent storage
 """
 
-# Import the app from app_session instead of app to use the privacy-focused version
-from app_session import app
+# Build the app from app_session instead of app to use the privacy-focused version
+from app_session import create_app
+
+app = create_app()
 
 # Run the app if this file is executed directly
 if __name__ == "__main__":
@@ -0,0 +1,173 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters and histograms are kept in memory and rendered on GET /metrics,
+so any Prometheus-compatible scraper can collect them without an agent or
+client library:
+
+    noravue_ingest_stage_seconds     time per ingestion stage (decode, resize,
+                                     renditions, preprocess, ocr, nlp, db_write,
+                                     normalize); each stage is also a trace span
+    noravue_ocr_timeouts_total       OCR calls abandoned after the timeout
+    noravue_fallback_records_total   screenshots saved with placeholder text or
+                                     scores, by reason
+    noravue_nlp_documents_total      texts analyzed, by engine (spacy, keywords)
+    noravue_http_request_duration_seconds
+                                     request latency by route, method and status
+
+Values live in process memory: with several worker processes each one
+reports its own, and the scraper sees whichever worker answers.
+"""
+
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from flask import Response, g, request
+
+import tracing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds, from a fast NLP batch to a slow OCR run
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric, in the order they are rendered
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # A counter without labels is reported as 0 before its first increment
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of a with block, also when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+INGEST_STAGE_SECONDS = Histogram(
+    'noravue_ingest_stage_seconds', 'Time spent in each screenshot ingestion stage.', ['stage'])
+OCR_TIMEOUTS = Counter(
+    'noravue_ocr_timeouts_total', 'OCR runs abandoned after the timeout.')
+FALLBACK_RECORDS = Counter(
+    'noravue_fallback_records_total', 'Screenshots saved with placeholder text or scores.', ['reason'])
+NLP_DOCUMENTS = Counter(
+    'noravue_nlp_documents_total', 'Texts analyzed by the NLP analyzer.', ['engine'])
+REQUEST_SECONDS = Histogram(
+    'noravue_http_request_duration_seconds', 'HTTP request latency.', ['route', 'method', 'status'])
+
+@contextmanager
+def stage(name, **attributes):
+    """Time one ingestion stage, in the histogram and as a trace span: with metrics.stage('ocr'): ..."""
+    with tracing.span(name, **attributes), INGEST_STAGE_SECONDS.time(stage=name):
+        yield
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def metrics_endpoint():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+def _start_timer():
+    g.metrics_request_start = time.perf_counter()
+
+def _record_request(response):
+    start = g.pop('metrics_request_start', None)
+    if start is not None:
+        # The route pattern, not the path, so ids don't create a series each
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                route=route, method=request.method, status=response.status_code)
+    return response
+
+def init_app(app):
+    """Time every request of an app and serve the metrics on /metrics"""
+    if 'metrics' in app.view_functions:
+        return
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Migrate a flat screenshots folder (<uuid>_<name>) to the sharded
+content-addressed layout (ab/cd/<hash>.<ext>).
+Moved files are recorded in a legacy index inside the folder so that old
+URLs and Screenshot.path values keep resolving. The paths stored in the
+database are rewritten as well, unless --no-update-db is given.
+"""
+
+import os
+import sys
+import argparse
+import logging
+
+import storage
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Save the legacy index every N files so an interrupted run can be resumed
+CHECKPOINT_EVERY = 1000
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.gif', '.webp')
+
+def migrate_files(folder, dry_run=False):
+    """
+    Move every top-level image in folder into the sharded layout.
+    Returns the mapping of legacy filename -> new relative path.
+    """
+    mapping = dict(storage.load_legacy_index(folder))
+    moved = 0
+
+    with os.scandir(folder) as entries:
+        flat_files = [
+            entry for entry in entries
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+
+    logger.info(f"Found {len(flat_files)} files in the flat layout of {folder}")
+
+    for entry in flat_files:
+        if dry_run:
+            logger.info(f"Would move {entry.path}")
+            continue
+
+        try:
+            new_path = storage.store_file(entry.path, folder)
+        except Exception as e:
+            logger.error(f"Error migrating {entry.path}: {str(e)}")
+            continue
+
+        mapping[entry.name] = os.path.relpath(new_path, folder).replace(os.sep, '/')
+        moved += 1
+
+        if moved % CHECKPOINT_EVERY == 0:
+            storage.save_legacy_index(folder, mapping)
+            logger.info(f"Migrated {moved}/{len(flat_files)} files")
+
+    if not dry_run:
+        storage.save_legacy_index(folder, mapping)
+    logger.info(f"Migrated {moved} files, legacy index has {len(mapping)} entries")
+    return mapping
+
+def update_database_paths(folder, mapping):
+    """Point Screenshot.path at the sharded location for every migrated file"""
+    from app import create_app, db, Screenshot
+
+    app = create_app(services=False)
+    updated = 0
+    with app.app_context():
+        taken = {path for (path,) in db.session.query(Screenshot.path)}
+
+        for legacy_name, relative in mapping.items():
+            old_path = os.path.join(folder, legacy_name)
+            new_path = os.path.join(folder, relative)
+            # Duplicate content shares one file; such rows keep resolving through the index
+            if old_path not in taken or new_path in taken:
+                continue
+
+            Screenshot.query.filter_by(path=old_path).update({'path': new_path})
+            taken.discard(old_path)
+            taken.add(new_path)
+            updated += 1
+
+            if updated % CHECKPOINT_EVERY == 0:
+                db.session.commit()
+
+        db.session.commit()
+
+    logger.info(f"Updated {updated} screenshot paths in the database")
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate screenshots to the sharded storage layout")
+    parser.add_argument("--folder", default=os.environ.get("SCREENSHOTS_FOLDER", "./screenshots"),
+                        help="Screenshots folder to migrate (default: $SCREENSHOTS_FOLDER or ./screenshots)")
+    parser.add_argument("--update-db", action=argparse.BooleanOptionalAction, default=True,
+                        help="Also rewrite Screenshot.path values in the database (default: yes)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="List the files that would be moved without changing anything")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        logger.error(f"Screenshots folder not found at {args.folder}")
+        sys.exit(1)
+
+    print("STORAGE LAYOUT MIGRATION")
+    print("========================")
+    print(f"Folder: {args.folder}")
+    print()
+
+    mapping = migrate_files(args.folder, dry_run=args.dry_run)
+
+    if args.update_db and not args.dry_run:
+        update_database_paths(args.folder, mapping)
+
+    print("Migration complete.")
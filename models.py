@@ -7,6 +7,27 @@ def init_db(database):
     global db
     db = database
 
+def add_missing_columns(database, model):
+    """
+    Add columns (and their indexes) that were added to a model after its table
+    was created. db.create_all() only creates missing tables, so this keeps
+    existing databases working. New columns must be nullable.
+    """
+    from sqlalchemy import inspect, text
+    
+    table = model.__table__
+    existing = {column['name'] for column in inspect(database.engine).get_columns(table.name)}
+    
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=database.engine.dialect)
+        with database.engine.begin() as conn:
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for index in table.indexes:
+            if column in index.columns:
+                index.create(database.engine, checkfirst=True)
+
 class ScreenshotMixin:
     """Mixin class with methods for Screenshot model"""
     
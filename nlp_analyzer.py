@@ -1,24 +1,80 @@
+import os
 import re
 import logging
-import datetime
-import spacy
-from spacy.matcher import Matcher
+import threading
+
+import scoring
+import deadlines
+import metrics
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Batch settings for nlp.pipe (n_process > 1 forks worker processes)
+BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", 32))
+N_PROCESS = int(os.environ.get("NLP_N_PROCESS", 1))
+
+# Pipeline components the analyzer never uses (the parser is the expensive one)
+EXCLUDED_COMPONENTS = ["parser", "senter"]
+
+# Date words the scorer weighs (see scoring.DEFAULT_WEIGHTS), used to rank the
+# chunks of long texts
+DATE_HINT_PATTERN = re.compile(r'\b(?:today|tonight|now|tomorrow|this week|next week)\b', re.IGNORECASE)
+
+# Clock times like 9:30 or 17:45
+TIME_PATTERN = re.compile(r'\b([0-1]?[0-9]|2[0-3]):([0-5][0-9])\b')
+
+# Texts longer than this are analyzed in chunks of about CHUNK_CHARS, at most
+# MAX_CHUNKS of them, keeping every spaCy call far below nlp.max_length
+LONG_TEXT_CHARS = int(os.environ.get("NLP_LONG_TEXT_CHARS", 2000))
+CHUNK_CHARS = int(os.environ.get("NLP_CHUNK_CHARS", 1000))
+MAX_CHUNKS = int(os.environ.get("NLP_MAX_CHUNKS", 8))
+
+# Chunks are cut at paragraph breaks, then sentence ends, then spaces
+CHUNK_BOUNDARY_PATTERNS = [re.compile(r'\n\s*\n'), re.compile(r'(?<=[.!?])\s+'), re.compile(r'\s+')]
+
 # Global variables
 nlp = None
 matcher = None
 
-def init():
-    """Initialize the NLP analyzer with spaCy"""
-    global nlp, matcher
+# Whether init() has run; the model loads on first use if nothing loaded it before
+loaded = False
+_load_lock = threading.RLock()
+
+def init(trimmed=True):
+    """
+    Initialize the NLP analyzer with spaCy
+    With trimmed=True the parser and sentence recognizer are left out; the
+    tagger, attribute ruler and lemmatizer (needed for LEMMA patterns) and NER
+    run on every text. NER always runs, so the stored date entities don't
+    depend on which date terms the current weights score (see
+    recompute_priorities.py).
+    """
+    with _load_lock:
+        _init(trimmed)
+
+def ensure_loaded():
+    """
+    Load the model unless init() already ran. Called before every analysis,
+    so texts analyzed while a background warm-up is loading the model wait
+    for it instead of silently getting keyword scores.
+    """
+    if not loaded:
+        with _load_lock:
+            if not loaded:
+                _init(True)
+
+def _init(trimmed):
+    global nlp, matcher, loaded
     
     try:
+        # spaCy is imported here, so importing the analyzer stays cheap
+        import spacy
+        from spacy.matcher import Matcher
+        
         # Load English language model
-        nlp = spacy.load("en_core_web_sm")
-        logger.info("Loaded spaCy NLP model")
+        nlp = spacy.load("en_core_web_sm", exclude=EXCLUDED_COMPONENTS if trimmed else [])
+        logger.info(f"Loaded spaCy NLP model with components: {', '.join(nlp.pipe_names)}")
         
         # Set up the matcher with patterns
         matcher = Matcher(nlp.vocab)
@@ -81,157 +137,325 @@ def init():
         logger.error(f"Failed to initialize NLP analyzer: {e}")
         # Create a fallback analyzer if spaCy failed to load
         nlp = None
+    loaded = True
 
 def analyze_text(text):
     """
     Analyze text to determine urgency and actionability scores
     Returns tuple of (urgency_score, action_score) each from 0.0 to 1.0
     """
+    return scoring.score_features(extract_features(text))
+
+def analyze_texts(texts, batch_size=None, n_process=None, fast=False):
+    """
+    Analyze many texts in one batched spaCy pass (nlp.pipe)
+    With fast=True the single-pass keyword matcher is used instead of spaCy,
+    which is the cheap path for high-volume rescoring.
+    Returns a list of (urgency_score, action_score) tuples in input order
+    """
+    return [scoring.score_features(features)
+            for features in extract_features_batch(texts, batch_size, n_process, fast)]
+
+def extract_features(text):
+    """
+    Extract the feature record the scorer works from:
+    {'engine', 'text_length', 'pattern_counts', 'date_entities', 'time_hits', 'due_at'}
+    due_at is the earliest deadline mentioned, as an absolute datetime (or None).
+    Scores are recomputed from these by scoring.score_features, so changing
+    weights never requires running spaCy again.
+    """
+    features = _extract_features(text)
+    metrics.NLP_DOCUMENTS.inc(engine=features['engine'])
+    return features
+
+def _extract_features(text):
+    ensure_loaded()
+    
     # Simple fallback if spaCy isn't available
     if nlp is None:
-        return _fallback_analyze_text(text)
+        return _fallback_features(text)
     
     try:
-        # Process the text with spaCy
-        doc = nlp(text)
-        
-        # Extract dates and calculate date-based urgency
-        date_urgency = _calculate_date_urgency(doc)
-        
-        # Use matcher to identify urgency and action patterns
-        matches = matcher(doc)
-        
-        urgency_count = 0
-        action_count = 0
+        if len(text) > LONG_TEXT_CHARS:
+            return _chunked_features(text)
         
-        for match_id, start, end in matches:
-            string_id = nlp.vocab.strings[match_id]
-            if string_id == "URGENCY":
-                urgency_count += 1
-            elif string_id == "ACTION":
-                action_count += 1
-        
-        # Calculate scores (normalize by text length)
-        text_length_factor = min(1.0, max(0.5, len(text) / 300))  # Between 0.5 and 1.0
-        
-        # Add base scores to ensure non-zero values
-        base_urgency = 0.15
-        base_action = 0.15
+        # Process the text with spaCy
+        return _doc_features(nlp(text))
+    except Exception as e:
+        logger.exception(f"Error in NLP analysis: {e}")
+        return _fallback_features(text)
+
+def extract_features_batch(texts, batch_size=None, n_process=None, fast=False):
+    """
+    Extract feature records for many texts in one batched spaCy pass
+    Returns a list of feature records in input order
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    
+    results = _extract_features_batch(texts, batch_size, n_process, fast)
+    for features in results:
+        metrics.NLP_DOCUMENTS.inc(engine=features['engine'])
+    return results
+
+def _extract_features_batch(texts, batch_size, n_process, fast):
+    if not fast:
+        ensure_loaded()
+    
+    # Keyword matcher if requested or if spaCy isn't available
+    if fast or nlp is None:
+        return [_fallback_features(text) for text in texts]
+    
+    try:
+        batch_size = batch_size or BATCH_SIZE
         
-        # Combine explicit pattern matches with date-based urgency
-        urgency_score = min(0.95, base_urgency + (urgency_count * 0.15 * text_length_factor) + date_urgency)
-        action_score = min(0.95, base_action + (action_count * 0.12 * text_length_factor))
+        # Long documents are analyzed chunk by chunk, the rest in one pipe
+        results = [None] * len(texts)
+        short = [i for i, text in enumerate(texts) if len(text) <= LONG_TEXT_CHARS]
+        for i, text in enumerate(texts):
+            if len(text) > LONG_TEXT_CHARS:
+                results[i] = _chunked_features(text)
         
-        logger.debug(f"Text analyzed - Urgency: {urgency_score:.2f}, Action: {action_score:.2f}")
-        return urgency_score, action_score
+        docs = list(nlp.pipe(
+            [texts[i] for i in short],
+            batch_size=batch_size,
+            n_process=n_process or N_PROCESS
+        ))
         
+        for i, doc in zip(short, docs):
+            results[i] = _doc_features(doc)
+        return results
     except Exception as e:
-        logger.exception(f"Error in NLP analysis: {e}")
-        return _fallback_analyze_text(text)
+        logger.exception(f"Error in batched NLP analysis, analyzing one by one: {e}")
+        return [_extract_features(text) for text in texts]
 
-def _calculate_date_urgency(doc):
-    """Calculate urgency based on dates mentioned in the text"""
-    today = datetime.datetime.now().date()
-    max_urgency = 0.0
-    
-    # Find date entities
-    for ent in doc.ents:
-        if ent.label_ == "DATE":
-            try:
-                # Try to parse date entities
-                if any(term in ent.text.lower() for term in ["today", "tonight", "now"]):
-                    return 1.0  # Maximum urgency for today
-                elif "tomorrow" in ent.text.lower():
-                    return 0.9  # High urgency for tomorrow
-                elif "this week" in ent.text.lower():
-                    return 0.7  # Medium-high urgency for this week
-                elif "next week" in ent.text.lower():
-                    return 0.4  # Medium urgency for next week
-            except:
-                continue
+def _doc_features(doc):
+    """Feature record for a processed spaCy doc"""
+    pattern_counts, date_entities, time_hits = _doc_matches(doc)
+    return {
+        'engine': 'spacy',
+        'text_length': len(doc.text),
+        'pattern_counts': pattern_counts,
+        'date_entities': date_entities,
+        'time_hits': time_hits,
+        'due_at': deadlines.extract_due_at(doc.text),
+    }
+
+def _doc_matches(doc):
+    """(pattern_counts, date_entities, time_hits) of a processed spaCy doc"""
+    # Use matcher to count urgency and action pattern matches per label
+    pattern_counts = {"URGENCY": 0, "ACTION": 0}
+    for match_id, start, end in matcher(doc):
+        label = nlp.vocab.strings[match_id]
+        pattern_counts[label] = pattern_counts.get(label, 0) + 1
     
-    # Look for time patterns
-    time_pattern = re.compile(r'\b([0-1]?[0-9]|2[0-3]):([0-5][0-9])\b')
-    if time_pattern.search(doc.text):
-        return max(max_urgency, 0.6)  # Medium-high urgency for specific times
+    # Date entities are kept verbatim, the scorer decides what they are worth
+    date_entities = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
+    return pattern_counts, date_entities, len(TIME_PATTERN.findall(doc.text))
+
+def _split_chunks(text):
+    """Split text into pieces of at most CHUNK_CHARS, preferring natural boundaries"""
+    chunks = []
+    start = 0
+    while len(text) - start > CHUNK_CHARS:
+        window = text[start:start + CHUNK_CHARS]
+        cut = CHUNK_CHARS
+        # Cut at the last paragraph break, sentence end or space in the second half of the window
+        for pattern in CHUNK_BOUNDARY_PATTERNS:
+            ends = [m.end() for m in pattern.finditer(window) if m.end() > CHUNK_CHARS // 2]
+            if ends:
+                cut = ends[-1]
+                break
+        chunks.append(text[start:start + cut])
+        start += cut
+    chunks.append(text[start:])
+    return [chunk for chunk in chunks if chunk.strip()]
+
+def _rank_chunks(chunks):
+    """
+    Order chunks by how much they are likely to contribute to the scores:
+    the top of the page first, then by date, time and keyword hits.
+    """
+    def hits(chunk):
+        lowered = chunk.lower()
+        return (len(DATE_HINT_PATTERN.findall(chunk)) + len(TIME_PATTERN.findall(chunk))
+                + len(KEYWORD_PATTERN.findall(lowered)))
     
-    return max_urgency
+    rest = sorted(range(1, len(chunks)), key=lambda i: hits(chunks[i]), reverse=True)
+    return [0] + rest
 
-def _fallback_analyze_text(text):
-    """Enhanced keyword-based analysis as fallback if spaCy fails"""
-    text_lower = text.lower()
+def _chunked_features(text):
+    """
+    Feature record for a long text, analyzed as bounded chunks.
+    The most informative chunks are analyzed first and analysis stops once
+    both scores have saturated, or after MAX_CHUNKS chunks. Pattern counts,
+    date entities and time hits of the analyzed chunks are summed (date
+    entities kept in text order); length and deadline come from the whole
+    text, the deadline from a single pass over it.
+    """
+    chunks = _split_chunks(text)
+    merged = {
+        'engine': 'spacy',
+        'text_length': len(text),
+        'pattern_counts': {"URGENCY": 0, "ACTION": 0},
+        'date_entities': [],
+        'time_hits': 0,
+        'due_at': deadlines.extract_due_at(text),
+    }
+    max_score = scoring.resolve_weights()['max_score']
     
-    # Expanded urgency keywords
-    urgency_keywords = [
-        # Time indicators
-        "today", "tomorrow", "tonight", "asap", "urgent", "immediately", 
-        "emergency", "critical", "this week", "this month", "this morning",
-        "this afternoon", "this evening", "deadline", "due", "by", "before",
-        "soon", "quickly", "fast", "rapid", "prompt", "waiting", "pending",
-        "limited", "closing", "important", "priority", "crucial", "significant",
-        "running out of time", "last chance", "last opportunity", "last day",
-        "last call", "hurry"
-    ]
+    # Chunks are analyzed by rank, but the scorer takes the first date entity
+    # that matches, so entities are merged in chunk (text) order
+    entities_by_chunk = {}
+    analyzed = 0
+    for index in _rank_chunks(chunks)[:MAX_CHUNKS]:
+        pattern_counts, date_entities, time_hits = _doc_matches(nlp(chunks[index]))
+        for label, count in pattern_counts.items():
+            merged['pattern_counts'][label] = merged['pattern_counts'].get(label, 0) + count
+        entities_by_chunk[index] = date_entities
+        merged['date_entities'] = [entity for i in sorted(entities_by_chunk) for entity in entities_by_chunk[i]]
+        merged['time_hits'] += time_hits
+        analyzed += 1
+        
+        # Further chunks can't raise either score
+        urgency_score, action_score = scoring.score_features(merged)
+        if urgency_score >= max_score and action_score >= max_score:
+            break
     
-    # Expanded action keywords
-    action_keywords = [
-        # Action verbs
-        "apply", "submit", "call", "email", "send", "register", "sign", "complete", 
-        "finish", "do", "make", "prepare", "check", "verify", "confirm", "review", 
-        "pay", "schedule", "book", "order", "buy", "download", "install", "update",
-        "contact", "follow", "attend", "join", "meet", "create", "add", "track",
-        "report", "file", "fill", "upload", "backup", "login", "access",
-        # Phrases
-        "don't forget", "reminder", "remind me", "need to", "have to", "must",
-        "should", "remember to", "note", "task", "todo", "to-do", "checklist", 
-        "assignment", "responsible for", "your task", "your job", "approve",
-        "confirm", "validate", "verify"
-    ]
+    logger.debug(f"Analyzed {analyzed}/{len(chunks)} chunks of a {len(text)} character text")
+    return merged
+
+# Keyword lists for the spaCy-less fallback analyzer
+URGENCY_KEYWORDS = [
+    # Time indicators
+    "today", "tomorrow", "tonight", "asap", "urgent", "immediately", 
+    "emergency", "critical", "this week", "this month", "this morning",
+    "this afternoon", "this evening", "deadline", "due", "by", "before",
+    "soon", "quickly", "fast", "rapid", "prompt", "waiting", "pending",
+    "limited", "closing", "important", "priority", "crucial", "significant",
+    "running out of time", "last chance", "last opportunity", "last day",
+    "last call", "hurry"
+]
+
+ACTION_KEYWORDS = [
+    # Action verbs
+    "apply", "submit", "call", "email", "send", "register", "sign", "complete", 
+    "finish", "do", "make", "prepare", "check", "verify", "confirm", "review", 
+    "pay", "schedule", "book", "order", "buy", "download", "install", "update",
+    "contact", "follow", "attend", "join", "meet", "create", "add", "track",
+    "report", "file", "fill", "upload", "backup", "login", "access",
+    # Phrases
+    "don't forget", "reminder", "remind me", "need to", "have to", "must",
+    "should", "remember to", "note", "task", "todo", "to-do", "checklist", 
+    "assignment", "responsible for", "your task", "your job", "approve",
+    "confirm", "validate", "verify"
+]
+
+# Keywords that count extra
+HIGH_URGENCY_KEYWORDS = {"today", "asap", "urgent", "immediately", "emergency", "critical"}
+HIGH_ACTION_KEYWORDS = {"need to", "have to", "must", "don't forget"}
+
+# Dates and times in the text
+FALLBACK_DATE_PATTERNS = [
+    re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b'),  # MM/DD/YYYY or similar
+    re.compile(r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]* \d{1,2}\b'),  # Month Day
+    re.compile(r'\b\d{1,2}:\d{2}\b')  # HH:MM
+]
+
+def _trie_pattern(words):
+    """
+    Build a regex alternation shaped like a trie of the given words, so the
+    engine branches on each character once instead of retrying every keyword
+    at every position (the single-pattern equivalent of Aho-Corasick).
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A word ends here, the longer continuations are optional
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    return build(trie)
+
+def _build_keyword_matcher():
+    """
+    Compile all fallback keywords into one word-bounded pattern.
+    Returns (pattern, weights, contained) where weights maps a keyword to its
+    (urgency, action) weight and contained maps a phrase to the shorter
+    keywords inside it, which a single non-overlapping scan would otherwise
+    miss (so "your task" also counts "task").
+    """
+    weights = {}
+    for keyword in URGENCY_KEYWORDS:
+        urgency, action = weights.get(keyword, (0.0, 0.0))
+        weights[keyword] = (urgency + (1.5 if keyword in HIGH_URGENCY_KEYWORDS else 1), action)
+    for keyword in ACTION_KEYWORDS:
+        urgency, action = weights.get(keyword, (0.0, 0.0))
+        weights[keyword] = (urgency, action + (1.5 if keyword in HIGH_ACTION_KEYWORDS else 1))
+
+    pattern = re.compile(r'\b(?:' + _trie_pattern(weights) + r')\b')
+
+    contained = {}
+    for keyword in weights:
+        inner = [other for other in weights
+                 if other != keyword and re.search(r'\b' + re.escape(other) + r'\b', keyword)]
+        if inner:
+            contained[keyword] = inner
+
+    return pattern, weights, contained
+
+KEYWORD_PATTERN, KEYWORD_WEIGHTS, CONTAINED_KEYWORDS = _build_keyword_matcher()
+
+def keyword_counts(text):
+    """
+    Scan text once and return weighted (urgency_count, action_count).
+    Each distinct keyword counts once and only whole words match, so "do"
+    no longer matches inside "document".
+    """
+    text_lower = text.lower()
     
-    # Count matches with extra weight for certain important keywords
-    high_urgency_keywords = ["today", "asap", "urgent", "immediately", "emergency", "critical"]
-    high_action_keywords = ["need to", "have to", "must", "don't forget"]
+    found = set(KEYWORD_PATTERN.findall(text_lower))
+    for keyword in list(found):
+        found.update(CONTAINED_KEYWORDS.get(keyword, ()))
     
     urgency_count = 0
     action_count = 0
-    
-    # Regular keywords
-    for keyword in urgency_keywords:
-        if keyword in text_lower:
-            # Add extra weight for high urgency keywords
-            if keyword in high_urgency_keywords:
-                urgency_count += 1.5
-            else:
-                urgency_count += 1
-                
-    for keyword in action_keywords:
-        if keyword in text_lower:
-            # Add extra weight for high action keywords
-            if keyword in high_action_keywords:
-                action_count += 1.5
-            else:
-                action_count += 1
+    for keyword in found:
+        urgency, action = KEYWORD_WEIGHTS[keyword]
+        urgency_count += urgency
+        action_count += action
     
     # Check for dates and times
-    date_patterns = [
-        r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b',  # MM/DD/YYYY or similar
-        r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]* \d{1,2}\b',  # Month Day
-        r'\b\d{1,2}:\d{2}\b'  # HH:MM
-    ]
-    
-    for pattern in date_patterns:
-        if re.search(pattern, text_lower):
+    for pattern in FALLBACK_DATE_PATTERNS:
+        if pattern.search(text_lower):
             urgency_count += 1.5
     
-    # Add a base score to ensure non-zero values
-    base_urgency = 0.15
-    base_action = 0.15
-    
-    # Normalize by text length but ensure meaningful scores
-    text_length_factor = min(1.0, max(0.5, len(text) / 300))  # Between 0.5 and 1.0
-    
-    # Calculate final scores with base values
-    urgency_score = min(0.95, base_urgency + (urgency_count * 0.15 * text_length_factor))
-    action_score = min(0.95, base_action + (action_count * 0.12 * text_length_factor))
-    
-    return urgency_score, action_score
+    return urgency_count, action_count
+
+def _fallback_features(text):
+    """
+    Feature record from the keyword matcher, used if spaCy is unavailable.
+    Date and time bonuses are already folded into the urgency count.
+    """
+    urgency_count, action_count = keyword_counts(text)
+    return {
+        'engine': 'keywords',
+        'text_length': len(text),
+        'pattern_counts': {"URGENCY": urgency_count, "ACTION": action_count},
+        'date_entities': [],
+        'time_hits': 0,
+        'due_at': deadlines.extract_due_at(text),
+    }
+
+def _fallback_analyze_text(text):
+    """Enhanced keyword-based analysis as fallback if spaCy fails"""
+    return scoring.score_features(_fallback_features(text))
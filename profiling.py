@@ -0,0 +1,192 @@
+"""
+Opt-in cProfile profiling of requests and background ingestion jobs.
+
+PROFILING selects what is profiled:
+
+    off        nothing (the default); /debug/profiles is not served
+    on-demand  requests sent with an X-Profile: 1 header or ?profile=1, and the
+               background jobs started by such a request (upload processing)
+    all        every request and every background job
+
+Each profile is written to PROFILE_DIR as a .prof file (pstats format, open
+it with snakeviz or python -m pstats) next to a small JSON summary of the
+top functions by cumulative time. GET /debug/profiles lists the newest
+summaries; GET /debug/profiles/<name>.prof downloads one profile. Only the
+newest PROFILE_KEEP profiles are kept.
+
+cProfile follows the thread it was started in, so a request profile covers
+the request itself and a job profile the worker thread running that job.
+From Python 3.12 only one profiler can run per process: a request or job
+that starts while another is being profiled is not profiled.
+"""
+
+import os
+import io
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from flask import g, request, jsonify, abort, send_from_directory
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'on-demand', 'all')
+
+# Functions listed per profile summary
+TOP_FUNCTIONS = 25
+
+# Set during init_app
+mode = 'off'
+profile_dir = None
+keep = 100
+_prune_lock = threading.Lock()
+
+def init_app(app):
+    """Configure profiling for an app and register its hooks and /debug/profiles"""
+    global mode, profile_dir, keep
+
+    app.config.setdefault('PROFILING', os.environ.get('PROFILING', 'off'))
+    app.config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR', './profiles'))
+    app.config.setdefault('PROFILE_KEEP', int(os.environ.get('PROFILE_KEEP', 100)))
+
+    mode = app.config['PROFILING'] if app.config['PROFILING'] in MODES else 'off'
+    profile_dir = app.config['PROFILE_DIR']
+    keep = app.config['PROFILE_KEEP']
+    if mode == 'off' or 'list_profiles' in app.view_functions:
+        return
+
+    os.makedirs(profile_dir, exist_ok=True)
+    logger.info(f"Profiling {'every request and job' if mode == 'all' else 'on demand'}, writing to {profile_dir}")
+    app.before_request(_start_request_profile)
+    app.teardown_request(_finish_request_profile)
+    app.add_url_rule('/debug/profiles', 'list_profiles', list_profiles)
+    app.add_url_rule('/debug/profiles/<path:filename>', 'download_profile', download_profile)
+
+def requested():
+    """Whether the current request asked to be profiled (always true in 'all' mode)"""
+    if mode == 'all':
+        return True
+    if mode != 'on-demand':
+        return False
+    return request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'
+
+def _enable():
+    """A running profiler, or None if another profiler is already active"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows only one active profiler
+        return None
+    return profiler
+
+def _start_request_profile():
+    if request.endpoint in ('list_profiles', 'download_profile') or not requested():
+        return
+    g.profiler = _enable()
+    g.profile_started = time.time()
+
+def _finish_request_profile(exc=None):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    name = request.url_rule.rule if request.url_rule is not None else request.path
+    save(profiler, 'request', f'{request.method} {name}', g.pop('profile_started'))
+
+@contextmanager
+def profiled_job(name, enabled=None):
+    """
+    Profile the with block as a background job. enabled defaults to the
+    PROFILING mode ('all'); pass requested() from the request that started
+    the job to follow an on-demand request into its job.
+    """
+    if enabled is None:
+        enabled = mode == 'all'
+    profiler = _enable() if enabled and mode != 'off' else None
+    started = time.time()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            save(profiler, 'job', name, started)
+
+def save(profiler, kind, name, started):
+    """Write a profile and its summary to the profile directory"""
+    try:
+        duration = time.time() - started
+        stem = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}-{kind}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(profile_dir, f'{stem}.prof')
+        profiler.dump_stats(path)
+
+        summary = {
+            'profile': f'{stem}.prof',
+            'kind': kind,
+            'name': name,
+            'thread': threading.current_thread().name,
+            'started_at': started,
+            'duration': duration,
+            'top': top_functions(profiler),
+        }
+        with open(os.path.join(profile_dir, f'{stem}.json'), 'w') as f:
+            json.dump(summary, f)
+        logger.info(f"Profiled {kind} {name} ({duration * 1000:.0f}ms): {path}")
+        _prune()
+    except Exception as e:
+        logger.error(f"Could not save profile of {kind} {name}: {str(e)}")
+
+def top_functions(profiler, limit=TOP_FUNCTIONS):
+    """The functions with the most cumulative time, as dicts"""
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for (filename, line, function), (_cc, calls, total, cumulative, _callers) in stats.stats.items():
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}({function})',
+            'calls': calls,
+            'total_time': total,
+            'cumulative_time': cumulative,
+        })
+    rows.sort(key=lambda row: row['cumulative_time'], reverse=True)
+    return rows[:limit]
+
+def _summaries():
+    """Profile summaries, newest first"""
+    names = sorted((name for name in os.listdir(profile_dir) if name.endswith('.json')), reverse=True)
+    summaries = []
+    for name in names:
+        try:
+            with open(os.path.join(profile_dir, name)) as f:
+                summaries.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+def _prune():
+    """Delete all but the newest PROFILE_KEEP profiles"""
+    with _prune_lock:
+        stems = sorted({name.rsplit('.', 1)[0] for name in os.listdir(profile_dir)
+                        if name.endswith(('.json', '.prof'))}, reverse=True)
+        for stem in stems[keep:]:
+            for ext in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(profile_dir, stem + ext))
+                except FileNotFoundError:
+                    pass
+
+def list_profiles():
+    """Newest profile summaries; ?limit=N (default 20) and ?kind=request|job"""
+    limit = request.args.get('limit', 20, type=int)
+    kind = request.args.get('kind')
+    summaries = [s for s in _summaries() if kind is None or s['kind'] == kind]
+    return jsonify({'mode': mode, 'profiles': summaries[:limit]})
+
+def download_profile(filename):
+    if not filename.endswith('.prof'):
+        abort(404)
+    return send_from_directory(os.path.abspath(profile_dir), filename, as_attachment=True)
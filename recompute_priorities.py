@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Recompute urgency, action and priority scores for every screenshot from the
+stored NLP features (the screenshot_features table), without re-running OCR
+or spaCy. Use it after changing scoring weights:
+
+    python recompute_priorities.py --weights weights.json
+
+The weights file holds overrides for scoring.DEFAULT_WEIGHTS; point
+$SCORING_WEIGHTS at the same file so new uploads are scored the same way.
+Screenshots without stored features (no text, or ingested before the
+feature store existed) keep their current scores, but take part in the
+normalization of active priorities like every other screenshot.
+"""
+
+import sys
+import json
+import time
+import argparse
+import logging
+import datetime
+
+import numpy as np
+from sqlalchemy import update
+
+import scoring
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows per bulk UPDATE statement
+UPDATE_CHUNK = 5000
+
+def load_features(db, Screenshot, ScreenshotFeatures):
+    """Load every screenshot with its feature columns (None without stored features)"""
+    return db.session.query(
+        Screenshot.id,
+        Screenshot.dismissed,
+        Screenshot.deferred_until,
+        Screenshot.due_at,
+        Screenshot.urgency_score,
+        Screenshot.action_score,
+        Screenshot.priority_score,
+        ScreenshotFeatures.text_length,
+        ScreenshotFeatures.urgency_count,
+        ScreenshotFeatures.action_count,
+        ScreenshotFeatures.time_hits,
+        ScreenshotFeatures.date_entities,
+    ).outerjoin(ScreenshotFeatures, ScreenshotFeatures.screenshot_id == Screenshot.id).all()
+
+def compute_scores(rows, weights, normalize=True):
+    """
+    Score all feature rows in one vectorized pass; rows without features keep
+    their current scores
+    Returns a list of {'id', 'urgency_score', 'action_score', 'priority_score'} dicts
+    """
+    now = datetime.datetime.now()
+    ids = [row.id for row in rows]
+    urgency = np.array([row.urgency_score or 0.0 for row in rows], dtype=float)
+    action = np.array([row.action_score or 0.0 for row in rows], dtype=float)
+    priority = np.array([row.priority_score or 0.0 for row in rows], dtype=float)
+
+    featured = [i for i, row in enumerate(rows) if row.text_length is not None]
+    if featured:
+        featured_rows = [rows[i] for i in featured]
+        # Resolved deadlines count by days left, like in scoring.score_features
+        date_urgencies = [
+            scoring.time_urgency(json.loads(row.date_entities) if row.date_entities else [], row.time_hits,
+                                 row.due_at, now, weights)
+            for row in featured_rows
+        ]
+        urgency[featured], action[featured], priority[featured] = scoring.score_arrays(
+            [row.text_length for row in featured_rows],
+            [row.urgency_count for row in featured_rows],
+            [row.action_count for row in featured_rows],
+            date_urgencies,
+            weights
+        )
+
+    if normalize:
+        # Normalize across active screenshots, as the upload pipeline does
+        active = np.array([
+            not row.dismissed and (row.deferred_until is None or row.deferred_until <= now)
+            for row in rows
+        ], dtype=bool)
+        if active.any():
+            priority[active] = scoring.normalize_priorities(priority[active])
+
+    return [
+        {'id': ids[i], 'urgency_score': float(urgency[i]), 'action_score': float(action[i]),
+         'priority_score': float(priority[i])}
+        for i in range(len(ids))
+    ]
+
+def recompute_priorities(weights, normalize=True, dry_run=False):
+    """Rescore every screenshot from its stored features, returns the number of rows updated"""
+    from app import create_app, db, Screenshot, ScreenshotFeatures
+
+    app = create_app(services=False)
+    with app.app_context():
+        start = time.perf_counter()
+        rows = load_features(db, Screenshot, ScreenshotFeatures)
+        logger.info(f"Loaded features for {len(rows)} screenshots in {time.perf_counter() - start:.2f}s")
+
+        scored = compute_scores(rows, weights, normalize)
+        logger.info(f"Scored {len(scored)} screenshots in {time.perf_counter() - start:.2f}s")
+
+        if dry_run:
+            for values in scored[:10]:
+                logger.info(f"Screenshot {values['id']}: priority {values['priority_score']:.3f}")
+            return 0
+
+        # Bulk UPDATE by primary key, in chunks
+        for i in range(0, len(scored), UPDATE_CHUNK):
+            db.session.execute(update(Screenshot), scored[i:i + UPDATE_CHUNK])
+        db.session.commit()
+
+        logger.info(f"Updated {len(scored)} screenshots in {time.perf_counter() - start:.2f}s")
+        return len(scored)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute screenshot priorities from stored NLP features")
+    parser.add_argument("--weights", help="JSON file with overrides for scoring.DEFAULT_WEIGHTS "
+                                          "(default: $SCORING_WEIGHTS if set)")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="Store raw priorities instead of normalizing active screenshots")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Compute scores without writing them to the database")
+    args = parser.parse_args()
+
+    weights = None
+    if args.weights:
+        weights = scoring.load_weights(args.weights)
+        if not weights:
+            sys.exit(1)
+
+    print("PRIORITY RECOMPUTE")
+    print("==================")
+    print(f"Weights: {scoring.resolve_weights(weights)}")
+    print()
+
+    recompute_priorities(weights, normalize=not args.no_normalize, dry_run=args.dry_run)
+
+    print("Recompute complete.")
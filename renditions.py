@@ -0,0 +1,249 @@
+import os
+import logging
+import threading
+from urllib.parse import quote
+from collections import OrderedDict
+from flask import current_app, abort
+from werkzeug.security import safe_join
+from PIL import Image, ImageOps, features
+
+import storage
+import static_files
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Named rendition sizes (bounding boxes, aspect ratio is preserved)
+RENDITION_SIZES = {
+    'thumb': (320, 320),
+    'preview': (1280, 1280),
+}
+
+# File extension and mimetype for each supported output format
+FORMATS = {
+    'AVIF': ('avif', 'image/avif'),
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+class RenditionCache:
+    """
+    Content-addressed cache of downscaled screenshot renditions.
+
+    Renditions are stored as <folder>/<digest[:2]>/<digest>_<size>.<ext>, where
+    digest is the SHA-256 of the source image, so renaming or re-uploading the
+    same image never produces a second copy. The cache is bounded by total
+    size on disk and evicts least recently used renditions first.
+    """
+
+    def __init__(self, folder, max_bytes, image_format='WEBP', quality=80):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.image_format = _pick_format(image_format)
+        self.extension, self.mimetype = FORMATS[self.image_format]
+        self.quality = quality
+
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # rendition path -> size in bytes, oldest first
+        self._total_bytes = 0
+        self._in_flight = {}  # rendition path -> Event for renditions being generated
+
+        os.makedirs(self.folder, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU index from disk, least recently used first"""
+        entries = []
+        for root, _dirs, files in os.walk(self.folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+
+        entries.sort()
+        for _mtime, path, size in entries:
+            self._index[path] = size
+            self._total_bytes += size
+
+        logger.info(f"Rendition cache: {len(self._index)} files, {self._total_bytes / 1024 / 1024:.1f}MB in {self.folder}")
+        self._evict()
+
+    def rendition_path(self, digest, size_name):
+        """Cache location for a rendition of the image with the given digest"""
+        return os.path.join(self.folder, digest[:2], f"{digest}_{size_name}.{self.extension}")
+
+    def get(self, source_path, size_name):
+        """
+        Return the path of the requested rendition, generating it on first use.
+        Concurrent requests for the same rendition wait for a single generation.
+        """
+        if size_name not in RENDITION_SIZES:
+            raise ValueError(f"Unknown rendition size: {size_name}")
+
+        digest = storage.content_digest(source_path)
+        path = self.rendition_path(digest, size_name)
+
+        while True:
+            with self._lock:
+                if path in self._index:
+                    self._index.move_to_end(path)
+                    return path
+                pending = self._in_flight.get(path)
+                if pending is None:
+                    pending = threading.Event()
+                    self._in_flight[path] = pending
+                    break
+            # Another thread is generating this rendition
+            pending.wait()
+
+        try:
+            # Another worker process may already have written it
+            if not os.path.exists(path):
+                self._generate(source_path, path, RENDITION_SIZES[size_name])
+            size = os.path.getsize(path)
+            with self._lock:
+                self._index[path] = size
+                self._total_bytes += size
+                self._evict()
+            return path
+        finally:
+            with self._lock:
+                self._in_flight.pop(path, None)
+            pending.set()
+
+    def _generate(self, source_path, target_path, box):
+        """Downscale the source image into target_path"""
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = f"{target_path}.{threading.get_ident()}.tmp"
+
+        with Image.open(source_path) as image:
+            # Let the decoder skip detail we are about to throw away (JPEG only)
+            image.draft('RGB', box)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(box, Image.LANCZOS)
+
+            if self.image_format == 'JPEG':
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+
+            image.save(tmp_path, format=self.image_format, quality=self.quality)
+
+        # Atomic rename so readers never see a partially written file
+        os.replace(tmp_path, target_path)
+        logger.debug(f"Generated rendition {target_path}")
+
+    def _evict(self):
+        """Remove least recently used renditions until under the size limit (lock held)"""
+        while self._total_bytes > self.max_bytes and self._index:
+            path, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not evict rendition {path}: {str(e)}")
+
+def _pick_format(requested):
+    """Use the requested output format if this Pillow build supports it"""
+    requested = (requested or 'WEBP').upper()
+    if requested == 'AVIF' and features.check('avif'):
+        return 'AVIF'
+    if requested in ('AVIF', 'WEBP') and features.check('webp'):
+        if requested == 'AVIF':
+            logger.warning("AVIF is not supported by this Pillow build, using WebP renditions")
+        return 'WEBP'
+    if requested != 'JPEG':
+        logger.warning(f"{requested} is not supported by this Pillow build, using JPEG renditions")
+    return 'JPEG'
+
+# Rendition caches by folder, shared by every app of the process
+_caches = {}
+_caches_lock = threading.Lock()
+
+def init_app(app, temp_folder='temp_uploads'):
+    """Set up the rendition cache and register the rendition route"""
+    app.config.setdefault('RENDITIONS_FOLDER', os.environ.get('RENDITIONS_FOLDER', './renditions'))
+    app.config.setdefault('RENDITIONS_MAX_MB', int(os.environ.get('RENDITIONS_MAX_MB', 512)))
+    app.config.setdefault('RENDITIONS_FORMAT', os.environ.get('RENDITIONS_FORMAT', 'WEBP'))
+    app.config.setdefault('RENDITIONS_AT_INGEST', True)
+
+    # Building a cache walks its folder, so apps sharing a folder share the cache
+    key = os.path.abspath(app.config['RENDITIONS_FOLDER'])
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = RenditionCache(
+                app.config['RENDITIONS_FOLDER'],
+                app.config['RENDITIONS_MAX_MB'] * 1024 * 1024,
+                app.config['RENDITIONS_FORMAT']
+            )
+    app.extensions['renditions'] = cache
+
+    # Source folders a rendition may be generated from, addressed by name in URLs
+    app.config['RENDITION_SOURCES'] = {
+        'screenshots': app.config['SCREENSHOTS_FOLDER'],
+        'documents': app.config['DOCUMENTS_FOLDER'],
+        'temp_uploads': temp_folder,
+    }
+
+    if 'rendition' not in app.view_functions:
+        app.add_url_rule('/renditions/<size>/<source>/<path:filename>', 'rendition', serve_rendition)
+
+def serve_rendition(size, source, filename):
+    """Serve a rendition of an image from one of the configured source folders"""
+    if size not in RENDITION_SIZES:
+        abort(404)
+
+    root = current_app.config['RENDITION_SOURCES'].get(source)
+    source_path = safe_join(root, storage.resolve_filename(root, filename)) if root else None
+    if not source_path or not os.path.isfile(source_path):
+        abort(404)
+
+    cache = current_app.extensions['renditions']
+    try:
+        path = cache.get(source_path, size)
+    except Exception as e:
+        logger.error(f"Error generating {size} rendition for {source_path}: {str(e)}")
+        abort(404)
+
+    # Renditions are content-addressed, so they are as immutable as their source
+    return static_files.send_immutable_file(cache.folder, os.path.relpath(path, cache.folder), cache.mimetype)
+
+def generate_renditions(source_path):
+    """Eagerly build every rendition size for a newly ingested image"""
+    if not current_app.config.get('RENDITIONS_AT_INGEST'):
+        return
+
+    cache = current_app.extensions.get('renditions')
+    if cache is None:
+        return
+
+    for size_name in RENDITION_SIZES:
+        try:
+            cache.get(source_path, size_name)
+        except Exception as e:
+            logger.warning(f"Could not generate {size_name} rendition for {source_path}: {str(e)}")
+
+def rendition_urls(source_path):
+    """
+    Map each rendition size to its URL for an image path, for API payloads.
+    Returns an empty dict if the path is outside the configured source folders.
+    The URLs are built without url_for, so change events published from
+    background threads (uploads, deferrals) need no request context.
+    """
+    sources = current_app.config.get('RENDITION_SOURCES', {})
+    abs_path = os.path.abspath(source_path)
+
+    for source, root in sources.items():
+        abs_root = os.path.abspath(root)
+        if abs_path.startswith(abs_root + os.sep):
+            filename = quote(os.path.relpath(abs_path, abs_root).replace(os.sep, '/'))
+            return {
+                size_name: f'/renditions/{size_name}/{source}/{filename}'
+                for size_name in RENDITION_SIZES
+            }
+    return {}
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Re-run NLP analysis over the stored OCR text of every screenshot, for when
+nlp_analyzer's patterns change. OCR is not repeated: text_content is streamed
+from the database in chunks, analyzed in parallel, and the features and
+scores are written back with bulk statements.
+
+    python rescore.py [--workers 4] [--chunk-size 500] [--fast]
+
+Progress is checkpointed after every chunk, so an interrupted run resumes
+where it stopped (use --restart to start over). Once every chunk is done,
+priorities are recomputed and normalized from the new features (see
+recompute_priorities.py).
+"""
+
+import time
+import argparse
+import datetime
+import logging
+import functools
+import multiprocessing
+
+from sqlalchemy import delete, insert, update
+
+import nlp_analyzer
+import deadlines
+import scoring
+import recompute_priorities
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# AppState key holding the id of the last screenshot rescored
+CHECKPOINT_KEY = 'rescore.last_id'
+
+# text_content values the ingest pipelines store when there was no usable text
+PLACEHOLDER_TEXTS = {
+    "[No text detected]",
+    "[Upload error]",
+    "[Error during processing]",
+    "[Error: Could not process image]",
+}
+
+def iter_chunks(db, Screenshot, after_id, chunk_size):
+    """
+    Yield lists of (id, text_content, created_at) rows in id order.
+    Keyset pagination keeps every query an index range scan, however far in.
+    """
+    while True:
+        rows = db.session.query(Screenshot.id, Screenshot.text_content, Screenshot.created_at).filter(
+            Screenshot.id > after_id
+        ).order_by(Screenshot.id).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1].id
+
+def analyze_chunk(texts, workers, fast, pool):
+    """Feature records for a chunk of texts, analyzed across workers"""
+    if not fast:
+        # spaCy parallelizes itself, forking workers that share the loaded model
+        return nlp_analyzer.extract_features_batch(texts, n_process=workers)
+    if pool is None:
+        return nlp_analyzer.extract_features_batch(texts, fast=True)
+
+    # The keyword matcher is plain Python, so split the chunk across the pool
+    step = max(1, len(texts) // workers)
+    parts = [texts[i:i + step] for i in range(0, len(texts), step)]
+    results = pool.map(functools.partial(nlp_analyzer.extract_features_batch, fast=True), parts)
+    return [features for part in results for features in part]
+
+def rescore_chunk(db, Screenshot, ScreenshotFeatures, rows, features_list):
+    """Replace the stored features and scores of one chunk in a single transaction"""
+    now = datetime.datetime.now()
+    feature_rows = []
+    score_rows = []
+
+    for row, features in zip(rows, features_list):
+        # Relative deadlines ("tomorrow") are relative to when the screenshot arrived
+        features['due_at'] = deadlines.extract_due_at(row.text_content, row.created_at)
+        urgency_score, action_score = scoring.score_features(features, now=now)
+
+        feature_rows.append(dict(ScreenshotFeatures.column_values(features), screenshot_id=row.id))
+        score_rows.append({
+            'id': row.id,
+            'urgency_score': urgency_score,
+            'action_score': action_score,
+            'priority_score': scoring.priority_score(urgency_score, action_score),
+            'due_at': features['due_at'],
+        })
+
+    ids = [row.id for row in rows]
+    db.session.execute(delete(ScreenshotFeatures).where(ScreenshotFeatures.screenshot_id.in_(ids)))
+    if feature_rows:
+        db.session.execute(insert(ScreenshotFeatures), feature_rows)
+        db.session.execute(update(Screenshot), score_rows)
+
+def save_checkpoint(db, AppState, last_id):
+    """Record the last rescored id (call before committing the chunk)"""
+    state = db.session.get(AppState, CHECKPOINT_KEY)
+    if last_id is None:
+        if state is not None:
+            db.session.delete(state)
+    elif state is None:
+        db.session.add(AppState(key=CHECKPOINT_KEY, value=str(last_id)))
+    else:
+        state.value = str(last_id)
+
+def rescore(chunk_size=500, workers=1, fast=False, restart=False):
+    """Rescore every screenshot with text, returns the number of screenshots rescored"""
+    from app import create_app, db, Screenshot, ScreenshotFeatures, AppState
+
+    app = create_app(services=False)
+    with app.app_context():
+        state = db.session.get(AppState, CHECKPOINT_KEY)
+        after_id = int(state.value) if state and not restart else 0
+        if after_id:
+            logger.info(f"Resuming after screenshot {after_id}")
+
+        pool = multiprocessing.Pool(workers) if fast and workers > 1 else None
+        rescored = 0
+        analyze_seconds = 0.0
+        start = time.perf_counter()
+
+        try:
+            for rows in iter_chunks(db, Screenshot, after_id, chunk_size):
+                with_text = [row for row in rows if row.text_content and row.text_content.strip()
+                             and row.text_content not in PLACEHOLDER_TEXTS]
+
+                chunk_start = time.perf_counter()
+                features_list = analyze_chunk([row.text_content for row in with_text], workers, fast, pool)
+                analyze_seconds += time.perf_counter() - chunk_start
+
+                rescore_chunk(db, Screenshot, ScreenshotFeatures, with_text, features_list)
+                save_checkpoint(db, AppState, rows[-1].id)
+                db.session.commit()
+
+                rescored += len(with_text)
+                elapsed = time.perf_counter() - start
+                logger.info(f"Rescored {rescored} screenshots (up to id {rows[-1].id}), "
+                            f"{rescored / elapsed:.1f} docs/sec overall, "
+                            f"{rescored / analyze_seconds if analyze_seconds else 0:.1f} docs/sec analysis")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        # All chunks done: clear the checkpoint so the next run starts over
+        save_checkpoint(db, AppState, None)
+        db.session.commit()
+
+    # Normalize priorities across the corpus from the new features
+    recompute_priorities.recompute_priorities(None)
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Rescored {rescored} screenshots in {elapsed:.1f}s ({rescored / elapsed if elapsed else 0:.1f} docs/sec)")
+    return rescored
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run NLP analysis over stored screenshot text")
+    parser.add_argument("--chunk-size", type=int, default=500,
+                        help="Screenshots loaded, analyzed and written per transaction (default: 500)")
+    parser.add_argument("--workers", type=int, default=max(1, (multiprocessing.cpu_count() or 2) - 1),
+                        help="Parallel analysis processes (default: CPU count - 1)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Use the keyword matcher instead of spaCy")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the checkpoint of an interrupted run and start from the beginning")
+    args = parser.parse_args()
+
+    print("CORPUS RESCORE")
+    print("==============")
+    print(f"Engine: {'keywords' if args.fast else 'spaCy'}, workers: {args.workers}, chunk size: {args.chunk_size}")
+    print()
+
+    rescore(args.chunk_size, args.workers, args.fast, args.restart)
+
+    print("Rescore complete.")
@@ -33,6 +33,11 @@ def reset_database():
             cursor.execute("SELECT COUNT(*) FROM screenshot")
             count = cursor.fetchone()[0]
             
+            # Delete stored NLP features first (SQLite doesn't cascade by default)
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='screenshot_features'")
+            if cursor.fetchone():
+                cursor.execute("DELETE FROM screenshot_features")
+            
             # Delete all screenshots
             cursor.execute("DELETE FROM screenshot")
             conn.commit()
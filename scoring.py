@@ -0,0 +1,159 @@
+"""
+Pure scoring functions that turn NLP feature records into scores.
+
+nlp_analyzer extracts features (pattern match counts, date entities, text
+length, time hits) once per text; everything tunable about how those become
+urgency, action and priority scores lives here, so weights can be changed and
+the whole corpus rescored without re-running OCR or spaCy.
+"""
+
+import os
+import json
+import logging
+import datetime
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = {
+    # Floor for both scores so every screenshot gets a non-zero value
+    'base_urgency': 0.15,
+    'base_action': 0.15,
+    # Score added per pattern match, scaled by the text length factor
+    'urgency_step': 0.15,
+    'action_step': 0.12,
+    # Text length factor = clamp(length / length_divisor, min_length_factor, 1.0)
+    'length_divisor': 300,
+    'min_length_factor': 0.5,
+    'max_score': 0.95,
+    # Priority blend
+    'urgency_weight': 0.6,
+    'action_weight': 0.4,
+    # Urgency added for DATE entities mentioning these terms (first rule wins)
+    'date_terms': [
+        [["today", "tonight", "now"], 1.0],
+        [["tomorrow"], 0.9],
+        [["this week"], 0.7],
+        [["next week"], 0.4],
+    ],
+    # Urgency when the text contains a clock time like 14:30
+    'time_urgency': 0.6,
+    # Urgency of a resolved deadline (due_at) by whole days left:
+    # [max days left, bucket name, urgency], anything further out is 'later' (0.0)
+    'deadline_buckets': [
+        [-1, 'overdue', 0.5],
+        [0, 'today', 1.0],
+        [1, 'tomorrow', 0.9],
+        [7, 'this_week', 0.7],
+        [14, 'next_week', 0.4],
+    ],
+}
+
+def load_weights(path):
+    """Load weight overrides from a JSON file, returns {} if it can't be read"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read scoring weights from {path}: {str(e)}")
+        return {}
+
+# Weight overrides applied to every score, from the file in $SCORING_WEIGHTS
+ACTIVE_WEIGHTS = load_weights(os.environ["SCORING_WEIGHTS"]) if os.environ.get("SCORING_WEIGHTS") else {}
+
+def resolve_weights(weights=None):
+    """Merge weight overrides into the defaults (the active overrides if none are given)"""
+    merged = dict(DEFAULT_WEIGHTS)
+    merged.update(ACTIVE_WEIGHTS if weights is None else weights)
+    return merged
+
+def date_urgency(date_entities, time_hits, weights=None):
+    """Urgency contributed by date entities and clock times"""
+    weights = resolve_weights(weights)
+    for entity in date_entities or ():
+        entity = entity.lower()
+        for terms, urgency in weights['date_terms']:
+            if any(term in entity for term in terms):
+                return urgency
+    if time_hits:
+        return weights['time_urgency']
+    return 0.0
+
+def deadline_urgency(due_at, now=None, weights=None):
+    """Urgency of an absolute deadline, by how many calendar days are left until it"""
+    weights = resolve_weights(weights)
+    now = now or datetime.datetime.now()
+    remaining = (due_at.date() - now.date()).days
+    for max_days, _name, urgency in weights['deadline_buckets']:
+        if remaining <= max_days:
+            return urgency
+    return 0.0
+
+def time_urgency(date_entities, time_hits, due_at=None, now=None, weights=None):
+    """
+    Urgency contributed by the dates and times of a text. A resolved deadline
+    (due_at) replaces the date entities, which are relative to when the text
+    was read ("tomorrow" would stay tomorrow), so its urgency follows the
+    days left; a clock time still counts if that is higher.
+    """
+    weights = resolve_weights(weights)
+    if due_at is None:
+        return date_urgency(date_entities, time_hits, weights)
+    return max(deadline_urgency(due_at, now, weights), weights['time_urgency'] if time_hits else 0.0)
+
+def score_features(features, weights=None, now=None):
+    """
+    Score a single feature record from nlp_analyzer.extract_features
+    Deadlines (due_at) are scored relative to now, see time_urgency.
+    Returns (urgency_score, action_score)
+    """
+    weights = resolve_weights(weights)
+    counts = features['pattern_counts']
+    length_factor = min(1.0, max(weights['min_length_factor'], features['text_length'] / weights['length_divisor']))
+
+    urgency = (weights['base_urgency']
+               + counts.get('URGENCY', 0) * weights['urgency_step'] * length_factor
+               + time_urgency(features.get('date_entities'), features.get('time_hits'),
+                              features.get('due_at'), now, weights))
+    action = weights['base_action'] + counts.get('ACTION', 0) * weights['action_step'] * length_factor
+
+    return min(weights['max_score'], urgency), min(weights['max_score'], action)
+
+def priority_score(urgency_score, action_score, weights=None):
+    """Blend urgency and action into the overall priority score"""
+    weights = resolve_weights(weights)
+    return (urgency_score * weights['urgency_weight']) + (action_score * weights['action_weight'])
+
+def score_arrays(text_length, urgency_count, action_count, date_urgencies, weights=None):
+    """
+    Vectorized scoring over whole columns of features
+    Returns (urgency_scores, action_scores, priority_scores) as numpy arrays
+    """
+    weights = resolve_weights(weights)
+    text_length = np.asarray(text_length, dtype=float)
+    length_factor = np.clip(text_length / weights['length_divisor'], weights['min_length_factor'], 1.0)
+
+    urgency = (weights['base_urgency']
+               + np.asarray(urgency_count, dtype=float) * weights['urgency_step'] * length_factor
+               + np.asarray(date_urgencies, dtype=float))
+    action = weights['base_action'] + np.asarray(action_count, dtype=float) * weights['action_step'] * length_factor
+
+    urgency = np.minimum(urgency, weights['max_score'])
+    action = np.minimum(action, weights['max_score'])
+    priority = urgency * weights['urgency_weight'] + action * weights['action_weight']
+    return urgency, action, priority
+
+def normalize_priorities(priorities):
+    """
+    Spread priorities around a mean of 0.5 (std dev ~0.15), clamped to [0.1, 0.9],
+    the same normalization the upload pipeline applies to active screenshots
+    """
+    priorities = np.asarray(priorities, dtype=float)
+    if len(priorities) < 3:
+        return priorities
+    std_dev = priorities.std()
+    if std_dev == 0:
+        return priorities
+    z_scores = (priorities - priorities.mean()) / std_dev
+    return np.clip(0.5 + z_scores * 0.15, 0.1, 0.9)
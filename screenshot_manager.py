@@ -5,6 +5,11 @@ from PIL import Image
 import pytesseract
 from flask import current_app
 import nlp_analyzer
+import scoring
+import storage
+import metrics
+import tracing
+import db_writer
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,17 +17,19 @@ logger = logging.getLogger(__name__)
 # These will be set during init_app
 db = None
 Screenshot = None
+ScreenshotFeatures = None
 
 def init_app(app):
     """Initialize the screenshot manager with the app context"""
-    global db, Screenshot
+    global db, Screenshot, ScreenshotFeatures
     
     # Import the app module here to avoid circular imports
-    from app import db as app_db, Screenshot as app_Screenshot
+    from app import db as app_db, Screenshot as app_Screenshot, ScreenshotFeatures as app_ScreenshotFeatures
     
     # Set global variables
     db = app_db
     Screenshot = app_Screenshot
+    ScreenshotFeatures = app_ScreenshotFeatures
     
     app.config.setdefault('SCREENSHOTS_FOLDER', './screenshots')
     app.config.setdefault('DOCUMENTS_FOLDER', './documents')
@@ -31,12 +38,7 @@ def init_app(app):
     os.makedirs(app.config['SCREENSHOTS_FOLDER'], exist_ok=True)
     os.makedirs(app.config['DOCUMENTS_FOLDER'], exist_ok=True)
     
-    # Check for Tesseract
-    try:
-        pytesseract.get_tesseract_version()
-    except Exception as e:
-        logger.error(f"Tesseract OCR is not properly installed: {e}")
-        logger.error("Please install Tesseract OCR to use this application")
+    # Tesseract is checked by the warm-up (see warmup.py)
 
 def scan_for_new_screenshots():
     """
@@ -52,37 +54,63 @@ def scan_for_new_screenshots():
     
     folders_to_scan = [screenshots_folder, documents_folder]
     
-    # First pass: process all screenshots and collect their data
+    # Load known paths once instead of querying the database for every file.
+    # Paths from the flat layout are resolved to where migrate_storage.py moved them
+    known_paths = set()
+    for (path,) in db.session.query(Screenshot.path):
+        known_paths.add(path)
+        if not os.path.exists(path):
+            known_paths.update(storage.resolve_path(path, folder) for folder in folders_to_scan)
+    
+    # First pass: OCR every new screenshot
+    extracted = []
     for folder in folders_to_scan:
         if not os.path.exists(folder):
             logger.warning(f"Folder does not exist: {folder}")
             continue
         
-        for filename in os.listdir(folder):
-            if not _is_image_file(filename):
+        # Walk the sharded layout (ab/cd/<hash>.<ext>) of the screenshots folder;
+        # only files directly in the documents folder are picked up
+        for file_path in storage.iter_files(folder, recursive=folder == screenshots_folder):
+            if not _is_image_file(file_path):
                 continue
                 
-            file_path = os.path.join(folder, filename)
-            
             # Check if this screenshot is already in the database
-            if Screenshot.query.filter_by(path=file_path).first():
+            if file_path in known_paths:
                 continue
                 
             try:
-                # Process the new screenshot but don't save to DB yet
-                screenshot_data = process_screenshot(file_path, save_to_db=False)
-                if screenshot_data:
-                    new_screenshots.append(screenshot_data)
-                    count += 1
+                with tracing.span('file', file=os.path.basename(file_path)):
+                    extracted.append((file_path, extract_text(file_path)))
             except Exception as e:
                 logger.exception(f"Error processing screenshot {file_path}: {e}")
     
-    # Second pass: normalize scores and save to database
+    # Second pass: score all extracted text in batched NLP passes
+    with_text = [text for _, text in extracted if text.strip()]
+    with metrics.stage('nlp'):
+        features = iter(nlp_analyzer.extract_features_batch(with_text))
+    for file_path, text in extracted:
+        new_screenshots.append(_screenshot_data(file_path, text, next(features) if text.strip() else None))
+        count += 1
+    
+    # Third pass: normalize scores and save to database
     if new_screenshots:
         normalize_and_save_screenshots(new_screenshots)
     
     return count
 
+def extract_text(file_path):
+    """Extract text from a screenshot using OCR, returns "" if nothing was found"""
+    try:
+        with metrics.stage('decode'):
+            image = Image.open(file_path)
+        with metrics.stage('ocr'):
+            return pytesseract.image_to_string(image)
+    except Exception as e:
+        logger.error(f"OCR extraction failed for {file_path}: {e}")
+        metrics.FALLBACK_RECORDS.inc(reason='ocr_error')
+        return ""
+
 def process_screenshot(file_path, save_to_db=True):
     """
     Process a single screenshot file:
@@ -94,15 +122,45 @@ def process_screenshot(file_path, save_to_db=True):
     logger.debug(f"Processing screenshot: {file_path}")
     
     # Extract text using OCR
-    try:
-        image = Image.open(file_path)
-        text_content = pytesseract.image_to_string(image)
-    except Exception as e:
-        logger.error(f"OCR extraction failed for {file_path}: {e}")
-        text_content = ""
+    text_content = extract_text(file_path)
     
+    # Analyze text with NLP
+    with metrics.stage('nlp'):
+        features = nlp_analyzer.extract_features(text_content) if text_content.strip() else None
+    screenshot_data = _screenshot_data(file_path, text_content, features)
+    
+    if not save_to_db:
+        # Return the data for normalization
+        return screenshot_data
+    
+    def save():
+        # Create new screenshot record (uses the raw score when saving directly)
+        db.session.add(Screenshot(
+            filename=screenshot_data['filename'],
+            path=screenshot_data['path'],
+            text_content=screenshot_data['text_content'],
+            priority_score=screenshot_data['raw_priority_score'],
+            urgency_score=screenshot_data['urgency_score'],
+            action_score=screenshot_data['action_score'],
+            due_at=screenshot_data['due_at'],
+            features=_features_row(screenshot_data)
+        ))
+    
+    # Save to database
+    with metrics.stage('db_write'):
+        db_writer.write(save)
+    
+    logger.info(f"Processed screenshot {file_path} with priority score {screenshot_data['raw_priority_score']:.2f}")
+    return None
+
+def _screenshot_data(file_path, text_content, features):
+    """
+    Build the record data for a processed screenshot.
+    features is the feature record from the NLP analyzer, or None if no
+    text was extracted.
+    """
     # Handle empty text extraction
-    if not text_content.strip():
+    if features is None:
         logger.warning(f"No text extracted from {file_path}")
         
         # Assign a random priority score between 0.1 and 0.4 for images without text
@@ -110,63 +168,38 @@ def process_screenshot(file_path, save_to_db=True):
         import random
         random_priority = random.uniform(0.1, 0.4)
         
-        if save_to_db:
-            # Still save to database with randomly assigned moderate-low priority
-            screenshot = Screenshot(
-                filename=os.path.basename(file_path),
-                path=file_path,
-                text_content="[No text detected]",
-                priority_score=random_priority,
-                urgency_score=random_priority * 0.5,
-                action_score=random_priority * 0.5
-            )
-            db.session.add(screenshot)
-            db.session.commit()
-            return None
-        else:
-            # Return the data for normalization
-            return {
-                'filename': os.path.basename(file_path),
-                'path': file_path,
-                'text_content': "[No text detected]",
-                'raw_priority_score': random_priority,
-                'urgency_score': random_priority * 0.5,
-                'action_score': random_priority * 0.5
-            }
+        return {
+            'filename': os.path.basename(file_path),
+            'path': file_path,
+            'text_content': "[No text detected]",
+            'raw_priority_score': random_priority,
+            'urgency_score': random_priority * 0.5,
+            'action_score': random_priority * 0.5,
+            'due_at': None,
+            'features': None
+        }
     
-    # Analyze text with NLP
-    urgency_score, action_score = nlp_analyzer.analyze_text(text_content)
+    urgency_score, action_score = scoring.score_features(features)
     
     # Calculate overall priority score (simple weighted sum)
-    raw_priority_score = (urgency_score * 0.6) + (action_score * 0.4)
+    raw_priority_score = scoring.priority_score(urgency_score, action_score)
     
-    if save_to_db:
-        # Create new screenshot record
-        screenshot = Screenshot(
-            filename=os.path.basename(file_path),
-            path=file_path,
-            text_content=text_content,
-            priority_score=raw_priority_score,  # Will use raw score if saving directly
-            urgency_score=urgency_score,
-            action_score=action_score
-        )
-        
-        # Save to database
-        db.session.add(screenshot)
-        db.session.commit()
-        
-        logger.info(f"Processed screenshot {file_path} with priority score {raw_priority_score:.2f}")
+    return {
+        'filename': os.path.basename(file_path),
+        'path': file_path,
+        'text_content': text_content,
+        'raw_priority_score': raw_priority_score,
+        'urgency_score': urgency_score,
+        'action_score': action_score,
+        'due_at': features['due_at'],
+        'features': features
+    }
+
+def _features_row(screenshot_data):
+    """Feature store row for a processed screenshot, None if it had no text"""
+    if screenshot_data['features'] is None:
         return None
-    else:
-        # Return the data for normalization
-        return {
-            'filename': os.path.basename(file_path),
-            'path': file_path,
-            'text_content': text_content,
-            'raw_priority_score': raw_priority_score,
-            'urgency_score': urgency_score,
-            'action_score': action_score
-        }
+    return ScreenshotFeatures.from_features(screenshot_data['features'])
 
 def normalize_and_save_screenshots(screenshots):
     """
@@ -256,22 +289,23 @@ def normalize_and_save_screenshots(screenshots):
         normalized_scores = [max(0.1, min(0.9, score)) for score in normalized_scores]
     
     # Save normalized scores to database
-    for i, screenshot_data in enumerate(screenshots):
-        # Create new screenshot record with normalized priority score
-        screenshot = Screenshot(
-            filename=screenshot_data['filename'],
-            path=screenshot_data['path'],
-            text_content=screenshot_data['text_content'],
-            priority_score=normalized_scores[i],
-            urgency_score=screenshot_data['urgency_score'],
-            action_score=screenshot_data['action_score']
-        )
-        
-        # Save to database
-        db.session.add(screenshot)
+    def save_all():
+        for i, screenshot_data in enumerate(screenshots):
+            # Create new screenshot record with normalized priority score
+            db.session.add(Screenshot(
+                filename=screenshot_data['filename'],
+                path=screenshot_data['path'],
+                text_content=screenshot_data['text_content'],
+                priority_score=normalized_scores[i],
+                urgency_score=screenshot_data['urgency_score'],
+                action_score=screenshot_data['action_score'],
+                due_at=screenshot_data['due_at'],
+                features=_features_row(screenshot_data)
+            ))
     
     # Commit all at once for efficiency
-    db.session.commit()
+    with metrics.stage('db_write'):
+        db_writer.write(save_all)
     
     logger.info(f"Normalized and saved {len(screenshots)} screenshots to database")
 
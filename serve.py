@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Production entry point: gunicorn with preforked workers sharing the spaCy model.
+
+The master process imports the app's modules and loads the spaCy model
+before it forks, then freezes the garbage collector so those objects stay
+out of the workers' collections. Forked workers share the master's memory
+pages copy-on-write, so N workers cost one model plus their private memory
+instead of N models.
+
+The app itself is created in each worker (app.create_app() in DB mode,
+main.app in session mode), since threads and database connections do not
+survive a fork; nothing the master loads starts a thread or opens a
+connection.
+
+    python serve.py [--app db|session] [--bind 0.0.0.0:5000] [--workers N] [--threads N]
+    python serve.py --report MASTER_PID      # RSS/PSS of a running server, per process
+
+Workers and threads are tuned from the CPU count and the memory available
+to this process (cgroup limit or MemAvailable) unless given:
+
+    workers  2 * CPUs + 1, at most as many as fit in the memory left after the
+             master at SERVE_WORKER_MEMORY_MB private memory each
+    threads  enough for about 4 concurrent requests per CPU, at most 8 per worker
+
+Each worker logs its memory once it has loaded the app. The PSS (the
+worker's private memory plus its share of the pages shared with the master
+and the other workers) is the number to set SERVE_WORKER_MEMORY_MB from
+when packing more workers per node.
+
+Some state lives in each worker's memory, so these features only work
+fully with --workers 1 (or a load balancer that keeps a client on one
+worker):
+
+    upload progress     polls answered by another worker than the one that
+                        took the upload see no job (both apps)
+    change feed         polls answered by another worker resync from the
+                        snapshot instead of getting events, and deferral
+                        wake-ups reach only the scheduling worker's feed
+    metrics             /metrics reports the answering worker only
+    memory sessions     SESSION_BACKEND=memory sessions exist in one worker;
+                        session mode defaults to one worker with it
+
+Everything else is shared through the database and the SQLite session
+store, and each worker runs its own copy of the background jobs.
+"""
+
+import os
+import gc
+import math
+import argparse
+import importlib
+import logging
+
+from gunicorn.app.base import BaseApplication
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Module holding each app (see create_app in app.py and main.py)
+APP_MODULES = {'db': 'app', 'session': 'main'}
+
+# Imported in the master before forking. The app modules only define their
+# factories; main builds the session-mode app at import, so it is not preloaded
+PRELOAD_MODULES = {
+    'db': ['nlp_analyzer', 'app'],
+    'session': ['nlp_analyzer', 'app_session'],
+}
+
+# Private memory assumed per worker when tuning the worker count
+WORKER_MEMORY_MB = int(os.environ.get('SERVE_WORKER_MEMORY_MB', 250))
+
+# Concurrent requests aimed for per CPU, and the thread cap per worker
+REQUESTS_PER_CPU = 4
+MAX_THREADS = 8
+
+def _read_kb(path, fields):
+    """Values of the given 'Field: N kB' lines of a /proc file, in MB"""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in fields:
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+def available_memory_mb():
+    """Memory this process may use: the cgroup limit if there is one, else MemAvailable"""
+    try:
+        with open('/sys/fs/cgroup/memory.max') as f:
+            limit = f.read().strip()
+        if limit != 'max':
+            with open('/sys/fs/cgroup/memory.current') as f:
+                return (int(limit) - int(f.read().strip())) / (1024 * 1024)
+    except (OSError, ValueError):
+        pass
+    try:
+        return _read_kb('/proc/meminfo', {'MemAvailable'})['MemAvailable']
+    except (OSError, KeyError):
+        return None
+
+def process_memory(pid='self'):
+    """RSS, PSS and shared/private memory of a process in MB (Linux only)"""
+    fields = {'Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty'}
+    try:
+        values = _read_kb(f'/proc/{pid}/smaps_rollup', fields)
+    except OSError:
+        try:
+            return {'rss_mb': _read_kb(f'/proc/{pid}/status', {'VmRSS'})['VmRSS']}
+        except (OSError, KeyError):
+            return {}
+    return {
+        'rss_mb': values.get('Rss', 0),
+        'pss_mb': values.get('Pss', 0),
+        'shared_mb': values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0),
+        'private_mb': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+def tune(workers=None, threads=None, master_mb=0):
+    """Worker and thread counts from the CPU count and available memory"""
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = 2 * cpus + 1
+        available = available_memory_mb()
+        if available is not None:
+            workers = min(workers, int((available - master_mb) // WORKER_MEMORY_MB))
+        workers = max(1, workers)
+    if threads is None:
+        threads = max(1, min(MAX_THREADS, math.ceil(REQUESTS_PER_CPU * cpus / workers)))
+    return workers, threads
+
+def preload(mode):
+    """Import the app's modules and load the spaCy model, then freeze the GC"""
+    for name in PRELOAD_MODULES[mode]:
+        importlib.import_module(name)
+    import nlp_analyzer
+    nlp_analyzer.ensure_loaded()
+
+    # Objects that exist now are never collected in the workers, so the GC
+    # doesn't touch (and copy) the pages they share with the master
+    gc.collect()
+    gc.freeze()
+    memory = process_memory()
+    logger.info(f"Master preloaded {mode} app: {memory.get('rss_mb', 0):.0f}MB RSS, "
+                f"{gc.get_freeze_count()} objects frozen")
+    return memory
+
+def post_worker_init(worker):
+    """Log the worker's memory once it has loaded the app"""
+    memory = process_memory()
+    if 'pss_mb' in memory:
+        logger.info(f"Worker {worker.pid}: {memory['rss_mb']:.0f}MB RSS, {memory['pss_mb']:.0f}MB PSS, "
+                    f"{memory['shared_mb']:.0f}MB shared, {memory['private_mb']:.0f}MB private")
+    else:
+        logger.info(f"Worker {worker.pid}: {memory.get('rss_mb', 0):.0f}MB RSS")
+
+class Server(BaseApplication):
+    """gunicorn application loading one of the apps in each worker"""
+
+    def __init__(self, mode, options):
+        self.mode = mode
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        module = importlib.import_module(APP_MODULES[self.mode])
+        return module.create_app() if self.mode == 'db' else module.app
+
+def worker_pids(master_pid):
+    """Pids of the processes whose parent is master_pid"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # pid (comm) state ppid ..., and comm may contain spaces
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+def report(master_pid):
+    """Print the memory of a running server's master and workers"""
+    rows = [('master', master_pid)] + [('worker', pid) for pid in worker_pids(master_pid)]
+    print(f"{'process':<8} {'pid':>8} {'RSS MB':>8} {'PSS MB':>8} {'shared MB':>10} {'private MB':>11}")
+    workers = []
+    for kind, pid in rows:
+        memory = process_memory(pid)
+        if kind == 'worker':
+            workers.append(memory)
+        print(f"{kind:<8} {pid:>8} {memory.get('rss_mb', 0):>8.0f} {memory.get('pss_mb', 0):>8.0f} "
+              f"{memory.get('shared_mb', 0):>10.0f} {memory.get('private_mb', 0):>11.0f}")
+
+    if workers and all('pss_mb' in memory for memory in workers):
+        pss = sum(memory['pss_mb'] for memory in workers) / len(workers)
+        available = available_memory_mb()
+        print(f"\nMean worker PSS {pss:.0f}MB (SERVE_WORKER_MEMORY_MB={WORKER_MEMORY_MB})")
+        if available is not None:
+            print(f"{available:.0f}MB available: room for about {int(available // pss)} more workers")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the app with gunicorn, sharing the spaCy model between workers")
+    parser.add_argument('--app', choices=['db', 'session'], default=os.environ.get('SERVE_APP', 'db'),
+                        help="App to serve")
+    parser.add_argument('--bind', default=os.environ.get('SERVE_BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int, default=os.environ.get('SERVE_WORKERS'),
+                        help="Worker processes (default: tuned from CPUs and memory)")
+    parser.add_argument('--threads', type=int, default=os.environ.get('SERVE_THREADS'),
+                        help="Threads per worker (default: tuned from CPUs and workers)")
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('SERVE_TIMEOUT', 60)))
+    parser.add_argument('--report', type=int, metavar='MASTER_PID',
+                        help="Print the memory of a running server instead of starting one")
+    args = parser.parse_args()
+
+    if args.report:
+        report(args.report)
+        return
+
+    if args.workers is None and args.app == 'session' and os.environ.get('SESSION_BACKEND') == 'memory':
+        # Process-local sessions would be split between the workers
+        args.workers = 1
+
+    master = preload(args.app)
+    workers, threads = tune(args.workers, args.threads, master.get('rss_mb', 0))
+    logger.info(f"Serving {args.app} app on {args.bind} with {workers} workers x {threads} threads")
+
+    Server(args.app, {
+        'bind': args.bind,
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'post_worker_init': post_worker_init,
+        # The master already holds the preloaded modules; the app is created per worker
+        'preload_app': False,
+        'accesslog': '-',
+    }).run()
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import os
 import uuid
+import heapq
+import bisect
 import datetime
 import logging
 import shutil
@@ -9,13 +11,27 @@ from PIL import Image
 from flask import session, current_app
 from typing import List, Dict, Optional, Tuple
 import nlp_analyzer
+import scoring
+import renditions
+import temp_janitor
+import change_feed
+import deferral_scheduler
+import metrics
+import tracing
 import random
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Session keys for the screenshot state and for screenshots queued by background processing
+STATE_KEY = 'screenshot_state'
+PENDING_KEY = 'pending_screenshots'
+
 class SessionScreenshot:
-    """In-memory screenshot class for session-based storage"""
+    """In-memory screenshot record for session-based storage"""
+    __slots__ = ('id', 'filename', 'path', 'text_content', 'priority_score', 'urgency_score',
+                 'action_score', 'dismissed', 'deferred_until', 'created_at', 'updated_at')
+    
     def __init__(
         self,
         id: str,
@@ -39,6 +55,18 @@ class SessionScreenshot:
         self.created_at = datetime.datetime.utcnow()
         self.updated_at = datetime.datetime.utcnow()
     
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+    
+    @property
+    def sort_key(self) -> Tuple[float, str]:
+        """Position in the active index: highest priority first"""
+        return (-self.priority_score, self.id)
+    
     def is_active(self) -> bool:
         """
         Determines if a screenshot should be shown in the current view.
@@ -68,6 +96,172 @@ class SessionScreenshot:
             'updated_at': self.updated_at.isoformat()
         }
 
+class SessionState:
+    """
+    Indexed screenshot state for one session.
+    
+    records maps id -> SessionScreenshot. Every record not dismissed is either
+    in the active index (a list of sort keys kept ordered with bisect, so
+    listing is an ordered walk) or in the deferred min-heap keyed by
+    deferred_until. Heap entries are deleted lazily: an entry whose record was
+    dismissed or re-deferred since is skipped when it surfaces. dismissed is
+    an insertion-ordered dict used as an ordered set.
+    
+    Lookups in the active index are O(log n) binary searches, but inserting
+    into or deleting from the list shifts the entries after it, so changes
+    are O(n) memory moves (cheap ones, tens of microseconds at 100k
+    records). The state is stored whole in the session, so every request
+    that touches it also unpickles and re-pickles all n records; that O(n)
+    round trip dominates (see python -m benchmarks.session_state).
+    """
+    __slots__ = ('records', 'active', 'deferred', 'dismissed')
+    
+    def __init__(self):
+        self.records = {}
+        self.active = []
+        self.deferred = []
+        self.dismissed = {}
+    
+    def __getstate__(self):
+        return (self.records, self.active, self.deferred, self.dismissed)
+    
+    def __setstate__(self, state):
+        self.records, self.active, self.deferred, self.dismissed = state
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def add(self, screenshot: SessionScreenshot):
+        """Add a new screenshot: O(log n) search, O(n) list insertion"""
+        self.records[screenshot.id] = screenshot
+        if screenshot.dismissed:
+            self.dismissed[screenshot.id] = None
+        elif screenshot.deferred_until and screenshot.deferred_until > datetime.datetime.utcnow():
+            heapq.heappush(self.deferred, (screenshot.deferred_until, screenshot.id))
+        else:
+            bisect.insort(self.active, screenshot.sort_key)
+    
+    def _find_active(self, screenshot: SessionScreenshot) -> Optional[int]:
+        """Position of a screenshot in the active index, or None"""
+        key = screenshot.sort_key
+        i = bisect.bisect_left(self.active, key)
+        if i < len(self.active) and self.active[i] == key:
+            return i
+        return None
+    
+    def _remove_active(self, screenshot: SessionScreenshot) -> bool:
+        """Remove a screenshot from the active index if it is there"""
+        i = self._find_active(screenshot)
+        if i is None:
+            return False
+        del self.active[i]
+        return True
+    
+    def promote_due(self, now: Optional[datetime.datetime] = None) -> int:
+        """Move screenshots whose deferral has expired into the active index, returns how many"""
+        now = now or datetime.datetime.utcnow()
+        promoted = 0
+        while self.deferred and self.deferred[0][0] <= now:
+            deferred_until, screenshot_id = heapq.heappop(self.deferred)
+            screenshot = self.records.get(screenshot_id)
+            # Skip stale entries (dismissed or deferred again since, or a duplicate left by restore)
+            if screenshot is None or screenshot.dismissed or screenshot.deferred_until != deferred_until:
+                continue
+            if self._find_active(screenshot) is not None:
+                continue
+            bisect.insort(self.active, screenshot.sort_key)
+            promoted += 1
+        return promoted
+    
+    def active_screenshots(self) -> List[SessionScreenshot]:
+        """Active screenshots, highest priority first (call promote_due first)"""
+        return [self.records[screenshot_id] for _priority, screenshot_id in self.active]
+    
+    def dismissed_screenshots(self) -> List[SessionScreenshot]:
+        """Dismissed screenshots in the order they were dismissed"""
+        return [self.records[screenshot_id] for screenshot_id in self.dismissed]
+    
+    def dismiss(self, screenshot_id: str) -> bool:
+        """Dismiss an active or deferred screenshot: O(log n) search, O(n) list deletion"""
+        screenshot = self.records.get(screenshot_id)
+        if screenshot is None or screenshot.dismissed:
+            return False
+        # Deferred screenshots have no active entry; their heap entry goes stale
+        self._remove_active(screenshot)
+        screenshot.dismissed = True
+        self.dismissed[screenshot_id] = None
+        return True
+    
+    def restore(self, screenshot_id: str) -> bool:
+        """Restore a dismissed screenshot: O(log n) search, O(n) list insertion"""
+        if screenshot_id not in self.dismissed:
+            return False
+        del self.dismissed[screenshot_id]
+        screenshot = self.records[screenshot_id]
+        screenshot.dismissed = False
+        if screenshot.deferred_until and screenshot.deferred_until > datetime.datetime.utcnow():
+            heapq.heappush(self.deferred, (screenshot.deferred_until, screenshot_id))
+        else:
+            bisect.insort(self.active, screenshot.sort_key)
+        return True
+    
+    def defer(self, screenshot_id: str, until: datetime.datetime) -> bool:
+        """Defer a screenshot that isn't dismissed: O(log n) search, O(n) list deletion"""
+        screenshot = self.records.get(screenshot_id)
+        if screenshot is None or screenshot.dismissed:
+            return False
+        self._remove_active(screenshot)
+        screenshot.deferred_until = until
+        screenshot.updated_at = datetime.datetime.utcnow()
+        heapq.heappush(self.deferred, (until, screenshot_id))
+        return True
+    
+    def dismiss_all(self) -> int:
+        """Dismiss every active (not deferred) screenshot, O(k) for k active"""
+        self.promote_due()
+        for _priority, screenshot_id in self.active:
+            self.records[screenshot_id].dismissed = True
+            self.dismissed[screenshot_id] = None
+        count = len(self.active)
+        self.active = []
+        return count
+    
+    def restore_all(self) -> int:
+        """Restore every dismissed screenshot"""
+        dismissed = list(self.dismissed)
+        for screenshot_id in dismissed:
+            self.restore(screenshot_id)
+        return len(dismissed)
+    
+    def merge(self, base: Optional['SessionState'], theirs: 'SessionState') -> 'SessionState':
+        """
+        Three-way merge with the state another request saved meanwhile:
+        records this state added or changed since base win, every other
+        record is taken from theirs. Rebuilds the indexes, O(n log n).
+        """
+        base_records = base.records if base is not None else {}
+        records = dict(theirs.records)
+        for screenshot_id, screenshot in self.records.items():
+            previous = base_records.get(screenshot_id)
+            if previous is None or screenshot.__getstate__() != previous.__getstate__():
+                records[screenshot_id] = screenshot
+
+        merged = SessionState()
+        for screenshot in records.values():
+            merged.add(screenshot)
+        # Keep the order screenshots were dismissed in, theirs first
+        order = list(theirs.dismissed) + [i for i in self.dismissed if i not in theirs.dismissed]
+        merged.dismissed = {i: None for i in order if i in merged.dismissed}
+        return merged
+
+    @classmethod
+    def from_dicts(cls, active: List[Dict], dismissed: List[Dict]) -> 'SessionState':
+        """Build the state from the list-of-dicts layout older sessions used"""
+        state = cls()
+        for data in active + dismissed:
+            state.add(_dict_to_screenshot(data))
+        return state
+
 class SessionManager:
     """Manages session-based screenshot storage"""
     
@@ -84,186 +278,193 @@ class SessionManager:
         # Create temp folder if it doesn't exist
         if not os.path.exists(self.temp_folder):
             os.makedirs(self.temp_folder)
-            
-        # Register a cleanup function to run when the app terminates
-        @app.teardown_appcontext
-        def cleanup_temp_files(exception=None):
-            self._cleanup_old_files()
+        
+        # Expired temporary files are removed by a background janitor, not per request
+        ttl = app.config.get('TEMP_FILE_TTL', app.permanent_session_lifetime.total_seconds())
+        temp_janitor.start(self.temp_folder, ttl)
+        
+        # Announce deferred screenshots to the session's change feed when they are due
+        deferral_scheduler.start_sessions(app, self._load_stored_screenshot, client_dict)
     
     def _ensure_session_initialized(self):
-        """Ensure session variables are initialized"""
-        if 'screenshots' not in session:
-            session['screenshots'] = []
-        if 'dismissed_screenshots' not in session:
-            session['dismissed_screenshots'] = []
+        """Ensure the session holds a screenshot state"""
+        self._state()
+    
+    def _state(self) -> SessionState:
+        """
+        The current session's screenshot state, created on first use.
+        Screenshots queued by background processing are merged in here.
+        """
+        state = session.get(STATE_KEY)
+        if state is None:
+            # Sessions from before the indexed state kept two lists of dicts
+            state = SessionState.from_dicts(session.pop('screenshots', []), session.pop('dismissed_screenshots', []))
+            session[STATE_KEY] = state
+        
+        pending = session.pop(PENDING_KEY, None)
+        if pending:
+            for screenshot in pending:
+                state.add(screenshot)
+        return state
+    
+    def _changed(self):
+        """Mark the session as modified after changing its state in place"""
+        session.modified = True
+    
+    def _load_stored_screenshot(self, sid: str, screenshot_id: str) -> Optional[SessionScreenshot]:
+        """A screenshot as currently saved in a session's stored state (outside a request)"""
+        data, _expires_at = current_app.session_interface.backend.load(sid)
+        state = data.get(STATE_KEY) if data else None
+        return state.records.get(screenshot_id) if state is not None else None
+    
+    def _publish(self, changes: List[Tuple], sid: Optional[str] = None):
+        """Announce (op, screenshot_id, data) changes on the session's change feed"""
+        if changes:
+            change_feed.session_feed(sid or session.sid).publish_many(changes)
             
     def get_active_screenshots(self) -> List[Dict]:
-        """Get all active screenshots for the current session"""
-        self._ensure_session_initialized()
-        
-        # Convert stored dict data back to SessionScreenshot objects
-        screenshots = []
-        for screenshot_data in session.get('screenshots', []):
-            screenshot = self._dict_to_screenshot(screenshot_data)
-            if screenshot.is_active():
-                screenshots.append(screenshot.to_dict())
-                
-        # Sort by priority score, highest first
-        screenshots.sort(key=lambda x: x['priority_score'], reverse=True)
-        return screenshots
+        """Get all active screenshots for the current session, highest priority first"""
+        state = self._state()
+        if state.promote_due():
+            self._changed()
+        return [screenshot.to_dict() for screenshot in state.active_screenshots()]
     
     def get_dismissed_screenshots(self) -> List[Dict]:
         """Get all dismissed screenshots for the current session"""
-        self._ensure_session_initialized()
-        
-        dismissed = []
-        for screenshot_data in session.get('dismissed_screenshots', []):
-            screenshot = self._dict_to_screenshot(screenshot_data)
-            dismissed.append(screenshot.to_dict())
-            
-        return dismissed
+        return [screenshot.to_dict() for screenshot in self._state().dismissed_screenshots()]
     
     def dismiss_screenshot(self, screenshot_id: str) -> bool:
         """Mark a screenshot as dismissed"""
-        self._ensure_session_initialized()
-        
-        screenshots = session.get('screenshots', [])
-        for i, screenshot_data in enumerate(screenshots):
-            if screenshot_data.get('id') == screenshot_id:
-                # Remove from active list
-                screenshot_data = screenshots.pop(i)
-                # Add to dismissed list
-                session['dismissed_screenshots'] = session.get('dismissed_screenshots', []) + [screenshot_data]
-                session.modified = True
-                return True
+        if self._state().dismiss(screenshot_id):
+            self._changed()
+            self._publish([('remove', screenshot_id, None)])
+            return True
         return False
     
     def restore_screenshot(self, screenshot_id: str) -> bool:
         """Restore a dismissed screenshot"""
-        self._ensure_session_initialized()
-        
-        dismissed = session.get('dismissed_screenshots', [])
-        for i, screenshot_data in enumerate(dismissed):
-            if screenshot_data.get('id') == screenshot_id:
-                # Remove from dismissed list
-                screenshot_data = dismissed.pop(i)
-                # Set dismissed flag to False
-                screenshot_data['dismissed'] = False
-                # Add back to active list
-                session['screenshots'] = session.get('screenshots', []) + [screenshot_data]
-                session.modified = True
-                return True
+        state = self._state()
+        if state.restore(screenshot_id):
+            self._changed()
+            screenshot = state.records[screenshot_id]
+            if screenshot.is_active():
+                self._publish([('add', screenshot_id, client_dict(screenshot))])
+            return True
         return False
     
     def defer_screenshot(self, screenshot_id: str, minutes: int = 30) -> bool:
         """Defer a screenshot for later viewing"""
-        self._ensure_session_initialized()
-        
-        screenshots = session.get('screenshots', [])
-        for i, screenshot_data in enumerate(screenshots):
-            if screenshot_data.get('id') == screenshot_id:
-                # Set deferred_until time
-                deferred_time = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
-                screenshot_data['deferred_until'] = deferred_time.isoformat()
-                screenshot_data['updated_at'] = datetime.datetime.utcnow().isoformat()
-                session.modified = True
-                return True
+        deferred_time = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutes)
+        if self._state().defer(screenshot_id, deferred_time):
+            self._changed()
+            self._publish([('remove', screenshot_id, None)])
+            deferral_scheduler.scheduler().schedule(
+                session.sid, screenshot_id, deferral_scheduler.timestamp(deferred_time, utc=True)
+            )
+            return True
         return False
     
     def dismiss_all_screenshots(self) -> int:
         """Dismiss all active screenshots"""
-        self._ensure_session_initialized()
-        
-        screenshots = session.get('screenshots', [])
-        active_screenshots = []
-        dismissed_count = 0
-        
-        for screenshot_data in screenshots:
-            screenshot = self._dict_to_screenshot(screenshot_data)
-            if screenshot.is_active():
-                # Mark as dismissed
-                screenshot_data['dismissed'] = True
-                session['dismissed_screenshots'] = session.get('dismissed_screenshots', []) + [screenshot_data]
-                dismissed_count += 1
-            else:
-                active_screenshots.append(screenshot_data)
-        
-        session['screenshots'] = active_screenshots
-        session.modified = True
-        return dismissed_count
+        state = self._state()
+        state.promote_due()
+        dismissed_ids = [screenshot_id for _priority, screenshot_id in state.active]
+        count = state.dismiss_all()
+        self._changed()
+        self._publish([('remove', screenshot_id, None) for screenshot_id in dismissed_ids])
+        return count
     
     def restore_all_screenshots(self) -> int:
         """Restore all dismissed screenshots"""
-        self._ensure_session_initialized()
-        
-        dismissed = session.get('dismissed_screenshots', [])
-        count = len(dismissed)
-        
-        # Set dismissed flag to False and add to active screenshots
-        for screenshot_data in dismissed:
-            screenshot_data['dismissed'] = False
-            session['screenshots'] = session.get('screenshots', []) + [screenshot_data]
-        
-        # Clear dismissed list
-        session['dismissed_screenshots'] = []
-        session.modified = True
+        state = self._state()
+        restored = state.dismissed_screenshots()
+        count = state.restore_all()
+        self._changed()
+        self._publish([
+            ('add', screenshot.id, client_dict(screenshot)) for screenshot in restored if screenshot.is_active()
+        ])
         return count
     
     def process_uploaded_file(self, file, original_filename: str) -> Optional[Dict]:
         """Process an uploaded file and store it in the session (no permanent storage)"""
-        temp_file = None
-        try:
-            # Generate a unique ID and secure filename for temporary storage
-            screenshot_id = str(uuid.uuid4())
-            secure_name = secure_filename(original_filename)
-            
-            # Create a unique filename in our temp folder
-            unique_filename = f"{screenshot_id}_{secure_name}"
-            file_path = os.path.join(self.temp_folder, unique_filename)
-            
-            # Save the file to temp storage for processing
+        results = self.process_uploaded_files([(file, original_filename)])
+        return results[0] if results else None
+    
+    def process_uploaded_files(self, files: List[Tuple], sid: Optional[str] = None) -> List[Dict]:
+        """
+        Process a batch of (file, original_filename) uploads and store them in the session.
+        Returns the stored screenshot dicts (see process_spooled_files).
+        """
+        spooled = []
+        for file, original_filename in files:
+            try:
+                spooled.append(self.spool_upload(file, original_filename))
+            except Exception as e:
+                logger.error(f"Error saving screenshot {original_filename}: {str(e)}")
+        return self.process_spooled_files(spooled, sid)
+    
+    def spool_upload(self, file, original_filename: str) -> Tuple[str, str, str]:
+        """
+        Save an upload to temp storage without processing it
+        Returns (screenshot_id, original_filename, file_path)
+        """
+        # Generate a unique ID and secure filename for temporary storage
+        screenshot_id = str(uuid.uuid4())
+        secure_name = secure_filename(original_filename)
+        
+        # Create a unique filename in our temp folder
+        unique_filename = f"{screenshot_id}_{secure_name}"
+        file_path = os.path.join(self.temp_folder, unique_filename)
+        
+        # Save the file to temp storage for processing
+        with tracing.span('save', file=original_filename):
             file.save(file_path)
-            logger.info(f"Saved temporary file: {file_path}")
-            
-            # Extract text using OCR
+        temp_janitor.track(self.temp_folder, file_path)
+        logger.info(f"Saved temporary file: {file_path}")
+        
+        return screenshot_id, original_filename, file_path
+    
+    def process_spooled_files(self, spooled: List[Tuple], sid: Optional[str] = None) -> List[Dict]:
+        """
+        OCR and score a batch of spooled (screenshot_id, original_filename, file_path)
+        uploads and store them in the session.
+        Every file is OCRed first, then all extracted text is scored in a
+        single batched NLP pass. Returns the stored screenshot dicts.
+        Outside a request, pass the session id: the results are then queued in
+        the session store and merged into that session on its next request.
+        """
+        extracted = []
+        for screenshot_id, original_filename, file_path in spooled:
             try:
-                # Open and potentially resize the image for OCR
-                image = Image.open(file_path)
-                logger.info(f"Successfully opened image: {file_path} (size: {image.width}x{image.height})")
-                
-                # Resize large images to prevent timeouts
-                max_size = (1500, 1500)
-                if image.width > max_size[0] or image.height > max_size[1]:
-                    image.thumbnail(max_size, Image.LANCZOS)
-                    # Save the resized version
-                    image.save(file_path)
-                    logger.info(f"Resized large image to prevent timeout: {file_path}")
-                image.close()
-                
-                # Extract text with OCR
-                custom_config = r'--oem 3 --psm 6 -l eng'
-                text = pytesseract.image_to_string(Image.open(file_path), config=custom_config)
-            except Exception as ocr_error:
-                logger.error(f"OCR failed for {file_path}: {str(ocr_error)}")
-                text = "[No text detected]"
-            
-            # Analyze text with NLP to determine priority
-            if text and text.strip():
-                try:
-                    urgency_score, action_score = nlp_analyzer.analyze_text(text)
-                except Exception as nlp_error:
-                    logger.error(f"NLP analysis failed: {str(nlp_error)}")
-                    # Fallback to random scores if NLP fails
-                    urgency_score = random.uniform(0.3, 0.5)
-                    action_score = random.uniform(0.3, 0.5)
+                with tracing.span('file', file=original_filename):
+                    extracted.append((screenshot_id, original_filename, file_path, self._extract_text(file_path)))
+            except Exception as e:
+                logger.error(f"Error processing screenshot: {str(e)}")
+        
+        # Analyze text with NLP to determine priority, one batch for all files
+        with_text = [item for item in extracted if item[3] and item[3].strip()]
+        try:
+            with metrics.stage('nlp'):
+                scores = nlp_analyzer.analyze_texts([item[3] for item in with_text])
+        except Exception as nlp_error:
+            logger.error(f"NLP analysis failed: {str(nlp_error)}")
+            # Fallback to random scores if NLP fails
+            scores = [(random.uniform(0.3, 0.5), random.uniform(0.3, 0.5)) for _ in with_text]
+            metrics.FALLBACK_RECORDS.inc(len(with_text), reason='nlp_error')
+        scores_by_id = {item[0]: score for item, score in zip(with_text, scores)}
+        
+        screenshots = []
+        for screenshot_id, original_filename, file_path, text in extracted:
+            if screenshot_id in scores_by_id:
+                urgency_score, action_score = scores_by_id[screenshot_id]
             else:
                 # Assign moderate-low scores for images without text
                 urgency_score = random.uniform(0.2, 0.4)
                 action_score = random.uniform(0.2, 0.4)
                 text = "[No text detected]"
             
-            # Calculate priority score (60% urgency, 40% action)
-            priority_score = (urgency_score * 0.6) + (action_score * 0.4)
+            # Calculate priority score (60% urgency, 40% action by default)
+            priority_score = scoring.priority_score(urgency_score, action_score)
             
             # Create a new screenshot object
             screenshot = SessionScreenshot(
@@ -276,111 +477,78 @@ class SessionManager:
                 action_score=action_score,
                 dismissed=False
             )
-            
-            # Store in session (not in database)
-            self._ensure_session_initialized()
-            session['screenshots'] = session.get('screenshots', []) + [screenshot.to_dict()]
-            session.modified = True
-            
+            screenshots.append(screenshot)
             logger.info(f"Processed uploaded screenshot with priority score {priority_score:.2f}")
-            return screenshot.to_dict()
-            
-        except Exception as e:
-            logger.error(f"Error processing screenshot: {str(e)}")
-            return None
-    
-    def _dict_to_screenshot(self, data: Dict) -> SessionScreenshot:
-        """Convert dictionary data to SessionScreenshot object"""
-        screenshot = SessionScreenshot(
-            id=data.get('id'),
-            filename=data.get('filename'),
-            path=data.get('path'),
-            text_content=data.get('text_content'),
-            priority_score=data.get('priority_score', 0.0),
-            urgency_score=data.get('urgency_score', 0.0),
-            action_score=data.get('action_score', 0.0),
-            dismissed=data.get('dismissed', False)
-        )
         
-        # Convert ISO format strings back to datetime objects if they exist
-        if data.get('deferred_until'):
-            try:
-                screenshot.deferred_until = datetime.datetime.fromisoformat(data.get('deferred_until'))
-            except:
-                pass
-                
-        if data.get('created_at'):
+        if screenshots:
             try:
-                screenshot.created_at = datetime.datetime.fromisoformat(data.get('created_at'))
-            except:
-                pass
-                
-        if data.get('updated_at'):
-            try:
-                screenshot.updated_at = datetime.datetime.fromisoformat(data.get('updated_at'))
-            except:
-                pass
-        
-        return screenshot
-    
-    def _cleanup_old_files(self):
-        """Clean up old temporary files when session ends"""
-        # Only remove files based on age, not session data
-        # This avoids the "outside request context" error
-        if os.path.exists(self.temp_folder):
-            # Remove any expired files (older than 8 hours)
-            current_time = datetime.datetime.utcnow()
+                with metrics.stage('db_write'):
+                    if sid is not None:
+                        # Background processing: hand the results to the session store
+                        current_app.session_interface.append_pending(current_app, sid, PENDING_KEY, screenshots)
+                    else:
+                        # Store in session (not in database)
+                        state = self._state()
+                        for screenshot in screenshots:
+                            state.add(screenshot)
+                        self._changed()
+            except Exception as e:
+                logger.error(f"Error storing screenshots in session: {str(e)}")
+                return []
             try:
-                # Check for files older than 8 hours
-                file_list = os.listdir(self.temp_folder)
-                for filename in file_list:
-                    file_path = os.path.join(self.temp_folder, filename)
-                    try:
-                        if not os.path.isfile(file_path):
-                            continue
-                            
-                        file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-                        # If file is older than 8 hours, remove it
-                        if (current_time - file_mtime).total_seconds() > 8 * 3600:
-                            os.remove(file_path)
-                            logger.info(f"Removed expired temporary file: {file_path}")
-                    except Exception as single_file_error:
-                        # Skip this file if there's an error
-                        logger.warning(f"Error processing file {file_path}: {str(single_file_error)}")
-                        continue
+                self._publish([('add', screenshot.id, client_dict(screenshot)) for screenshot in screenshots], sid)
             except Exception as e:
-                logger.error(f"Error cleaning up expired files: {str(e)}")
+                # The screenshots are stored; clients pick them up on their next resync
+                logger.error(f"Error announcing stored screenshots: {str(e)}")
+            
+            if sid is not None:
+                # Build carousel renditions in the upload job, so the first view doesn't wait on them
+                for screenshot in screenshots:
+                    with metrics.stage('renditions'):
+                        renditions.generate_renditions(screenshot.path)
+        
+        return [screenshot.to_dict() for screenshot in screenshots]
+    
+    def _extract_text(self, file_path: str) -> str:
+        """OCR a spooled upload, downscaling large images first"""
+        # Extract text using OCR
+        try:
+            # Open and potentially resize the image for OCR
+            with metrics.stage('decode'):
+                image = Image.open(file_path)
+            logger.info(f"Successfully opened image: {file_path} (size: {image.width}x{image.height})")
+            
+            # Resize large images to prevent timeouts (in memory only, the
+            # spooled file is served as immutable under /temp_uploads)
+            max_size = (1500, 1500)
+            if image.width > max_size[0] or image.height > max_size[1]:
+                with metrics.stage('resize'):
+                    image.thumbnail(max_size, Image.LANCZOS)
+                logger.info(f"Resized large image to prevent timeout: {file_path}")
+            
+            # Extract text with OCR
+            custom_config = r'--oem 3 --psm 6 -l eng'
+            with image, metrics.stage('ocr'):
+                text = pytesseract.image_to_string(image, config=custom_config)
+        except Exception as ocr_error:
+            logger.error(f"OCR failed for {file_path}: {str(ocr_error)}")
+            metrics.FALLBACK_RECORDS.inc(reason='ocr_error')
+            text = "[No text detected]"
+        
+        return text
     
     def cleanup_session(self):
         """Clean up all files associated with the current session"""
         logger.info("Cleanup session method called")
         
         try:
-            # Check if the session variables exist
-            logger.info(f"Session variables: 'screenshots' in session: {'screenshots' in session}, 'dismissed_screenshots' in session: {'dismissed_screenshots' in session}")
-            
             # Get all file paths in the session
-            paths_to_remove = []
-            
-            # Add paths from active screenshots
-            active_count = 0
-            if 'screenshots' in session:
-                active_count = len(session.get('screenshots', []))
-                logger.info(f"Found {active_count} active screenshots")
-                for i, screenshot in enumerate(session.get('screenshots', [])):
-                    logger.info(f"Processing active screenshot {i+1}/{active_count}")
-                    if screenshot.get('path') and os.path.exists(screenshot.get('path')):
-                        paths_to_remove.append(screenshot.get('path'))
-            
-            # Add paths from dismissed screenshots
-            dismissed_count = 0
-            if 'dismissed_screenshots' in session:
-                dismissed_count = len(session.get('dismissed_screenshots', []))
-                logger.info(f"Found {dismissed_count} dismissed screenshots")
-                for i, screenshot in enumerate(session.get('dismissed_screenshots', [])):
-                    logger.info(f"Processing dismissed screenshot {i+1}/{dismissed_count}")
-                    if screenshot.get('path') and os.path.exists(screenshot.get('path')):
-                        paths_to_remove.append(screenshot.get('path'))
+            state = self._state()
+            logger.info(f"Found {len(state)} screenshots in the session")
+            paths_to_remove = [
+                screenshot.path for screenshot in state.records.values()
+                if screenshot.path and os.path.exists(screenshot.path)
+            ]
             
             # Log the total number of files to remove
             logger.info(f"Found {len(paths_to_remove)} files to remove")
@@ -398,9 +566,7 @@ class SessionManager:
             
             # Clear session data
             logger.info("Clearing session data")
-            session['screenshots'] = []
-            session['dismissed_screenshots'] = []
-            session.modified = True
+            session[STATE_KEY] = SessionState()
             
             logger.info(f"Manually cleaned up {files_removed} files for the current session")
             return True
@@ -411,6 +577,48 @@ class SessionManager:
             logger.error(traceback.format_exc())
             raise  # Re-raise the exception so the API endpoint knows it failed
 
+def client_dict(screenshot: SessionScreenshot) -> Dict:
+    """Screenshot dict for the carousel, pointing at downscaled renditions"""
+    data = screenshot.to_dict()
+    urls = renditions.rendition_urls(screenshot.path)
+    data['thumbnail_url'] = urls.get('thumb')
+    data['preview_url'] = urls.get('preview')
+    return data
+
+def _dict_to_screenshot(data: Dict) -> SessionScreenshot:
+    """Convert dictionary data to SessionScreenshot object"""
+    screenshot = SessionScreenshot(
+        id=data.get('id'),
+        filename=data.get('filename'),
+        path=data.get('path'),
+        text_content=data.get('text_content'),
+        priority_score=data.get('priority_score', 0.0),
+        urgency_score=data.get('urgency_score', 0.0),
+        action_score=data.get('action_score', 0.0),
+        dismissed=data.get('dismissed', False)
+    )
+    
+    # Convert ISO format strings back to datetime objects if they exist
+    if data.get('deferred_until'):
+        try:
+            screenshot.deferred_until = datetime.datetime.fromisoformat(data.get('deferred_until'))
+        except:
+            pass
+            
+    if data.get('created_at'):
+        try:
+            screenshot.created_at = datetime.datetime.fromisoformat(data.get('created_at'))
+        except:
+            pass
+            
+    if data.get('updated_at'):
+        try:
+            screenshot.updated_at = datetime.datetime.fromisoformat(data.get('updated_at'))
+        except:
+            pass
+    
+    return screenshot
+
 # Helper function for secured filenames
 def secure_filename(filename):
     """Return a secure version of the filename"""
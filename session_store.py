@@ -0,0 +1,399 @@
+"""
+Server-side session storage for session mode.
+
+The default Flask session is a signed cookie, so every screenshot's OCR text
+was serialized into it and sent with every request until it hit the 4KB
+cookie limit. ServerSessionInterface keeps session data in a backend (an
+SQLite file shared by all worker processes, or process-local memory) and
+only puts a random session id in the cookie, so request size stays constant.
+
+Data expires PERMANENT_SESSION_LIFETIME after it was last saved. Work that
+finishes outside a request (background upload processing) cannot write the
+session directly without racing the user's requests, so it queues items with
+append_pending(); they are merged into the session on its next request and
+only leave the queue when a session containing them is saved.
+
+Concurrent requests for one session each load their own copy, so saving is a
+compare-and-swap on a per-session version. A request whose copy is stale
+merges its changes into the newer stored data (merge_sessions) and retries,
+instead of overwriting what the other request saved.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import secrets
+import itertools
+import threading
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Purge expired sessions after this many saves
+PURGE_EVERY = 200
+
+# Give up saving a session after losing this many version races in a row
+SAVE_ATTEMPTS = 5
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that tracks modification and carries its session id"""
+
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None, version=0, base=None, sid_only=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        # Only the id was read from the cookie: no data is loaded and nothing is saved
+        self.sid_only = sid_only
+        self.expires_at = expires_at
+        # Stored version and pickled data this copy was loaded from, for the save-time merge
+        self.version = version
+        self.base = base
+        # Id of the last queued pending row merged in; saving removes rows up to it
+        self.pending_upto = 0
+        self.modified = False
+
+def _dumps(data):
+    return pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+
+def merge_sessions(base, ours, theirs):
+    """
+    Three-way merge of session data: apply the keys this request changed
+    since base over theirs (the data another request saved meanwhile).
+    Values with a merge(base, theirs) method, such as the screenshot state,
+    are merged record by record; other changed values replace theirs.
+    """
+    merged = dict(theirs)
+    for key in base.keys() - ours.keys():
+        merged.pop(key, None)
+    for key, value in ours.items():
+        if key in base and _dumps(value) == _dumps(base[key]):
+            continue
+        merge = getattr(value, 'merge', None)
+        if merge is not None and key in theirs:
+            merged[key] = merge(base.get(key), theirs[key])
+        else:
+            merged[key] = value
+    return merged
+
+class MemoryBackend:
+    """Process-local session storage, for single-process deployments and development"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}  # sid -> (expires_at, version, pickled data)
+        self._pending = {}  # sid -> [(id, expires_at, key, items)]
+        self._pending_ids = itertools.count(1)
+        self._saves = 0
+
+    def load(self, sid):
+        """Return (data, expires_at) for a live session, or (None, None)"""
+        blob, expires_at, _version = self.load_blob(sid)
+        if blob is None:
+            return None, None
+        return pickle.loads(blob), expires_at
+
+    def load_blob(self, sid):
+        """
+        Return (pickled data, expires_at, version). The data is None if there is
+        no live session; the version is that of any stored row, expired or not.
+        """
+        with self._lock:
+            entry = self._sessions.get(sid)
+        if entry is None:
+            return None, None, 0
+        if entry[0] < time.time():
+            return None, None, entry[1]
+        return entry[2], entry[0], entry[1]
+
+    def save(self, sid, data, expires_at, version=None, pending_upto=0):
+        """
+        Store data if the stored version is still version (None saves
+        unconditionally) and drop pending items up to pending_upto.
+        Returns False if another save got there first.
+        """
+        blob = _dumps(data)
+        with self._lock:
+            entry = self._sessions.get(sid)
+            current = entry[1] if entry is not None else 0
+            if version is not None and current != version:
+                return False
+            self._sessions[sid] = (expires_at, current + 1, blob)
+            if pending_upto:
+                self._drop_pending(sid, pending_upto)
+            self._saves += 1
+            if self._saves % PURGE_EVERY == 0:
+                self._purge()
+        return True
+
+    def touch(self, sid, expires_at):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is not None:
+                self._sessions[sid] = (expires_at, entry[1], entry[2])
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+            self._pending.pop(sid, None)
+
+    def append_pending(self, sid, key, items, expires_at):
+        with self._lock:
+            self._pending.setdefault(sid, []).append((next(self._pending_ids), expires_at, key, list(items)))
+
+    def peek_pending(self, sid):
+        """Live pending items as [(id, key, items)], oldest first, left queued"""
+        with self._lock:
+            entries = list(self._pending.get(sid, []))
+        now = time.time()
+        return [(pending_id, key, items) for pending_id, expires_at, key, items in entries if expires_at >= now]
+
+    def _drop_pending(self, sid, upto):
+        """Remove pending items with ids up to upto (lock held)"""
+        entries = [entry for entry in self._pending.get(sid, []) if entry[0] > upto]
+        if entries:
+            self._pending[sid] = entries
+        else:
+            self._pending.pop(sid, None)
+
+    def _purge(self):
+        """Drop expired sessions and pending items (lock held)"""
+        now = time.time()
+        for sid in [sid for sid, entry in self._sessions.items() if entry[0] < now]:
+            del self._sessions[sid]
+        for sid in [sid for sid, entries in self._pending.items() if all(e[1] < now for e in entries)]:
+            del self._pending[sid]
+
+class SQLiteBackend:
+    """
+    Session storage in an SQLite file, shared by every worker process.
+    Each thread keeps its own connection; WAL mode lets readers proceed
+    while a session is being written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._saves = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        conn = self._connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS sessions '
+                         '(sid TEXT PRIMARY KEY, expires_at REAL NOT NULL, data BLOB NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS session_pending '
+                         '(id INTEGER PRIMARY KEY AUTOINCREMENT, sid TEXT NOT NULL, expires_at REAL NOT NULL, '
+                         'key TEXT NOT NULL, data BLOB NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_session_pending_sid ON session_pending (sid)')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(sessions)')}
+            if 'version' not in columns:
+                # Session files from before versioned saves
+                conn.execute('ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        """Return (data, expires_at) for a live session, or (None, None)"""
+        blob, expires_at, _version = self.load_blob(sid)
+        if blob is None:
+            return None, None
+        return pickle.loads(blob), expires_at
+
+    def load_blob(self, sid):
+        """
+        Return (pickled data, expires_at, version). The data is None if there is
+        no live session; the version is that of any stored row, expired or not.
+        """
+        row = self._connect().execute(
+            'SELECT data, expires_at, version FROM sessions WHERE sid = ?', (sid,)
+        ).fetchone()
+        if row is None:
+            return None, None, 0
+        if row[1] < time.time():
+            return None, None, row[2]
+        return row[0], row[1], row[2]
+
+    def save(self, sid, data, expires_at, version=None, pending_upto=0):
+        """
+        Store data if the stored version is still version (None saves
+        unconditionally) and drop pending items up to pending_upto, in one
+        transaction. Returns False if another save got there first.
+        """
+        blob = _dumps(data)
+        conn = self._connect()
+        # Take the write lock before reading the version, so the check and the write are atomic
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT version FROM sessions WHERE sid = ?', (sid,)).fetchone()
+            current = row[0] if row is not None else 0
+            if version is not None and current != version:
+                conn.rollback()
+                return False
+            conn.execute('INSERT OR REPLACE INTO sessions (sid, expires_at, version, data) VALUES (?, ?, ?, ?)',
+                         (sid, expires_at, current + 1, blob))
+            if pending_upto:
+                conn.execute('DELETE FROM session_pending WHERE sid = ? AND id <= ?', (sid, pending_upto))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self._saves += 1
+        if self._saves % PURGE_EVERY == 0:
+            self._purge()
+
+    def touch(self, sid, expires_at):
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (expires_at, sid))
+
+    def delete(self, sid):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+            conn.execute('DELETE FROM session_pending WHERE sid = ?', (sid,))
+
+    def append_pending(self, sid, key, items, expires_at):
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT INTO session_pending (sid, expires_at, key, data) VALUES (?, ?, ?, ?)',
+                         (sid, expires_at, key, _dumps(list(items))))
+
+    def peek_pending(self, sid):
+        """Live pending items as [(id, key, items)], oldest first, left queued"""
+        rows = self._connect().execute(
+            'SELECT id, key, data FROM session_pending WHERE sid = ? AND expires_at >= ? ORDER BY id',
+            (sid, time.time())
+        ).fetchall()
+        return [(pending_id, key, pickle.loads(data)) for pending_id, key, data in rows]
+
+    def _purge(self):
+        """Delete expired sessions and pending items"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute('DELETE FROM sessions WHERE expires_at < ?', (now,))
+                conn.execute('DELETE FROM session_pending WHERE expires_at < ?', (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not purge expired sessions: {str(e)}")
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing session data server-side, keyed by a session id cookie"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.sid_only_paths = set()
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if request.path in self.sid_only_paths:
+            return ServerSession(sid=sid, sid_only=True)
+        if sid:
+            blob, expires_at, version = self.backend.load_blob(sid)
+            if blob is not None:
+                session = ServerSession(pickle.loads(blob), sid=sid, expires_at=expires_at,
+                                        version=version, base=blob)
+                self._merge_pending(session)
+                return session
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def _merge_pending(self, session):
+        """
+        Fold items queued outside a request into the session. They stay queued
+        until a save that includes them, so merging alone doesn't mark the
+        session modified: a request that changes nothing never writes it back.
+        """
+        for pending_id, key, items in self.backend.peek_pending(session.sid):
+            session[key] = session.get(key, []) + items
+            session.pending_upto = pending_id
+        session.modified = False
+
+    def _save(self, session, expires_at):
+        """Save the session, merging in whatever other requests saved since it was loaded"""
+        data, version, base = dict(session), session.version, session.base
+        for _attempt in range(SAVE_ATTEMPTS):
+            if self.backend.save(session.sid, data, expires_at, version, session.pending_upto):
+                return
+            blob, _expires_at, version = self.backend.load_blob(session.sid)
+            theirs = pickle.loads(blob) if blob is not None else {}
+            data = merge_sessions(pickle.loads(base) if base is not None else {}, data, theirs)
+            base = blob
+        logger.error(f"Could not save session after {SAVE_ATTEMPTS} conflicting saves, changes lost")
+
+    def save_session(self, app, session, response):
+        if session.sid_only:
+            return
+
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        # An emptied session is deleted along with its cookie
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        expires_at = time.time() + self._lifetime(app)
+        if session.modified or session.new:
+            self._save(session, expires_at)
+        elif session.expires_at is not None and session.expires_at - time.time() < self._lifetime(app) / 2:
+            # Sliding expiry without rewriting the data on every request
+            self.backend.touch(session.sid, expires_at)
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+    def append_pending(self, app, sid, key, items):
+        """Queue items to be appended to session[key] on the session's next request"""
+        self.backend.append_pending(sid, key, items, time.time() + self._lifetime(app))
+
+def sid_only(app, path):
+    """
+    Requests to path only need the session id (long-polls keyed by it), so
+    their session is neither loaded nor saved; session.sid is None without
+    a cookie. Call after init_app.
+    """
+    app.session_interface.sid_only_paths.add(path)
+
+def init_app(app):
+    """Replace the app's cookie session with the configured server-side store"""
+    app.config.setdefault('SESSION_BACKEND', os.environ.get('SESSION_BACKEND', 'sqlite'))
+    app.config.setdefault('SESSION_SQLITE_PATH', os.environ.get('SESSION_SQLITE_PATH', 'instance/sessions.db'))
+
+    if isinstance(app.session_interface, ServerSessionInterface):
+        return
+
+    if app.config['SESSION_BACKEND'] == 'memory':
+        backend = MemoryBackend()
+    else:
+        backend = SQLiteBackend(app.config['SESSION_SQLITE_PATH'])
+
+    app.session_interface = ServerSessionInterface(backend)
+    logger.info(f"Using server-side {app.config['SESSION_BACKEND']} session store")
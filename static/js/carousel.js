@@ -11,6 +11,10 @@ document.addEventListener('DOMContentLoaded', function() {
     let hasShownOnboardingHint = false;
     // Action history for undo functionality
     let actionHistory = [];
+    // Change feed position: server epoch and last sequence number applied
+    let feedEpoch = null;
+    let feedSeq = 0;
+    let feedGeneration = 0;
 
     // Elements
     const carousel = document.getElementById('screenshot-carousel');
@@ -67,10 +71,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     console.log('Restore response:', data);
                     if (data.success) {
                         showMiniToast(`Restored ${data.count} screenshots`);
-                        // Reload screenshots with a short delay
-                        setTimeout(() => {
-                            loadScreenshots();
-                        }, 500);
+                        // The restored screenshots arrive through the change feed
                     } else {
                         showErrorMessage(data.message || 'Error restoring screenshots');
                     }
@@ -298,7 +299,7 @@ document.addEventListener('DOMContentLoaded', function() {
                                 // Show success message
                                 showMiniToast('Processing complete');
                                 
-                                console.log('Upload processing complete, reloading screenshots');
+                                console.log('Upload processing complete');
                                 // Hide loading indicator
                                 isLoading = false;
                                 hideLoadingIndicator();
@@ -308,11 +309,7 @@ document.addEventListener('DOMContentLoaded', function() {
                                     progressContainer.remove();
                                 }, 2000);
                                 
-                                // Load screenshots with a small delay to ensure DB processing is complete
-                                setTimeout(() => {
-                                    loadScreenshots();
-                                    console.log('Triggered loadScreenshots() after upload completion');
-                                }, 1000);
+                                // New screenshots were added to the carousel by the change feed as they were saved
                             }
                         })
                         .catch(error => {
@@ -366,15 +363,15 @@ document.addEventListener('DOMContentLoaded', function() {
         isLoading = true;
         showLoadingIndicator();
         
-        fetch('/api/screenshots')
+        fetch('/api/changes/snapshot')
             .then(response => {
                 console.log('API response status:', response.status);
                 return response.json();
             })
             .then(data => {
-                console.log('Received screenshots:', data.length);
+                console.log('Received screenshots:', data.screenshots.length);
                 
-                screenshots = data.filter(screenshot => {
+                screenshots = data.screenshots.filter(screenshot => {
                     // Filter out deferred screenshots
                     if (screenshot.deferred_until) {
                         const deferredUntil = new Date(screenshot.deferred_until);
@@ -391,6 +388,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 isLoading = false;
                 hideLoadingIndicator();
                 updateCounter();
+                
+                // Follow changes from the sequence number this list reflects
+                startChangeFeed(data.epoch, data.seq);
             })
             .catch(error => {
                 console.error('Error loading screenshots:', error);
@@ -400,6 +400,135 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    function startChangeFeed(epoch, seq) {
+        feedEpoch = epoch;
+        feedSeq = seq;
+        // Any poll loop started before this one stops when its request returns
+        feedGeneration++;
+        pollChanges(feedGeneration);
+    }
+
+    function pollChanges(generation) {
+        fetch(`/api/changes?since=${feedSeq}&epoch=${feedEpoch}`)
+            .then(response => response.json())
+            .then(data => {
+                if (generation !== feedGeneration) return;
+                
+                if (data.resync) {
+                    // Changes were missed (or the server restarted): reload the queue once
+                    console.log('Change feed out of sync, reloading screenshots');
+                    setTimeout(loadScreenshots, 1000);
+                    return;
+                }
+                
+                feedSeq = data.seq;
+                if (applyChanges(data.events)) {
+                    setTimeout(loadScreenshots, 0);
+                    return;
+                }
+                pollChanges(generation);
+            })
+            .catch(error => {
+                console.error('Error polling for changes:', error);
+                if (generation === feedGeneration) {
+                    setTimeout(() => pollChanges(generation), 5000);
+                }
+            });
+    }
+
+    /**
+     * Apply change feed events to the local queue and the carousel in place.
+     * Returns true if the server asked for a full reload instead.
+     */
+    function applyChanges(events) {
+        let needsResync = false;
+        const wasEmpty = screenshots.length === 0;
+        
+        events.forEach(event => {
+            if (event.op === 'resync') {
+                needsResync = true;
+                return;
+            }
+            
+            const index = screenshots.findIndex(s => String(s.id) === String(event.id));
+            if (event.op === 'add' || event.op === 'update') {
+                if (index >= 0) {
+                    Object.assign(screenshots[index], event.screenshot);
+                    updateCarouselItem(screenshots[index]);
+                } else if (event.op === 'add') {
+                    insertScreenshot(event.screenshot, wasEmpty);
+                }
+            } else if (event.op === 'remove') {
+                if (index >= 0) {
+                    screenshots.splice(index, 1);
+                }
+                // Our own actions already dropped the item from the list, but not from the carousel
+                removeCarouselItem(event.id);
+            }
+        });
+        
+        if (needsResync) return true;
+        
+        // Switching between an empty and a non-empty queue changes the whole view
+        if (wasEmpty !== (screenshots.length === 0)) {
+            renderScreenshots();
+        }
+        updateCounter();
+        return false;
+    }
+
+    function findCarouselItem(screenshotId) {
+        return carouselInner.querySelector(`.carousel-item[data-id="${CSS.escape(String(screenshotId))}"]`);
+    }
+
+    function insertScreenshot(screenshot, wasEmpty) {
+        // Keep the queue in priority order
+        let position = screenshots.findIndex(s => s.priority_score < screenshot.priority_score);
+        if (position < 0) position = screenshots.length;
+        screenshots.splice(position, 0, screenshot);
+        
+        // An empty carousel is rendered from scratch once all events are applied
+        if (wasEmpty) return;
+        
+        const item = createCarouselItem(screenshot, position);
+        // The slide on screen stays active
+        item.classList.remove('active');
+        const items = carouselInner.querySelectorAll('.carousel-item');
+        carouselInner.insertBefore(item, items[position] || null);
+    }
+
+    function updateCarouselItem(screenshot) {
+        const item = findCarouselItem(screenshot.id);
+        if (!item) return;
+        
+        const badge = item.querySelector('.badge');
+        badge.className = `badge ${priorityBadgeClass(screenshot.priority_score)}`;
+        badge.textContent = `Priority: ${screenshot.priority_score.toFixed(2)}`;
+    }
+
+    function removeCarouselItem(screenshotId) {
+        const item = findCarouselItem(screenshotId);
+        if (!item) return;
+        
+        // Keep a slide visible when the one on screen goes away
+        if (item.classList.contains('active')) {
+            const next = item.nextElementSibling || carouselInner.firstElementChild;
+            if (next && next !== item) {
+                next.classList.add('active');
+            }
+        }
+        item.remove();
+    }
+
+    function priorityBadgeClass(priorityScore) {
+        if (priorityScore > 0.7) {
+            return 'bg-danger';
+        } else if (priorityScore > 0.4) {
+            return 'bg-warning text-dark';
+        }
+        return 'bg-info';
+    }
+
     function renderScreenshots() {
         console.log('renderScreenshots called');
         // Clear existing screenshots
@@ -511,86 +640,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Add each screenshot to the carousel
         screenshots.forEach((screenshot, index) => {
-            const item = document.createElement('div');
-            item.classList.add('carousel-item');
-            if (index === 0) {
-                item.classList.add('active');
-            }
-            
-            item.dataset.id = screenshot.id;
-            
-            // Format date
-            const createdDate = new Date(screenshot.created_at);
-            const formattedDate = createdDate.toLocaleDateString() + ' ' + 
-                                createdDate.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
-            
-            // Calculate priority class
-            let priorityClass = 'bg-info';
-            if (screenshot.priority_score > 0.7) {
-                priorityClass = 'bg-danger';
-            } else if (screenshot.priority_score > 0.4) {
-                priorityClass = 'bg-warning text-dark';
-            }
-            
-            // Create content
-            item.innerHTML = `
-                <div class="screenshot-card">
-                    <div class="screenshot-info mb-3">
-                        <div>
-                            <span class="badge ${priorityClass}">Priority: ${screenshot.priority_score.toFixed(2)}</span>
-                            <small class="text-muted ms-2">${formattedDate}</small>
-                        </div>
-                        <span class="screenshot-filename">${screenshot.filename}</span>
-                    </div>
-                    <div class="screenshot-image-container large">
-                        <img src="/${screenshot.path}" class="screenshot-image" alt="${screenshot.filename}" style="width: auto; max-width: 100%;">
-                    </div>
-                    <div class="text-details-toggle mt-2">
-                        <button class="btn btn-sm btn-light text-toggle-btn" type="button">
-                            <i data-feather="chevron-down" class="text-icon"></i> 
-                            <span>Show extracted text</span>
-                        </button>
-                    </div>
-                    <div class="screenshot-text collapse">
-                        <div class="d-flex justify-content-between align-items-center mb-2 pt-2">
-                            <h5 class="mb-0">Extracted Text:</h5>
-                            <small class="text-muted">Scroll to view more</small>
-                        </div>
-                        <div class="text-content">${screenshot.text_content || 'No text extracted'}</div>
-                    </div>
-                </div>
-            `;
-            
-            // Add event listener to the text toggle button after the item is added to the DOM
-            setTimeout(() => {
-                const toggleBtn = item.querySelector('.text-toggle-btn');
-                const textSection = item.querySelector('.screenshot-text');
-                const toggleIcon = item.querySelector('.text-icon');
-                const toggleText = toggleBtn.querySelector('span');
-                
-                toggleBtn.addEventListener('click', function() {
-                    const isCollapsed = textSection.classList.contains('collapse');
-                    
-                    if (isCollapsed) {
-                        // Show section
-                        textSection.classList.remove('collapse');
-                        textSection.classList.add('show');
-                        toggleIcon.setAttribute('data-feather', 'chevron-up');
-                        toggleText.textContent = 'Hide extracted text';
-                    } else {
-                        // Hide section 
-                        textSection.classList.add('collapse');
-                        textSection.classList.remove('show');
-                        toggleIcon.setAttribute('data-feather', 'chevron-down');
-                        toggleText.textContent = 'Show extracted text';
-                    }
-                    
-                    // Re-initialize feather icons
-                    feather.replace();
-                });
-            }, 0);
-            
-            carouselInner.appendChild(item);
+            carouselInner.appendChild(createCarouselItem(screenshot, index));
         });
         
         // Initialize the Bootstrap carousel
@@ -601,6 +651,84 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    function createCarouselItem(screenshot, index) {
+        const item = document.createElement('div');
+        item.classList.add('carousel-item');
+        if (index === 0) {
+            item.classList.add('active');
+        }
+        
+        item.dataset.id = screenshot.id;
+        
+        // Format date
+        const createdDate = new Date(screenshot.created_at);
+        const formattedDate = createdDate.toLocaleDateString() + ' ' + 
+                            createdDate.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+        
+        // Calculate priority class
+        const priorityClass = priorityBadgeClass(screenshot.priority_score);
+        
+        // Create content
+        item.innerHTML = `
+            <div class="screenshot-card">
+                <div class="screenshot-info mb-3">
+                    <div>
+                        <span class="badge ${priorityClass}">Priority: ${screenshot.priority_score.toFixed(2)}</span>
+                        <small class="text-muted ms-2">${formattedDate}</small>
+                    </div>
+                    <span class="screenshot-filename">${screenshot.filename}</span>
+                </div>
+                <div class="screenshot-image-container large">
+                    <img src="${screenshot.preview_url || '/' + screenshot.path}" class="screenshot-image" alt="${screenshot.filename}" loading="${index === 0 ? 'eager' : 'lazy'}" style="width: auto; max-width: 100%;">
+                </div>
+                <div class="text-details-toggle mt-2">
+                    <button class="btn btn-sm btn-light text-toggle-btn" type="button">
+                        <i data-feather="chevron-down" class="text-icon"></i> 
+                        <span>Show extracted text</span>
+                    </button>
+                </div>
+                <div class="screenshot-text collapse">
+                    <div class="d-flex justify-content-between align-items-center mb-2 pt-2">
+                        <h5 class="mb-0">Extracted Text:</h5>
+                        <small class="text-muted">Scroll to view more</small>
+                    </div>
+                    <div class="text-content">${screenshot.text_content || 'No text extracted'}</div>
+                </div>
+            </div>
+        `;
+        
+        // Add event listener to the text toggle button after the item is added to the DOM
+        setTimeout(() => {
+            const toggleBtn = item.querySelector('.text-toggle-btn');
+            const textSection = item.querySelector('.screenshot-text');
+            const toggleIcon = item.querySelector('.text-icon');
+            const toggleText = toggleBtn.querySelector('span');
+            
+            toggleBtn.addEventListener('click', function() {
+                const isCollapsed = textSection.classList.contains('collapse');
+                
+                if (isCollapsed) {
+                    // Show section
+                    textSection.classList.remove('collapse');
+                    textSection.classList.add('show');
+                    toggleIcon.setAttribute('data-feather', 'chevron-up');
+                    toggleText.textContent = 'Hide extracted text';
+                } else {
+                    // Hide section 
+                    textSection.classList.add('collapse');
+                    textSection.classList.remove('show');
+                    toggleIcon.setAttribute('data-feather', 'chevron-down');
+                    toggleText.textContent = 'Show extracted text';
+                }
+                
+                // Re-initialize feather icons
+                feather.replace();
+            });
+        }, 0);
+        
+        return item;
+    }
+
     function updateCounter() {
         if (screenshots.length === 0) {
             screenshotCounter.textContent = 'No screenshots';
@@ -660,9 +788,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Remove from local array
                 screenshots = screenshots.filter(s => s.id !== screenshotId);
                 
-                // Move to next or reload if this was the last one
+                // Move to next or show the empty state if this was the last one
                 if (screenshots.length === 0) {
-                    loadScreenshots();
+                    renderScreenshots();
+                    updateCounter();
                 } else {
                     // Move to the next item automatically
                     if (carousel) {
@@ -767,9 +896,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Remove from local array
                 screenshots = screenshots.filter(s => s.id !== screenshotId);
                 
-                // Move to next or reload if this was the last one
+                // Move to next or show the empty state if this was the last one
                 if (screenshots.length === 0) {
-                    loadScreenshots();
+                    renderScreenshots();
+                    updateCounter();
                 } else {
                     // Move to the next item automatically
                     if (carousel) {
@@ -816,8 +946,9 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(data => {
             if (data.success) {
                 showToast(data.message);
-                // Reload screenshots
-                loadScreenshots();
+                // New screenshots arrive through the change feed
+                isLoading = false;
+                hideLoadingIndicator();
             } else {
                 showErrorMessage(data.message || 'Rescan failed');
                 isLoading = false;
@@ -1044,8 +1175,9 @@ document.addEventListener('DOMContentLoaded', function() {
                     // Clear our local array
                     screenshots = [];
                     
-                    // Reload screenshots (which will show the "all done" message)
-                    loadScreenshots();
+                    // Show the "all done" message
+                    renderScreenshots();
+                    updateCounter();
                 } else {
                     showErrorMessage(data.message || 'Failed to dismiss all screenshots');
                 }
@@ -1074,8 +1206,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Show toast notification
                 showToast(data.message || `Restored all screenshots`);
                 
-                // Reload screenshots to show the restored items
-                loadScreenshots();
+                // The restored screenshots arrive through the change feed
             } else {
                 showErrorMessage(data.message || 'Failed to restore dismissed screenshots');
             }
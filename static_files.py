@@ -0,0 +1,145 @@
+import os
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from flask import current_app, request, abort, send_file, Response
+from werkzeug.security import safe_join
+
+import storage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Screenshot files never change once named, so let browsers keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+class HotFileCache:
+    """Small in-memory LRU cache for frequently served small files"""
+
+    def __init__(self, max_bytes, max_file_bytes):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # path -> (stamp, data)
+        self._total_bytes = 0
+
+    def get(self, path, stamp):
+        """Return cached bytes for path if they are still current"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return None
+            if entry[0] != stamp:
+                # File changed on disk, drop the stale copy
+                self._total_bytes -= len(entry[1])
+                del self._entries[path]
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path, stamp, data):
+        """Cache file content, evicting least recently used entries"""
+        if len(data) > self.max_file_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._total_bytes -= len(old[1])
+            self._entries[path] = (stamp, data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and self._entries:
+                _path, (_stamp, evicted) = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+def init_app(app):
+    """Configure immutable file serving for an app"""
+    app.config.setdefault('STATIC_HOT_CACHE_MB', int(os.environ.get('STATIC_HOT_CACHE_MB', 32)))
+    app.config.setdefault('STATIC_HOT_CACHE_MAX_FILE_KB', int(os.environ.get('STATIC_HOT_CACHE_MAX_FILE_KB', 256)))
+    # None, 'x-sendfile' (Apache/lighttpd) or 'x-accel-redirect' (nginx)
+    app.config.setdefault('STATIC_OFFLOAD', os.environ.get('STATIC_OFFLOAD'))
+    # Maps a served folder to the internal nginx location it is exposed under
+    app.config.setdefault('STATIC_ACCEL_PREFIXES', {})
+
+    if app.config['STATIC_OFFLOAD'] == 'x-sendfile':
+        app.config['USE_X_SENDFILE'] = True
+
+    app.extensions['static_files'] = HotFileCache(
+        app.config['STATIC_HOT_CACHE_MB'] * 1024 * 1024,
+        app.config['STATIC_HOT_CACHE_MAX_FILE_KB'] * 1024
+    )
+
+@lru_cache(maxsize=4096)
+def _resolve(directory, filename):
+    """Resolve a requested file to an absolute path inside directory, or None"""
+    path = safe_join(os.path.abspath(directory), filename)
+    return os.path.abspath(path) if path else None
+
+def send_immutable_file(directory, filename, mimetype=None):
+    """
+    Serve a file that never changes once written.
+    Responses carry a long-lived immutable Cache-Control header and a strong
+    ETag derived from the content hash, and honour If-None-Match and Range
+    requests. Small files are served from memory, and large ones can be
+    handed off to a fronting proxy with X-Sendfile or X-Accel-Redirect.
+    """
+    path = _resolve(directory, filename)
+    if path is None:
+        abort(404)
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+
+    etag = storage.content_digest(path)
+    if mimetype is None:
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    # Answer revalidations before touching the file content
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        return _with_cache_headers(response, etag)
+
+    config = current_app.config
+    hot_cache = current_app.extensions.get('static_files')
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    if hot_cache is not None and stat.st_size <= hot_cache.max_file_bytes:
+        data = hot_cache.get(path, stamp)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            hot_cache.put(path, stamp, data)
+        response = Response(data, mimetype=mimetype)
+        response.last_modified = stat.st_mtime
+        _with_cache_headers(response, etag)
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+
+    if config.get('STATIC_OFFLOAD') == 'x-accel-redirect':
+        internal_uri = _accel_uri(path, config.get('STATIC_ACCEL_PREFIXES', {}))
+        if internal_uri:
+            # nginx streams the file and handles Range itself
+            response = Response(mimetype=mimetype)
+            response.headers['X-Accel-Redirect'] = internal_uri
+            return _with_cache_headers(response, etag)
+
+    # send_file handles Range and conditional requests (and X-Sendfile if enabled)
+    response = send_file(path, mimetype=mimetype, etag=etag, conditional=True, max_age=None)
+    return _with_cache_headers(response, etag)
+
+def _with_cache_headers(response, etag):
+    """Attach the immutable caching headers to a response"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+def _accel_uri(path, prefixes):
+    """Map an absolute file path to its internal nginx location, if configured"""
+    for folder, prefix in prefixes.items():
+        abs_folder = os.path.abspath(folder)
+        if path.startswith(abs_folder + os.sep):
+            relative = os.path.relpath(path, abs_folder).replace(os.sep, '/')
+            return prefix.rstrip('/') + '/' + relative
+    return None
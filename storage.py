@@ -0,0 +1,178 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Read files in 1MB blocks when hashing
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Name of the file mapping legacy flat filenames to their sharded location
+LEGACY_INDEX_NAME = ".legacy_paths.json"
+
+# Scratch directory (inside the storage root, so renames stay on one filesystem)
+INCOMING_DIR_NAME = ".incoming"
+
+# Memoized digests keyed by absolute path, invalidated by (mtime, size)
+_digest_cache = {}
+_digest_lock = threading.Lock()
+
+def content_digest(file_path):
+    """
+    Return the SHA-256 hex digest of a file's content.
+    Results are memoized per path and recomputed only when the file's
+    modification time or size changes, so repeated calls are just a stat().
+    """
+    abs_path = os.path.abspath(file_path)
+    stat = os.stat(abs_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    with _digest_lock:
+        cached = _digest_cache.get(abs_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    with open(abs_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[abs_path] = (stamp, digest)
+    return digest
+
+def forget_digest(file_path):
+    """Drop the memoized digest for a file (e.g. after it was deleted)"""
+    with _digest_lock:
+        _digest_cache.pop(os.path.abspath(file_path), None)
+
+def shard_path(root, digest, extension):
+    """Location of a content-addressed file: <root>/ab/cd/<digest><ext>"""
+    return os.path.join(root, digest[:2], digest[2:4], f"{digest}{extension.lower()}")
+
+def store_upload(file, original_filename, root):
+    """
+    Save an uploaded FileStorage into the sharded layout under root.
+    The content is hashed while it is written, so the file is only read once.
+    Returns the stored path; identical uploads resolve to the same path.
+    """
+    extension = os.path.splitext(original_filename)[1]
+    tmp_path = scratch_path(root)
+
+    hasher = hashlib.sha256()
+    try:
+        with open(tmp_path, 'wb') as out:
+            for block in iter(lambda: file.stream.read(HASH_BLOCK_SIZE), b''):
+                hasher.update(block)
+                out.write(block)
+        return _move_into_place(tmp_path, shard_path(root, hasher.hexdigest(), extension))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def scratch_path(root, extension=''):
+    """A fresh path in root's scratch directory, hidden from scans (see iter_files)"""
+    incoming = os.path.join(root, INCOMING_DIR_NAME)
+    os.makedirs(incoming, exist_ok=True)
+    return os.path.join(incoming, uuid.uuid4().hex + extension)
+
+def store_file(source_path, root):
+    """Move an existing file into the sharded layout under root and return its new path"""
+    digest = content_digest(source_path)
+    target = shard_path(root, digest, os.path.splitext(source_path)[1])
+    stored = _move_into_place(source_path, target)
+    forget_digest(source_path)
+    return stored
+
+def _move_into_place(source_path, target_path):
+    """Rename a file to its content address, dropping it if that content is already stored"""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    if os.path.exists(target_path):
+        os.remove(source_path)
+    else:
+        os.replace(source_path, target_path)
+    return target_path
+
+def iter_files(root, recursive=True):
+    """
+    Yield every file path below root, walking shard directories with scandir
+    (only the files directly in root if not recursive).
+    Hidden entries (such as the incoming scratch directory) are skipped.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+        except FileNotFoundError:
+            continue
+
+# Legacy index cache: root -> (mtime_ns, {legacy filename: sharded relative path})
+_legacy_cache = {}
+_legacy_lock = threading.Lock()
+
+def load_legacy_index(root):
+    """Load the legacy filename mapping written by migrate_storage.py"""
+    index_path = os.path.join(root, LEGACY_INDEX_NAME)
+    try:
+        mtime = os.stat(index_path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+
+    with _legacy_lock:
+        cached = _legacy_cache.get(root)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(index_path) as f:
+            mapping = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Could not read legacy path index {index_path}: {str(e)}")
+        mapping = {}
+
+    with _legacy_lock:
+        _legacy_cache[root] = (mtime, mapping)
+    return mapping
+
+def save_legacy_index(root, mapping):
+    """Atomically write the legacy filename mapping for a storage root"""
+    index_path = os.path.join(root, LEGACY_INDEX_NAME)
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(mapping, f)
+    os.replace(tmp_path, index_path)
+
+def resolve_filename(root, filename):
+    """
+    Map a requested filename under root to where the file lives now.
+    Files moved out of the old flat layout are found through the legacy index,
+    so URLs and Screenshot.path values from before the migration keep working.
+    """
+    if os.path.exists(os.path.join(root, filename)):
+        return filename
+    return load_legacy_index(root).get(filename, filename)
+
+def resolve_path(path, root):
+    """Resolve a stored Screenshot.path (possibly from the flat layout) to an existing file path"""
+    if os.path.exists(path):
+        return path
+    abs_root = os.path.abspath(root)
+    abs_path = os.path.abspath(path)
+    if abs_path.startswith(abs_root + os.sep):
+        relative = os.path.relpath(abs_path, abs_root).replace(os.sep, '/')
+        return os.path.join(root, resolve_filename(root, relative))
+    return path
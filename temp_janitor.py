@@ -0,0 +1,134 @@
+"""
+Background deletion of expired temporary uploads.
+
+Session-mode uploads live in temp_uploads until they expire. Instead of
+listing the folder on every request, a janitor thread keeps a min-heap of
+(expiry time, path): it is built from the folder once at startup, new files
+are pushed as they are saved, and the thread sleeps until the earliest
+expiry, then deletes everything that is due in one batch.
+
+Files written by other worker processes are picked up by an occasional
+rescan from the janitor thread, never from a request handler.
+"""
+
+import os
+import time
+import heapq
+import logging
+import threading
+
+import storage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Most files deleted per wake-up, so one wake-up never holds the lock for long
+DELETE_BATCH = 500
+
+# Janitors by absolute folder path, one per folder per process
+_janitors = {}
+_janitors_lock = threading.Lock()
+
+class TempJanitor:
+    """Deletes files in a folder once they are older than ttl seconds"""
+
+    def __init__(self, folder, ttl, rescan_interval=None):
+        self.folder = folder
+        self.ttl = ttl
+        self.rescan_interval = rescan_interval or ttl
+        self._heap = []  # (expires_at, path)
+        self._condition = threading.Condition()
+        self._next_rescan = 0.0
+        self._thread = None
+
+    def start(self):
+        """Build the heap from the folder and start the janitor thread"""
+        self._rescan()
+        self._thread = threading.Thread(target=self._run, name=f'temp-janitor:{self.folder}')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def track(self, path, created_at=None):
+        """Schedule a newly saved file for deletion ttl seconds after created_at (default: now)"""
+        expires_at = (created_at or time.time()) + self.ttl
+        with self._condition:
+            heapq.heappush(self._heap, (expires_at, path))
+            # Only wake the thread if this file expires before the one it is waiting for
+            if self._heap[0][1] == path:
+                self._condition.notify()
+
+    def _rescan(self):
+        """Rebuild the heap from the files currently in the folder"""
+        entries = []
+        for path in storage.iter_files(self.folder):
+            try:
+                entries.append((os.stat(path).st_mtime + self.ttl, path))
+            except OSError:
+                continue
+        heapq.heapify(entries)
+        with self._condition:
+            self._heap = entries
+            self._next_rescan = time.time() + self.rescan_interval
+        logger.info(f"Temp janitor tracking {len(entries)} files in {self.folder}")
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.time()
+                wake_at = min(self._heap[0][0] if self._heap else self._next_rescan, self._next_rescan)
+                if wake_at > now:
+                    self._condition.wait(wake_at - now)
+                    continue
+
+                due = []
+                while self._heap and self._heap[0][0] <= now and len(due) < DELETE_BATCH:
+                    due.append(heapq.heappop(self._heap))
+                rescan = not due and now >= self._next_rescan
+
+            if due:
+                self._delete(due)
+            elif rescan:
+                self._rescan()
+
+    def _delete(self, due):
+        """Delete a batch of expired files (without holding the lock)"""
+        removed = 0
+        for expires_at, path in due:
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not stat temporary file {path}: {str(e)}")
+                continue
+
+            # Rewritten since it was scheduled: check again later
+            if mtime + self.ttl > expires_at + 1:
+                self.track(path, mtime)
+                continue
+
+            try:
+                os.remove(path)
+                storage.forget_digest(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not remove expired temporary file {path}: {str(e)}")
+
+        if removed:
+            logger.info(f"Removed {removed} expired temporary files from {self.folder}")
+
+def start(folder, ttl):
+    """Start (or return the running) janitor for a folder"""
+    key = os.path.abspath(folder)
+    with _janitors_lock:
+        janitor = _janitors.get(key)
+        if janitor is None:
+            janitor = _janitors[key] = TempJanitor(folder, ttl).start()
+    return janitor
+
+def track(folder, path):
+    """Schedule a new file in folder for deletion, if a janitor is running for it"""
+    janitor = _janitors.get(os.path.abspath(folder))
+    if janitor is not None:
+        janitor.track(path)
@@ -0,0 +1,23 @@
+"""
+The apps read their folders and databases from the environment when they are
+imported, so every test run gets its own temporary directory for them, and
+runs from it so relative folders (session uploads) end up there too.
+Background jobs that would run on a timer (deadline re-rank) or load models
+(warm-up) are turned off.
+"""
+
+import os
+import tempfile
+
+_root = tempfile.mkdtemp(prefix='noravue-tests-')
+
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_root, 'screenshots.db')}",
+    'SCREENSHOTS_FOLDER': os.path.join(_root, 'screenshots'),
+    'DOCUMENTS_FOLDER': os.path.join(_root, 'documents'),
+    'RENDITIONS_FOLDER': os.path.join(_root, 'renditions'),
+    'SESSION_SQLITE_PATH': os.path.join(_root, 'sessions.db'),
+    'DEADLINE_RERANK_INTERVAL': '0',
+    'WARMUP': 'lazy',
+})
+os.chdir(_root)
@@ -0,0 +1,112 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.orm import DeclarativeBase
+
+import db_writer
+
+class Base(DeclarativeBase):
+    pass
+
+db = SQLAlchemy(model_class=Base)
+
+class Item(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(32), nullable=False, unique=True)
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app with its own SQLite database and writer thread"""
+    flask_app = Flask(__name__)
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'writer.db'}"
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+
+    for name in ('_app', '_db', '_writer'):
+        monkeypatch.setattr(db_writer, name, None)
+    db_writer.init_app(flask_app, db)
+    return flask_app
+
+def _names(flask_app):
+    with flask_app.app_context():
+        return sorted(item.name for item in Item.query.all())
+
+def _add(name):
+    """A write adding an item, returns its id"""
+    def add():
+        item = Item(name=name)
+        db.session.add(item)
+        db.session.flush()
+        return item.id
+    return add
+
+def test_sqlite_connections_use_wal(app):
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() > 0
+
+def test_writes_from_many_threads_are_committed(app):
+    names = [f'item{i}' for i in range(50)]
+    with ThreadPoolExecutor(8) as pool:
+        ids = list(pool.map(lambda name: db_writer.write(_add(name)), names))
+
+    assert len(set(ids)) == len(names)
+    assert _names(app) == sorted(names)
+
+def test_failing_write_only_fails_itself(app):
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    def broken():
+        db.session.add(Item(name='broken'))
+        raise ValueError('broken write')
+
+    # Hold the writer so the next two writes are queued into one batch
+    blocker = threading.Thread(target=db_writer.write, args=(block,))
+    blocker.start()
+    assert started.wait(5)
+    with ThreadPoolExecutor(2) as pool:
+        good = pool.submit(db_writer.write, _add('good'))
+        bad = pool.submit(db_writer.write, broken)
+        while db_writer._writer._queue.qsize() < 2:
+            time.sleep(0.01)
+        release.set()
+
+        assert good.result(5) is not None
+        with pytest.raises(ValueError):
+            bad.result(5)
+    blocker.join(5)
+
+    assert _names(app) == ['good']
+
+def test_write_inside_a_write_joins_its_transaction(app):
+    def outer():
+        db.session.add(Item(name='outer'))
+        return db_writer.write(lambda: threading.current_thread().name)
+
+    assert db_writer.write(outer) == 'db-writer'
+    assert _names(app) == ['outer']
+
+def test_writer_follows_a_newly_created_app(app, tmp_path):
+    db_writer.write(_add('first'))
+    second = Flask(__name__)
+    second.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'second.db'}"
+    db.init_app(second)
+    with second.app_context():
+        db.create_all()
+    db_writer.init_app(second, db)
+
+    db_writer.write(_add('second'))
+    assert db_writer._writer.app is second
+    assert _names(app) == ['first']
+    assert _names(second) == ['second']
@@ -0,0 +1,41 @@
+import datetime
+
+import pytest
+
+import scoring
+import deadlines
+
+# A Monday morning
+NOW = datetime.datetime(2025, 3, 10, 9, 0)
+
+@pytest.mark.parametrize('text, due_at', [
+    ("Pay the invoice, due tomorrow", datetime.datetime(2025, 3, 11, 23, 59)),
+    ("Submit the form by Friday at 5:30 pm", datetime.datetime(2025, 3, 14, 17, 30)),
+    ("Deadline: Jan 5", datetime.datetime(2026, 1, 5, 23, 59)),
+    ("Offer expires 2025-04-01 12:00", datetime.datetime(2025, 4, 1, 12, 0)),
+    ("Due next week, or at the latest by Wednesday", datetime.datetime(2025, 3, 12, 23, 59)),
+    ("Renew it before next Monday", datetime.datetime(2025, 3, 17, 23, 59)),
+])
+def test_cued_dates_resolve_to_the_earliest_deadline(text, due_at):
+    assert deadlines.extract_due_at(text, NOW) == due_at
+
+@pytest.mark.parametrize('text', [
+    "",
+    "Meeting Monday with the design team",
+    "Photos from tomorrow's trip",
+    "Payment was due 3/1/2025",
+    "Due 2/30/2025",
+])
+def test_no_deadline_without_a_cue_or_a_future_date(text):
+    assert deadlines.extract_due_at(text, NOW) is None
+
+def test_no_ranges_within_the_same_day():
+    assert deadlines.changed_bucket_ranges(NOW, NOW + datetime.timedelta(hours=8)) == []
+
+def test_changed_ranges_hold_exactly_the_rows_whose_bucket_changed():
+    for last_run, now in [(NOW, NOW + datetime.timedelta(days=1)), (NOW, NOW + datetime.timedelta(days=3, hours=20))]:
+        ranges = deadlines.changed_bucket_ranges(last_run, now)
+        for hours in range(-24 * 5, 24 * 30, 6):
+            due_at = NOW + datetime.timedelta(hours=hours)
+            changed = scoring.deadline_urgency(due_at, last_run) != scoring.deadline_urgency(due_at, now)
+            assert changed == any(start <= due_at < end for start, end in ranges), due_at
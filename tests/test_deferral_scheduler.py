@@ -0,0 +1,79 @@
+import time
+import datetime
+
+import change_feed
+import deferral_scheduler
+
+def _wait_for_events(feed, seq, timeout=5):
+    """Events published on a feed after seq, waiting up to timeout seconds for the first"""
+    deadline = time.time() + timeout
+    events = []
+    while not events and time.time() < deadline:
+        events = feed.since(seq, timeout=deadline - time.time())
+    return events
+
+def test_scheduler_fires_due_entries_in_order():
+    fired = []
+    scheduler = deferral_scheduler.DeferralScheduler('test', fired.extend).start()
+    now = time.time()
+    scheduler.schedule('a', 2, now + 0.2)
+    scheduler.schedule('a', 1, now + 0.1)
+    scheduler.schedule('a', 3, now + 0.1)
+    scheduler.cancel('a', 3)
+
+    deadline = time.time() + 5
+    while len(fired) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+    assert [(key, screenshot_id) for key, screenshot_id, _due_at in fired] == [('a', 1), ('a', 2)]
+    assert len(scheduler) == 0
+
+def test_library_wake_publishes_rendition_urls():
+    import app as db_app
+    from app import db, Screenshot
+
+    flask_app = db_app.create_app()
+    path = f"{flask_app.config['SCREENSHOTS_FOLDER']}/deferred.png"
+    deferred_until = datetime.datetime.now() - datetime.timedelta(seconds=1)
+    with flask_app.app_context():
+        screenshot = Screenshot(filename='deferred.png', path=path, text_content='', deferred_until=deferred_until)
+        db.session.add(screenshot)
+        db.session.commit()
+        screenshot_id = screenshot.id
+
+    seq = change_feed.feed.seq
+    # The wake runs on the scheduler thread, outside any request
+    deferral_scheduler.scheduler(flask_app).schedule(None, screenshot_id, deferral_scheduler.timestamp(deferred_until))
+
+    events = _wait_for_events(change_feed.feed, seq)
+    assert [(event['op'], event['id']) for event in events] == [('add', screenshot_id)]
+    assert events[0]['screenshot']['thumbnail_url'] == '/renditions/thumb/screenshots/deferred.png'
+
+def test_session_wake_publishes_rendition_urls(tmp_path):
+    from flask import Flask
+    from session_manager import SessionScreenshot, client_dict
+
+    flask_app = Flask(__name__)
+    flask_app.config['RENDITION_SOURCES'] = {'temp_uploads': str(tmp_path)}
+    screenshot = SessionScreenshot('s1', 'due soon.png', str(tmp_path / 'due soon.png'), '', 0.5, 0.5, 0.5)
+    screenshot.deferred_until = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+
+    scheduler = deferral_scheduler.start_sessions(
+        flask_app, lambda sid, screenshot_id: screenshot if (sid, screenshot_id) == ('sid', 's1') else None, client_dict
+    )
+    feed = change_feed.session_feed('sid')
+    seq = feed.seq
+    scheduler.schedule('sid', 's1', deferral_scheduler.timestamp(screenshot.deferred_until, utc=True))
+
+    events = _wait_for_events(feed, seq)
+    assert [(event['op'], event['id']) for event in events] == [('add', 's1')]
+    assert events[0]['screenshot']['preview_url'] == '/renditions/preview/temp_uploads/due%20soon.png'
+
+def test_each_app_gets_its_own_session_scheduler():
+    from flask import Flask
+
+    first, second = Flask(__name__), Flask(__name__)
+    scheduler = deferral_scheduler.start_sessions(first, lambda sid, screenshot_id: None, dict)
+
+    assert deferral_scheduler.start_sessions(first, lambda sid, screenshot_id: None, dict) is scheduler
+    assert deferral_scheduler.start_sessions(second, lambda sid, screenshot_id: None, dict) is not scheduler
+    assert deferral_scheduler.scheduler(first) is scheduler
@@ -0,0 +1,44 @@
+import re
+
+import pytest
+
+import nlp_analyzer
+
+def per_term_counts(text):
+    """The fallback's original matcher: every keyword searched on its own, as a whole word"""
+    text_lower = text.lower()
+    urgency_count = 0
+    action_count = 0
+    for keyword in nlp_analyzer.URGENCY_KEYWORDS:
+        if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
+            urgency_count += 1.5 if keyword in nlp_analyzer.HIGH_URGENCY_KEYWORDS else 1
+    for keyword in nlp_analyzer.ACTION_KEYWORDS:
+        if re.search(r'\b' + re.escape(keyword) + r'\b', text_lower):
+            action_count += 1.5 if keyword in nlp_analyzer.HIGH_ACTION_KEYWORDS else 1
+    for pattern in nlp_analyzer.FALLBACK_DATE_PATTERNS:
+        if pattern.search(text_lower):
+            urgency_count += 1.5
+    return urgency_count, action_count
+
+@pytest.mark.parametrize('text', [
+    "",
+    "Photo album shared with you: Summer trip (42 photos)",
+    "URGENT: pay the invoice by Friday, don't forget to attach the receipt",
+    "Your task this week: review the report and confirm. Your job is to verify it.",
+    "Last call! Last chance to register, registration closes soon. Hurry",
+    "TODO / to-do: backup laptop, book dentist, fill in the form before 17:30 on 3/14/2025",
+    "Running out of time: you need to and have to and must submit it by Mar 3",
+    "The document was downloaded to a bookshelf; nobody reviewed the meeting notes",
+    "Reminder: remind me to call, email or send it. Remember to check the checklist",
+    "today TODAY Today, asap ASAP and urgent urgent urgent",
+])
+def test_single_pass_counts_match_per_term_matcher(text):
+    assert nlp_analyzer.keyword_counts(text) == per_term_counts(text)
+
+def test_keywords_only_match_whole_words():
+    assert nlp_analyzer.keyword_counts("document bookshelf todos") == (0, 0)
+    assert nlp_analyzer.keyword_counts("do book") == (0, 2)
+
+def test_phrases_also_count_the_keywords_inside_them():
+    # "your task" and "task" are both keywords
+    assert nlp_analyzer.keyword_counts("your task") == (0, 2)
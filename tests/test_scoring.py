@@ -0,0 +1,59 @@
+import datetime
+
+import scoring
+
+# A Monday morning
+UPLOADED = datetime.datetime(2025, 3, 10, 9, 0)
+
+def _features(date_entities=(), time_hits=0, due_at=None, urgency_count=0, action_count=0):
+    return {
+        'engine': 'spacy',
+        'text_length': 300,
+        'pattern_counts': {'URGENCY': urgency_count, 'ACTION': action_count},
+        'date_entities': list(date_entities),
+        'time_hits': time_hits,
+        'due_at': due_at,
+    }
+
+def test_scores_grow_with_matches_and_are_capped():
+    base_urgency, base_action = scoring.score_features(_features())
+    assert (base_urgency, base_action) == (0.15, 0.15)
+
+    urgency, action = scoring.score_features(_features(urgency_count=2, action_count=1))
+    assert urgency > base_urgency and action > base_action
+
+    assert scoring.score_features(_features(urgency_count=50, action_count=50)) == (0.95, 0.95)
+
+def test_short_texts_count_matches_less():
+    short = dict(_features(urgency_count=2), text_length=30)
+    assert scoring.score_features(short)[0] < scoring.score_features(_features(urgency_count=2))[0]
+
+def test_first_matching_date_term_counts():
+    assert scoring.date_urgency(['next week', 'tomorrow'], 0) == 0.4
+    assert scoring.date_urgency(['Tomorrow morning'], 1) == 0.9
+    assert scoring.date_urgency(['March'], 1) == 0.6
+    assert scoring.date_urgency([], 0) == 0.0
+
+def test_due_tomorrow_decays_once_the_deadline_passes():
+    due_at = datetime.datetime.combine(UPLOADED.date() + datetime.timedelta(days=1), datetime.time(23, 59))
+    features = _features(['tomorrow'], due_at=due_at)
+
+    urgencies = [scoring.score_features(features, now=UPLOADED + datetime.timedelta(days=days))[0]
+                 for days in (0, 1, 7)]
+    assert urgencies == sorted(urgencies, reverse=True)
+    assert urgencies[-1] < urgencies[0]
+
+    # Without the deadline the date entity would keep it at "tomorrow" forever
+    stale = scoring.score_features(_features(['tomorrow']), now=UPLOADED + datetime.timedelta(days=7))[0]
+    assert urgencies[-1] < stale
+
+def test_deadline_replaces_date_terms_but_keeps_clock_times():
+    overdue = datetime.datetime(2025, 3, 1, 17, 0)
+    assert scoring.time_urgency(['today'], 0, overdue, UPLOADED) == 0.5
+    assert scoring.time_urgency(['today'], 1, overdue, UPLOADED) == 0.6
+    assert scoring.time_urgency(['today'], 0, None, UPLOADED) == 1.0
+
+def test_deadline_buckets_by_calendar_days_left():
+    def urgency(days):
+        return scoring.deadline_urgency(UPLOADED + datetime.timedelta(days=days), UPLOADED)
+    assert [urgency(days) for days in (-3, 0, 1, 5, 10, 30)] == [0.5, 1.0, 0.9, 0.7, 0.4, 0.0]
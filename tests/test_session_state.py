@@ -0,0 +1,144 @@
+import pickle
+import datetime
+
+from session_manager import SessionScreenshot, SessionState
+
+NOW = datetime.datetime.utcnow()
+LATER = NOW + datetime.timedelta(hours=1)
+
+def _screenshot(screenshot_id, priority=0.5, dismissed=False):
+    return SessionScreenshot(id=screenshot_id, filename=f'{screenshot_id}.png', path=f'{screenshot_id}.png',
+                             text_content='', priority_score=priority, urgency_score=priority,
+                             action_score=priority, dismissed=dismissed)
+
+def _state(*screenshots):
+    state = SessionState()
+    for screenshot in screenshots:
+        state.add(screenshot)
+    return state
+
+def _check(state, now=None):
+    """The indexes agree with the records"""
+    now = now or datetime.datetime.utcnow()
+    assert state.active == sorted(state.active)
+    active = [screenshot_id for _priority, screenshot_id in state.active]
+    assert len(active) == len(set(active))
+
+    live_deferred = {screenshot_id for deferred_until, screenshot_id in state.deferred
+                     if state.records[screenshot_id].deferred_until == deferred_until}
+    for screenshot_id, screenshot in state.records.items():
+        if screenshot.dismissed:
+            assert screenshot_id in state.dismissed and screenshot_id not in active
+        elif screenshot.deferred_until and screenshot.deferred_until > now:
+            assert screenshot_id in live_deferred and screenshot_id not in active
+        else:
+            assert screenshot_id in active or screenshot_id in live_deferred
+    assert set(state.dismissed) == {i for i, screenshot in state.records.items() if screenshot.dismissed}
+
+def _active_ids(state):
+    return [screenshot.id for screenshot in state.active_screenshots()]
+
+def test_active_screenshots_are_listed_highest_priority_first():
+    state = _state(_screenshot('a', 0.2), _screenshot('b', 0.9), _screenshot('c', 0.5), _screenshot('d', dismissed=True))
+    _check(state)
+    assert _active_ids(state) == ['b', 'c', 'a']
+    assert [screenshot.id for screenshot in state.dismissed_screenshots()] == ['d']
+
+def test_equal_priorities_are_ordered_by_id():
+    state = _state(_screenshot('b'), _screenshot('a'))
+    assert _active_ids(state) == ['a', 'b']
+
+def test_dismiss_and_restore():
+    state = _state(_screenshot('a', 0.2), _screenshot('b', 0.9))
+    assert state.dismiss('b')
+    assert not state.dismiss('b')
+    assert not state.dismiss('missing')
+    _check(state)
+    assert _active_ids(state) == ['a']
+
+    assert state.restore('b')
+    assert not state.restore('b')
+    _check(state)
+    assert _active_ids(state) == ['b', 'a']
+
+def test_dismissed_screenshots_keep_dismissal_order():
+    state = _state(_screenshot('a'), _screenshot('b'), _screenshot('c'))
+    for screenshot_id in ('c', 'a', 'b'):
+        state.dismiss(screenshot_id)
+    assert [screenshot.id for screenshot in state.dismissed_screenshots()] == ['c', 'a', 'b']
+
+def test_deferred_screenshot_wakes_when_due():
+    state = _state(_screenshot('a', 0.2), _screenshot('b', 0.9))
+    assert state.defer('b', LATER)
+    _check(state)
+    assert _active_ids(state) == ['a']
+
+    assert state.promote_due(NOW) == 0
+    assert state.promote_due(LATER) == 1
+    _check(state, LATER)
+    assert _active_ids(state) == ['b', 'a']
+
+def test_deferring_again_replaces_the_wake_up():
+    state = _state(_screenshot('a'))
+    state.defer('a', LATER)
+    state.defer('a', LATER + datetime.timedelta(hours=1))
+
+    # The first heap entry is stale and skipped
+    assert state.promote_due(LATER) == 0
+    assert state.promote_due(LATER + datetime.timedelta(hours=1)) == 1
+    assert _active_ids(state) == ['a']
+
+def test_dismissed_deferred_screenshot_does_not_wake():
+    state = _state(_screenshot('a'))
+    state.defer('a', LATER)
+    assert state.dismiss('a')
+    _check(state)
+
+    assert state.promote_due(LATER) == 0
+    assert _active_ids(state) == []
+    assert not state.defer('a', LATER)
+
+def test_restored_deferred_screenshot_wakes_once():
+    state = _state(_screenshot('a'))
+    state.defer('a', LATER)
+    state.dismiss('a')
+    state.restore('a')
+    _check(state)
+
+    # restore pushed a second heap entry for the same deferral
+    assert state.promote_due(LATER) == 1
+    assert _active_ids(state) == ['a']
+
+def test_dismiss_all_leaves_deferred_screenshots():
+    state = _state(_screenshot('a'), _screenshot('b'), _screenshot('c'))
+    state.defer('c', LATER)
+    assert state.dismiss_all() == 2
+    _check(state)
+    assert _active_ids(state) == []
+
+    assert state.restore_all() == 2
+    _check(state)
+    assert _active_ids(state) == ['a', 'b']
+
+def test_state_survives_pickling():
+    state = _state(_screenshot('a', 0.2), _screenshot('b', 0.9), _screenshot('c', dismissed=True))
+    state.defer('a', LATER)
+
+    copy = pickle.loads(pickle.dumps(state))
+    _check(copy)
+    assert _active_ids(copy) == ['b']
+    assert copy.records['a'].deferred_until == LATER
+
+def test_merge_applies_changes_over_a_concurrent_state():
+    base = _state(_screenshot('a'), _screenshot('b'), _screenshot('c'))
+    ours, theirs = pickle.loads(pickle.dumps(base)), pickle.loads(pickle.dumps(base))
+    ours.dismiss('a')
+    ours.add(_screenshot('d', 0.9))
+    theirs.dismiss('b')
+    theirs.defer('c', LATER)
+
+    merged = ours.merge(base, theirs)
+    _check(merged)
+    assert _active_ids(merged) == ['d']
+    assert [screenshot.id for screenshot in merged.dismissed_screenshots()] == ['b', 'a']
+    assert merged.records['c'].deferred_until == LATER
@@ -0,0 +1,188 @@
+import time
+import datetime
+
+import pytest
+from flask import Flask
+
+import session_store
+from session_manager import SessionScreenshot, SessionState, STATE_KEY, PENDING_KEY
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def app(request, tmp_path):
+    """An app using the server-side session store with each backend"""
+    flask_app = Flask(__name__)
+    flask_app.config['SESSION_BACKEND'] = request.param
+    flask_app.config['SESSION_SQLITE_PATH'] = str(tmp_path / 'sessions.db')
+    flask_app.permanent_session_lifetime = datetime.timedelta(hours=1)
+    session_store.init_app(flask_app)
+    return flask_app
+
+def _open(flask_app, sid=None, path='/'):
+    """Open the session a request to path carrying sid in its cookie would get"""
+    interface = flask_app.session_interface
+    headers = {'Cookie': f'{interface.get_cookie_name(flask_app)}={sid}'} if sid else {}
+    with flask_app.test_request_context(path, headers=headers) as ctx:
+        return interface.open_session(flask_app, ctx.request)
+
+def _save(flask_app, session):
+    """Save a session as at the end of a request, returns the response"""
+    response = flask_app.response_class()
+    flask_app.session_interface.save_session(flask_app, session, response)
+    return response
+
+def _stored(flask_app, sid):
+    data, _expires_at = flask_app.session_interface.backend.load(sid)
+    return data
+
+def _screenshot(screenshot_id, priority=0.5):
+    return SessionScreenshot(id=screenshot_id, filename=f'{screenshot_id}.png', path=f'{screenshot_id}.png',
+                             text_content='', priority_score=priority, urgency_score=priority,
+                             action_score=priority)
+
+def _new_session(flask_app, **data):
+    """Create and save a session holding data, returns its id"""
+    session = _open(flask_app)
+    session.update(data)
+    _save(flask_app, session)
+    return session.sid
+
+def test_new_session_is_saved_with_cookie(app):
+    session = _open(app)
+    session['theme'] = 'dark'
+    response = _save(app, session)
+
+    assert session.sid in response.headers['Set-Cookie']
+    assert _stored(app, session.sid) == {'theme': 'dark'}
+    assert _open(app, session.sid)['theme'] == 'dark'
+
+def test_unknown_sid_gets_a_new_session(app):
+    session = _open(app, 'not-a-session')
+    assert session.new
+    assert session.sid != 'not-a-session'
+
+def test_expired_session_is_not_loaded(app):
+    sid = _new_session(app, theme='dark')
+    app.session_interface.backend.touch(sid, time.time() - 1)
+
+    assert _stored(app, sid) is None
+    assert _open(app, sid).new
+
+def test_emptied_session_is_deleted(app):
+    sid = _new_session(app, theme='dark')
+    session = _open(app, sid)
+    session.clear()
+    response = _save(app, session)
+
+    assert _stored(app, sid) is None
+    assert 'Set-Cookie' in response.headers
+
+def test_pending_items_are_merged_on_next_request(app):
+    sid = _new_session(app, theme='dark')
+    app.session_interface.append_pending(app, sid, 'items', [1, 2])
+    app.session_interface.append_pending(app, sid, 'items', [3])
+
+    session = _open(app, sid)
+    assert session['items'] == [1, 2, 3]
+
+def test_merging_pending_items_alone_does_not_save(app):
+    sid = _new_session(app, theme='dark')
+    app.session_interface.append_pending(app, sid, 'items', [1])
+
+    session = _open(app, sid)
+    assert not session.modified
+    _save(app, session)
+
+    # Still queued for the next request
+    assert 'items' not in _stored(app, sid)
+    assert _open(app, sid)['items'] == [1]
+
+def test_saved_pending_items_leave_the_queue(app):
+    sid = _new_session(app, theme='dark')
+    app.session_interface.append_pending(app, sid, 'items', [1])
+
+    session = _open(app, sid)
+    session['items'] = session.pop('items') + [2]
+    _save(app, session)
+
+    assert _open(app, sid)['items'] == [1, 2]
+
+def test_items_queued_during_a_request_are_kept(app):
+    sid = _new_session(app, theme='dark')
+    app.session_interface.append_pending(app, sid, 'items', [1])
+    session = _open(app, sid)
+    app.session_interface.append_pending(app, sid, 'items', [2])
+
+    session['theme'] = 'light'
+    _save(app, session)
+
+    assert _open(app, sid)['items'] == [1, 2]
+
+def test_concurrent_saves_of_different_keys_are_merged(app):
+    sid = _new_session(app, theme='dark', lang='en')
+    first, second = _open(app, sid), _open(app, sid)
+    first['theme'] = 'light'
+    second['lang'] = 'fr'
+    _save(app, first)
+    _save(app, second)
+
+    assert _stored(app, sid) == {'theme': 'light', 'lang': 'fr'}
+
+def test_concurrent_request_does_not_lose_new_screenshots(app):
+    state = SessionState()
+    state.add(_screenshot('1'))
+    sid = _new_session(app, **{STATE_KEY: state})
+    app.session_interface.append_pending(app, sid, PENDING_KEY, [_screenshot('2')])
+
+    # A listing folds the queued screenshot in while a dismissal of another one runs
+    listing, dismissal = _open(app, sid), _open(app, sid)
+    for session in (listing, dismissal):
+        for screenshot in session.pop(PENDING_KEY):
+            session[STATE_KEY].add(screenshot)
+    assert dismissal[STATE_KEY].dismiss('1')
+    dismissal.modified = True
+    _save(app, dismissal)
+    _save(app, listing)
+
+    stored = _stored(app, sid)[STATE_KEY]
+    assert [s.id for s in stored.active_screenshots()] == ['2']
+    assert [s.id for s in stored.dismissed_screenshots()] == ['1']
+    assert PENDING_KEY not in _open(app, sid)
+
+def test_concurrent_changes_to_different_screenshots_are_merged(app):
+    state = SessionState()
+    for screenshot_id in ('1', '2', '3'):
+        state.add(_screenshot(screenshot_id))
+    sid = _new_session(app, **{STATE_KEY: state})
+
+    first, second = _open(app, sid), _open(app, sid)
+    first[STATE_KEY].dismiss('1')
+    first.modified = True
+    second[STATE_KEY].defer('2', datetime.datetime.utcnow() + datetime.timedelta(hours=1))
+    second.modified = True
+    _save(app, first)
+    _save(app, second)
+
+    stored = _stored(app, sid)[STATE_KEY]
+    stored.promote_due()
+    assert [s.id for s in stored.active_screenshots()] == ['3']
+    assert [s.id for s in stored.dismissed_screenshots()] == ['1']
+    assert stored.records['2'].deferred_until is not None
+
+def test_sid_only_path_neither_loads_nor_saves(app):
+    session_store.sid_only(app, '/poll')
+    sid = _new_session(app, theme='dark')
+    app.session_interface.append_pending(app, sid, 'items', [1])
+
+    session = _open(app, sid, '/poll')
+    assert session.sid == sid
+    assert dict(session) == {}
+    session['theme'] = 'light'
+    response = _save(app, session)
+
+    assert 'Set-Cookie' not in response.headers
+    assert _stored(app, sid) == {'theme': 'dark'}
+    assert _open(app, sid)['items'] == [1]
+
+def test_sid_only_path_without_cookie_has_no_sid(app):
+    session_store.sid_only(app, '/poll')
+    assert _open(app, path='/poll').sid is None
@@ -0,0 +1,13 @@
+import storage
+
+def test_iter_files_skips_hidden_entries_and_can_stay_flat(tmp_path):
+    (tmp_path / 'ab' / 'cd').mkdir(parents=True)
+    (tmp_path / 'ab' / 'cd' / 'abcd.png').write_bytes(b'sharded')
+    (tmp_path / 'flat.png').write_bytes(b'flat')
+    (tmp_path / '.incoming').mkdir()
+    (tmp_path / '.incoming' / 'partial').write_bytes(b'scratch')
+
+    assert sorted(storage.iter_files(str(tmp_path))) == [
+        str(tmp_path / 'ab' / 'cd' / 'abcd.png'), str(tmp_path / 'flat.png')
+    ]
+    assert list(storage.iter_files(str(tmp_path), recursive=False)) == [str(tmp_path / 'flat.png')]
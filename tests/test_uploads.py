@@ -0,0 +1,82 @@
+import io
+import time
+
+import pytest
+import pytesseract
+from PIL import Image
+
+OCR_TEXT = 'URGENT: pay the invoice by Friday'
+
+@pytest.fixture(autouse=True)
+def fake_ocr(monkeypatch):
+    """OCR every upload to the same text, the pipeline around Tesseract is under test"""
+    monkeypatch.setattr(pytesseract, 'image_to_string', lambda image, **kwargs: OCR_TEXT)
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+    buffer.seek(0)
+    return buffer
+
+def _upload(client, names):
+    files = [(_png(color), name) for color, name in zip(['white', 'black', 'red'], names)]
+    return client.post('/api/upload', data={'screenshots[]': files}, content_type='multipart/form-data').get_json()
+
+def _wait_for_progress(client, query_string=None, timeout=30):
+    """The upload progress once it is completed"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        progress = client.get('/api/upload/progress', query_string=query_string).get_json()
+        if progress['completed']:
+            return progress
+        time.sleep(0.1)
+    pytest.fail("Upload did not complete")
+
+def _added_since(client, snapshot):
+    """The 'add' events published after a snapshot"""
+    changes = client.get('/api/changes', query_string={
+        'since': snapshot['seq'], 'epoch': snapshot['epoch'], 'timeout': 0
+    }).get_json()
+    assert not changes['resync']
+    return [event for event in changes['events'] if event['op'] == 'add']
+
+def test_db_upload_reaches_change_feed():
+    import app as db_app
+
+    client = db_app.create_app().test_client()
+    snapshot = client.get('/api/changes/snapshot').get_json()
+
+    response = _upload(client, ['invoice.png', 'receipt.png'])
+    assert response['saved_files'] == 2
+    progress = _wait_for_progress(client)
+    assert progress['processed'] == 2
+
+    added = _added_since(client, snapshot)
+    assert sorted(event['screenshot']['filename'] for event in added) == ['invoice.png', 'receipt.png']
+    for event in added:
+        assert event['screenshot']['text_content'] == OCR_TEXT
+        assert event['screenshot']['thumbnail_url'].startswith('/renditions/thumb/screenshots/')
+
+    active = {screenshot['id'] for screenshot in client.get('/api/screenshots').get_json()}
+    assert {event['id'] for event in added} <= active
+
+def test_session_upload_reaches_change_feed():
+    from app_session import create_app
+
+    client = create_app().test_client()
+    # The snapshot creates the session, so the upload's events go to its feed
+    snapshot = client.get('/api/changes/snapshot').get_json()
+
+    response = _upload(client, ['invoice.png', 'receipt.png', 'ticket.png'])
+    assert response['success'] and response['total_files'] == 3
+    progress = _wait_for_progress(client, {'job_id': response['job_id']})
+    assert (progress['processed'], progress['failed']) == (3, 0)
+
+    added = _added_since(client, snapshot)
+    assert sorted(event['screenshot']['filename'] for event in added) == ['invoice.png', 'receipt.png', 'ticket.png']
+    for event in added:
+        assert event['screenshot']['thumbnail_url'].startswith('/renditions/thumb/temp_uploads/')
+
+    # The results are merged into the session on its next request
+    active = {screenshot['id'] for screenshot in client.get('/api/screenshots').get_json()}
+    assert active == {event['id'] for event in added}
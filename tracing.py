@@ -0,0 +1,191 @@
+"""
+Minimal tracing of the upload-to-card lifecycle.
+
+A span is one timed step (a request, an upload batch, OCR of one file...)
+with a trace id shared by every step of the same upload and the id of its
+parent span. The current span is kept in a context variable; work handed
+to another thread carries it along explicitly:
+
+    context = tracing.current_context()        # in the request
+    ...
+    with tracing.attach(context):              # in the worker thread
+        tracing.record('queue_wait', queued_at, time.time())
+        with tracing.span('batch', files=10):
+            ...
+
+Finished spans are appended to TRACE_FILE as JSON lines:
+
+    {"trace_id": ..., "span_id": ..., "parent_id": ..., "name": "ocr",
+     "start": 1700000000.12, "duration_ms": 812.4, "thread": "upload_0",
+     "attributes": {"file": "a.png"}}
+
+Tracing is off unless TRACE_FILE is set, and spans are then no-ops.
+Summarize a trace file (queue wait versus compute per stage and trace) with
+
+    python -m tracing traces.jsonl
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from flask import g, request
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (trace_id, span_id) of the current span, or None
+_current = contextvars.ContextVar('tracing_current', default=None)
+
+# Set during init_app
+trace_file = None
+_file = None
+_file_lock = threading.Lock()
+
+def init_app(app):
+    """Open the trace file (if TRACE_FILE is set) and trace every request of the app"""
+    global trace_file, _file
+
+    app.config.setdefault('TRACE_FILE', os.environ.get('TRACE_FILE'))
+    if not app.config['TRACE_FILE']:
+        return
+
+    with _file_lock:
+        if _file is None:
+            trace_file = app.config['TRACE_FILE']
+            os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+            _file = open(trace_file, 'a', buffering=1)
+            logger.info(f"Writing trace spans to {trace_file}")
+
+    if _start_request_span not in app.before_request_funcs.get(None, []):
+        app.before_request(_start_request_span)
+        app.after_request(_add_trace_header)
+        app.teardown_request(_finish_request_span)
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+def current_context():
+    """(trace_id, span_id) of the current span, to continue the trace in another thread"""
+    return _current.get()
+
+@contextmanager
+def attach(context):
+    """Make spans in the with block children of context (from current_context)"""
+    token = _current.set(context)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def _start(name):
+    parent = _current.get()
+    trace_id = parent[0] if parent else uuid.uuid4().hex
+    span_id = _new_id()
+    token = _current.set((trace_id, span_id))
+    return {'trace_id': trace_id, 'span_id': span_id, 'parent_id': parent[1] if parent else None,
+            'name': name, 'start': time.time(), 'token': token}
+
+def _finish(started, attributes, error=None):
+    _current.reset(started.pop('token'))
+    if error is not None:
+        attributes['error'] = type(error).__name__
+    _export(dict(started, duration_ms=(time.time() - started['start']) * 1000,
+                 thread=threading.current_thread().name, attributes=attributes))
+
+@contextmanager
+def span(name, **attributes):
+    """Time the with block as a span, a child of the current one (or a new trace)"""
+    if _file is None:
+        yield
+        return
+    started = _start(name)
+    try:
+        yield
+    except BaseException as e:
+        _finish(started, attributes, e)
+        raise
+    _finish(started, attributes)
+
+def record(name, start, end, **attributes):
+    """Export a span with explicit times as a child of the current span (e.g. time spent queued)"""
+    if _file is None:
+        return
+    parent = _current.get()
+    _export({
+        'trace_id': parent[0] if parent else uuid.uuid4().hex,
+        'span_id': _new_id(),
+        'parent_id': parent[1] if parent else None,
+        'name': name,
+        'start': start,
+        'duration_ms': max(0.0, end - start) * 1000,
+        'thread': threading.current_thread().name,
+        'attributes': attributes,
+    })
+
+def _export(finished):
+    line = json.dumps(finished, default=str)
+    with _file_lock:
+        try:
+            _file.write(line + '\n')
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not write trace span: {str(e)}")
+
+def _start_request_span():
+    g.trace_span = _start('request')
+
+def _add_trace_header(response):
+    context = _current.get()
+    if context is not None:
+        response.headers['X-Trace-Id'] = context[0]
+    return response
+
+def _finish_request_span(exc=None):
+    started = g.pop('trace_span', None)
+    if started is None:
+        return
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    _finish(started, {'route': route, 'method': request.method}, exc)
+
+def summarize(path):
+    """Per span name: count and total/mean time; per trace: queue wait versus compute"""
+    by_name = {}
+    traces = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                finished = json.loads(line)
+            except ValueError:
+                continue
+            stats = by_name.setdefault(finished['name'], [0, 0.0])
+            stats[0] += 1
+            stats[1] += finished['duration_ms']
+            if finished['name'] in ('queue_wait', 'batch'):
+                trace = traces.setdefault(finished['trace_id'], {'queue_wait': 0.0, 'batch': 0.0, 'files': 0})
+                trace[finished['name']] += finished['duration_ms']
+                if finished['name'] == 'batch':
+                    trace['files'] += finished['attributes'].get('files', 0)
+    return by_name, traces
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a JSONL trace file")
+    parser.add_argument('trace_file')
+    args = parser.parse_args()
+
+    by_name, traces = summarize(args.trace_file)
+    print(f"{'span':<16} {'count':>7} {'total ms':>12} {'mean ms':>10}")
+    for name, (count, total) in sorted(by_name.items(), key=lambda item: -item[1][1]):
+        print(f"{name:<16} {count:>7} {total:>12.1f} {total / count:>10.2f}")
+
+    if traces:
+        print(f"\n{'upload trace':<34} {'files':>6} {'queue wait ms':>14} {'compute ms':>11}")
+        for trace_id, trace in traces.items():
+            print(f"{trace_id:<34} {trace['files']:>6} {trace['queue_wait']:>14.1f} {trace['batch']:>11.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Shared worker pool for session-mode upload processing.
+
+Uploads are spooled to temp storage inside the request and their OCR and NLP
+work is queued here, so the request returns as soon as the files are on disk,
+whatever the batch size. A fixed number of worker threads serve every
+session: a large batch queues behind the work already submitted instead of
+starting a thread of its own, and once UPLOAD_QUEUE_LIMIT files are waiting
+new uploads are refused until the backlog drains.
+
+Each upload is a job tracked against the session id, so a session polls the
+progress of its own uploads only. Results are delivered through the session
+store (append_pending) and merged into the session on its next request.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import profiling
+import tracing
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Files OCRed and scored per task, so results reach the session in steady increments
+BATCH_SIZE = 10
+
+# Finished jobs stay visible to progress polls for this many seconds
+FINISHED_JOB_TTL = 300
+
+class UploadJob:
+    """Progress of one upload request"""
+
+    def __init__(self, sid, total, profile=False):
+        self.id = uuid.uuid4().hex
+        self.sid = sid
+        self.total = total
+        self.profile = profile  # Profile each batch (see profiling.profiled_job)
+        self.trace_context = tracing.current_context()  # Batches continue the upload request's trace
+        self.processed = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.processed >= self.total
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'total': self.total,
+            'processed': self.processed,
+            'failed': self.failed,
+            'completed': self.done,
+        }
+
+class UploadPool:
+    """Bounded worker pool processing spooled uploads, with per-session job tracking"""
+
+    def __init__(self, workers, max_queued):
+        self.workers = workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self._lock = threading.Lock()
+        self._jobs = {}  # sid -> {job_id: UploadJob}
+        self._queued = 0  # Files submitted and not yet processed
+
+    def submit(self, app, sid, spooled, process, profile=False):
+        """
+        Queue spooled files for process(batch, sid), called in batches with an
+        app context. Returns the job, or None when the queue is full.
+        """
+        with self._lock:
+            if self._queued and self._queued + len(spooled) > self.max_queued:
+                return None
+            self._queued += len(spooled)
+            self._prune()
+            job = UploadJob(sid, len(spooled), profile)
+            self._jobs.setdefault(sid, {})[job.id] = job
+
+        for i in range(0, len(spooled), BATCH_SIZE):
+            self._executor.submit(self._run, app, job, spooled[i:i + BATCH_SIZE], process)
+        logger.info(f"Queued upload job {job.id} with {job.total} files ({self._queued} files waiting)")
+        return job
+
+    def _run(self, app, job, batch, process):
+        stored = 0
+        try:
+            with app.app_context(), profiling.profiled_job(f'upload {job.id}', enabled=job.profile), \
+                    tracing.attach(job.trace_context):
+                tracing.record('queue_wait', job.started_at, time.time(), files=len(batch), job=job.id)
+                with tracing.span('batch', files=len(batch), job=job.id):
+                    stored = len(process(batch, job.sid))
+        except Exception as e:
+            logger.exception(f"Error processing batch of {len(batch)} files for job {job.id}: {str(e)}")
+
+        with self._lock:
+            self._queued -= len(batch)
+            job.processed += len(batch)
+            job.failed += len(batch) - stored
+            if job.done:
+                job.finished_at = time.time()
+                logger.info(f"Upload job {job.id} complete: {job.total - job.failed}/{job.total} files "
+                            f"in {job.finished_at - job.started_at:.1f}s")
+
+    def _prune(self):
+        """Forget jobs that finished more than FINISHED_JOB_TTL ago (lock held)"""
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for sid in list(self._jobs):
+            jobs = self._jobs[sid]
+            for job_id in [job_id for job_id, job in jobs.items() if job.finished_at and job.finished_at < cutoff]:
+                del jobs[job_id]
+            if not jobs:
+                del self._jobs[sid]
+
+    def progress(self, sid, job_id=None):
+        """
+        Progress of a session's uploads: one job if job_id is given, otherwise
+        every unfinished job combined (or the latest job once all are done).
+        Returns None if the session has no tracked jobs.
+        """
+        with self._lock:
+            jobs = list(self._jobs.get(sid, {}).values())
+            if job_id is not None:
+                jobs = [job for job in jobs if job.id == job_id]
+            elif jobs:
+                jobs = [job for job in jobs if not job.done] or [max(jobs, key=lambda job: job.started_at)]
+            if not jobs:
+                return None
+
+            total = sum(job.total for job in jobs)
+            processed = sum(job.processed for job in jobs)
+            started_at = min(job.started_at for job in jobs)
+            return {
+                'total': total,
+                'processed': processed,
+                'failed': sum(job.failed for job in jobs),
+                'completed': processed >= total,
+                'started_at': started_at,
+                'jobs': [job.to_dict() for job in jobs],
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def init_app(app):
+    """Create the shared upload pool (once per process)"""
+    global _pool
+    app.config.setdefault('UPLOAD_WORKERS', int(os.environ.get('UPLOAD_WORKERS', min(4, os.cpu_count() or 1))))
+    app.config.setdefault('UPLOAD_QUEUE_LIMIT', int(os.environ.get('UPLOAD_QUEUE_LIMIT', 1000)))
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = UploadPool(app.config['UPLOAD_WORKERS'], app.config['UPLOAD_QUEUE_LIMIT'])
+            logger.info(f"Upload pool started with {_pool.workers} workers")
+    return _pool
+
+def submit(app, sid, spooled, process, profile=False):
+    """Queue spooled files on the shared pool, returns the job or None if the queue is full"""
+    return _pool.submit(app, sid, spooled, process, profile)
+
+def progress(sid, job_id=None):
+    """Progress of a session's uploads on the shared pool"""
+    return _pool.progress(sid, job_id)
@@ -0,0 +1,109 @@
+"""
+Warm-up of the heavy resources and the health probes.
+
+Loading the spaCy model takes seconds and checking Tesseract runs a
+subprocess, so neither happens at import. WARMUP selects when they do:
+
+    background  (default) a thread loads them right after startup; the app
+                serves requests meanwhile and texts analyzed before the model
+                is ready wait for it (see nlp_analyzer.ensure_loaded)
+    eager       they load before start() returns
+    lazy        nothing is loaded up front; the model loads on first use
+
+Probes:
+
+    GET /healthz  liveness, 200 as long as the process answers
+    GET /readyz   readiness, 503 until the warm-up has finished, then 200;
+                  resources that failed to load are reported as degraded
+                  (the keyword analyzer replaces spaCy, OCR yields no text)
+"""
+
+import os
+import time
+import logging
+import threading
+from flask import jsonify
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MODES = ('background', 'eager', 'lazy')
+
+# Resource name -> {'state': pending|loading|ready|failed|lazy, 'seconds', 'detail'}
+resources = {}
+_lock = threading.Lock()
+_started = False
+
+def _load_nlp():
+    import nlp_analyzer
+    nlp_analyzer.ensure_loaded()
+    if nlp_analyzer.nlp is None:
+        raise RuntimeError("spaCy model could not be loaded, using the keyword analyzer")
+    return ', '.join(nlp_analyzer.nlp.pipe_names)
+
+def _check_tesseract():
+    import pytesseract
+    try:
+        return f"Tesseract {pytesseract.get_tesseract_version()}"
+    except Exception as e:
+        raise RuntimeError(f"Tesseract OCR is not properly installed, please install it to use this application: {e}")
+
+TASKS = [('nlp', _load_nlp), ('tesseract', _check_tesseract)]
+
+def init_app(app):
+    """Register /healthz and /readyz on an app"""
+    app.config.setdefault('WARMUP', os.environ.get('WARMUP', 'background'))
+    if 'healthz' not in app.view_functions:
+        app.add_url_rule('/healthz', 'healthz', healthz)
+        app.add_url_rule('/readyz', 'readyz', readyz)
+
+def start(app):
+    """Start the warm-up for this process in the app's WARMUP mode (once per process)"""
+    global _started
+    mode = app.config.get('WARMUP', 'background')
+    if mode not in MODES:
+        logger.warning(f"Unknown WARMUP mode {mode!r}, using background")
+        mode = 'background'
+
+    with _lock:
+        if _started:
+            return
+        _started = True
+        for name, _task in TASKS:
+            resources[name] = {'state': 'lazy' if mode == 'lazy' else 'pending'}
+
+    if mode == 'eager':
+        _run()
+    elif mode == 'background':
+        thread = threading.Thread(target=_run, name='warmup')
+        thread.daemon = True
+        thread.start()
+
+def _run():
+    for name, task in TASKS:
+        resources[name]['state'] = 'loading'
+        start = time.perf_counter()
+        try:
+            detail = task()
+            state = 'ready'
+        except Exception as e:
+            detail = str(e)
+            state = 'failed'
+            logger.error(f"Warm-up of {name} failed: {detail}")
+        resources[name].update(state=state, seconds=round(time.perf_counter() - start, 3), detail=detail)
+        logger.info(f"Warm-up of {name}: {state} in {resources[name]['seconds']:.2f}s")
+
+def is_ready():
+    """Whether the warm-up has started and nothing is still loading"""
+    return _started and all(r['state'] not in ('pending', 'loading') for r in resources.values())
+
+def healthz():
+    return jsonify({'status': 'ok'})
+
+def readyz():
+    ready = is_ready()
+    return jsonify({
+        'ready': ready,
+        'degraded': [name for name, r in resources.items() if r['state'] == 'failed'],
+        'resources': resources,
+    }), 200 if ready else 503